@@ -6,6 +6,7 @@ Cascades through several applications, so long as applications
 return ``404 Not Found``.
 """
 from paste import httpexceptions
+from paste.request import iter_input
 from paste.util import converters
 import tempfile
 from io import BytesIO
@@ -92,16 +93,12 @@ class Cascade:
             copy_wsgi_input = True
             if length > 4096 or length < 0:
                 f = tempfile.TemporaryFile()
-                if length < 0:
-                    f.write(environ['wsgi.input'].read())
-                else:
-                    copy_len = length
-                    while copy_len > 0:
-                        chunk = environ['wsgi.input'].read(min(copy_len, 4096))
-                        if not chunk:
-                            raise IOError("Request body truncated")
-                        f.write(chunk)
-                        copy_len -= len(chunk)
+                copied = 0
+                for chunk in iter_input(environ['wsgi.input'], length):
+                    f.write(chunk)
+                    copied += len(chunk)
+                if copied < length:
+                    raise IOError("Request body truncated")
                 f.seek(0)
             else:
                 f = BytesIO(environ['wsgi.input'].read(length))
@@ -0,0 +1,82 @@
+"""
+Reports the statistics kept by ``paste.httpserver`` (in the key
+``paste.httpserver.stats``) as JSON, or in the Prometheus text
+format.
+"""
+import json
+
+from paste.request import parse_querystring
+
+class ShowServerStats:
+
+    """
+    Application that shows the request counters, latency histograms
+    and thread pool gauges of the ``paste.httpserver`` it runs in.
+
+    The statistics are returned as JSON, unless the request asks for
+    ``?format=prometheus`` or accepts ``text/plain`` (as Prometheus
+    does), in which case they are returned in the Prometheus text
+    exposition format, with every name prefixed by ``prefix``.
+    """
+
+    def __init__(self, prefix='paste_httpserver_'):
+        self.prefix = prefix
+
+    def __call__(self, environ, start_response):
+        if 'paste.httpserver.stats' not in environ:
+            start_response('403 Forbidden', [('Content-type', 'text/plain')])
+            return [b'You must use the Paste HTTP server to use this application']
+        snapshot = environ['paste.httpserver.stats'].snapshot()
+        format = dict(parse_querystring(environ)).get('format')
+        if format is None:
+            if 'text/plain' in environ.get('HTTP_ACCEPT', ''):
+                format = 'prometheus'
+            else:
+                format = 'json'
+        if format == 'prometheus':
+            body = format_prometheus(snapshot, self.prefix)
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body = json.dumps(snapshot, sort_keys=True, indent=2)
+            content_type = 'application/json'
+        body = body.encode('utf8')
+        start_response('200 OK', [('Content-type', content_type),
+                                  ('Content-length', str(len(body))),
+                                  ('Cache-Control', 'no-cache')])
+        return [body]
+
+def format_prometheus(snapshot, prefix='paste_httpserver_'):
+    """
+    Format a ``ServerStats`` snapshot in the Prometheus text
+    exposition format.
+    """
+    lines = []
+    def metric(name, type, value):
+        lines.append('# TYPE %s%s %s' % (prefix, name, type))
+        lines.append('%s%s %s' % (prefix, name, _number(value)))
+    metric('uptime_seconds', 'gauge', snapshot['uptime'])
+    for name, value in sorted(snapshot['counters'].items()):
+        metric(name + '_total', 'counter', value)
+    for name, value in sorted(snapshot['gauges'].items()):
+        metric(name, 'gauge', value)
+    for name, hist in sorted(snapshot['histograms'].items()):
+        name = name + '_seconds'
+        lines.append('# TYPE %s%s histogram' % (prefix, name))
+        for bound, count in hist['buckets']:
+            if bound is None:
+                bound = '+Inf'
+            lines.append('%s%s_bucket{le="%s"} %s'
+                         % (prefix, name, bound, count))
+        lines.append('%s%s_sum %s' % (prefix, name, _number(hist['sum'])))
+        lines.append('%s%s_count %s' % (prefix, name, hist['count']))
+    lines.append('')
+    return '\n'.join(lines)
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+def make_server_stats(global_conf, prefix='paste_httpserver_'):
+    return ShowServerStats(prefix=prefix)
+make_server_stats.__doc__ = ShowServerStats.__doc__
@@ -0,0 +1,87 @@
+"""
+Measures how the throughput of ``paste.httpserver.ThreadPool`` scales
+with its number of workers.
+
+CPU-bound tasks only run in parallel on a free-threaded build of
+Python (e.g., ``python3.13t``); with the GIL the throughput stays
+about the same however many workers there are.  Empty tasks
+(``--work 0``) measure the pool's own overhead per task.  Run it
+as::
+
+    python -m paste.debug.threadpoolbench --workers 1,2,4,8
+"""
+import argparse
+import queue
+import sys
+import time
+
+from paste.httpserver import ThreadPool
+
+def cpu_task(work):
+    """
+    Return a task that does ``work`` iterations of pure Python
+    arithmetic.
+    """
+    def task():
+        total = 0
+        for i in range(work):
+            total += i * i
+        return total
+    return task
+
+def benchmark(nworkers, ntasks, work):
+    """
+    Run ``ntasks`` tasks of ``work`` iterations each in a pool of
+    ``nworkers`` workers, and return the seconds they took.
+    """
+    pool = ThreadPool(nworkers, name='benchmark', daemon=True,
+                      max_requests=0, spawn_if_under=0,
+                      hung_check_period=0)
+    finished = queue.SimpleQueue()
+    task = cpu_task(work)
+    def run():
+        task()
+        finished.put(None)
+    try:
+        start = time.perf_counter()
+        for i in range(ntasks):
+            pool.add_task(run)
+        for i in range(ntasks):
+            finished.get()
+        return time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+def gil_enabled():
+    """
+    Return whether the GIL is enabled (it always is before Python
+    3.13).
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is None or is_gil_enabled()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m paste.debug.threadpoolbench',
+        description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4,8',
+                        help='Comma-separated pool sizes to compare')
+    parser.add_argument('--tasks', type=int, default=2000,
+                        help='Tasks to run for each pool size')
+    parser.add_argument('--work', type=int, default=20000,
+                        help='Loop iterations in each task (0 for empty tasks)')
+    options = parser.parse_args(args)
+    print('Python %s, GIL %s' % (
+        sys.version.split()[0],
+        gil_enabled() and 'enabled' or 'disabled'))
+    print('%8s %10s %12s %8s' % ('workers', 'seconds', 'tasks/sec', 'speedup'))
+    base = None
+    for nworkers in [int(n) for n in options.workers.split(',')]:
+        seconds = benchmark(nworkers, options.tasks, options.work)
+        if base is None:
+            base = seconds
+        print('%8d %10.3f %12.0f %7.2fx' % (
+            nworkers, seconds, options.tasks / seconds, base / seconds))
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,7 @@ import sys
 import time
 import traceback
 from io import StringIO
-from thread import get_ident
+from _thread import get_ident
 from paste import httpexceptions
 from paste.request import construct_url, parse_formvars
 from paste.util.template import HTMLTemplate, bunch
@@ -101,6 +101,14 @@ page_template = HTMLTemplate('''
   <td>Time processing request</td>
   <td>{{thread.time_html|html}}</td>
  </tr>
+ <tr>
+  <td>Time waiting in queue</td>
+  <td>{{thread.queue_wait_html|html}}</td>
+ </tr>
+ <tr>
+  <td>CPU time</td>
+  <td>{{thread.cpu_html|html}}</td>
+ </tr>
  <tr>
   <td>URI</td>
   <td>{{if thread.uri == 'unknown'}}
@@ -205,10 +213,13 @@ class WatchThreads:
         now = time.time()
 
 
-        workers = thread_pool.worker_tracker.items()
-        workers.sort(key=lambda v: v[1][0])
+        workers = sorted(thread_pool.worker_tracker.items(),
+                         key=lambda v: v[1][0])
+        task_times = thread_pool.task_times()
         threads = []
-        for thread_id, (time_started, worker_environ) in workers:
+        for thread_id, info in workers:
+            time_started, worker_environ = info[:2]
+            times = task_times.get(thread_id, {})
             thread = bunch()
             threads.append(thread)
             if worker_environ:
@@ -217,6 +228,11 @@ class WatchThreads:
                 thread.uri = 'unknown'
             thread.thread_id = thread_id
             thread.time_html = format_time(now-time_started)
+            thread.queue_wait_html = format_time(times.get('queue_wait', 0))
+            if times.get('cpu') is None:
+                thread.cpu_html = 'unknown'
+            else:
+                thread.cpu_html = format_time(times['cpu'])
             thread.uri_short = shorten(thread.uri)
             thread.environ = worker_environ
             thread.traceback = traceback_thread(thread_id)
@@ -233,7 +249,7 @@ class WatchThreads:
             this_thread_id=get_ident(),
             track_threads=thread_pool.track_threads())
 
-        return [page]
+        return [page.encode('utf8')]
 
     def kill(self, environ, start_response):
         if not self.allow_kill:
@@ -253,7 +253,12 @@ class FileApp(DataApp):
             return [b'']
         file.seek(lower)
         file_wrapper = environ.get('wsgi.file_wrapper', None)
-        if file_wrapper:
+        if getattr(file_wrapper, 'sized', False):
+            # paste.httpserver.FileWrapper stops at the Content-Length,
+            # even if the file has grown since it was looked at
+            return file_wrapper(file, BLOCK_SIZE, size=content_length)
+        elif file_wrapper and lower + content_length == self.content_length:
+            # Other file_wrappers send everything up to the end of the file
             return file_wrapper(file, BLOCK_SIZE)
         else:
             return _FileIter(file, size=content_length)
@@ -14,34 +14,102 @@ if pyOpenSSL is installed, it also provides SSL capabilities.
 # @@: add in protection against HTTP/1.0 clients who claim to
 #     be 1.1 but do not send a Content-Length
 
-# @@: add support for chunked encoding, this is not a 1.1 server
-#     till this is completed.
-
+import asyncio
 import atexit
+import bisect
+import heapq
+import multiprocessing
 import traceback
 import io
+import selectors
 import socket, sys, threading
 import posixpath
+import signal
+import stat
+import subprocess
 import time
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from email.utils import formatdate
+from collections import OrderedDict, deque
 from itertools import count
 import _thread
 import queue
+from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 from urllib.parse import unquote, urlsplit
 from paste.util import converters
 import logging
+try:
+    import ssl
+except ImportError:
+    ssl = None
+    _SSLWouldBlock = ()
+else:
+    _SSLWouldBlock = (ssl.SSLWantReadError, ssl.SSLWantWriteError)
 try:
     from paste.util import killthread
 except ImportError:
     # Not available, probably no ctypes
     killthread = None
+try:
+    # Python 3.14 and later, with a GIL for each interpreter
+    from concurrent.futures import InterpreterPoolExecutor
+except ImportError:
+    InterpreterPoolExecutor = None
 
-__all__ = ['WSGIHandlerMixin', 'WSGIServer', 'WSGIHandler', 'serve']
+__all__ = ['WSGIHandlerMixin', 'WSGIServer', 'WSGIHandler', 'FileWrapper',
+           'RequestHeaders', 'parse_headers', 'serve']
 __version__ = "0.5"
 
 
+def _sendmsg_all(sendmsg, buffers):
+    """
+    Private function that sends all of ``buffers`` with a socket's
+    ``sendmsg``, continuing after partial writes.
+    """
+    while buffers:
+        # Stay well under IOV_MAX (1024 buffers on Linux), past which
+        # sendmsg() fails with EMSGSIZE
+        sent = sendmsg(buffers[:64])
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers.pop(0))
+        if sent:
+            buffers[0] = memoryview(buffers[0])[sent:]
+
+
+def _send_nowait(sock, buffers):
+    """
+    Private function that sends as much of ``buffers`` as a socket
+    takes without blocking, removing what was sent from the list.
+    It stops at an item that isn't a byte string (a file for
+    ``OutputWriter``).  Returns the number of bytes sent.
+    """
+    total = 0
+    while buffers:
+        batch = []
+        for data in buffers[:64]:
+            if isinstance(data, tuple):
+                break
+            batch.append(data)
+        if not batch:
+            break
+        try:
+            sent = sock.sendmsg(batch, [], socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            break
+        total += sent
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers.pop(0))
+        if sent:
+            # The socket's buffer is full
+            buffers[0] = memoryview(buffers[0])[sent:]
+            break
+    return total
+
+
 def _get_headers(headers, k):
     """
     Private function for abstracting differences in getting HTTP request
@@ -54,6 +122,197 @@ def _get_headers(headers, k):
         return headers.getheaders(k)  # Python 2 - mimetools.Message
 
 
+# Characters allowed in a header name (a token, RFC 7230 3.2.6)
+_token_chars = frozenset(
+    b"!#$%&'*+-.^_`|~0123456789"
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz")
+
+# Header names as they were received -> (name, lower-case name, environ
+# key); the environ key is None for headers that don't get an HTTP_*
+# key.  Bounded, so that clients making up names can't grow it.
+_header_names = {}
+_header_names_limit = 1000
+
+def _header_name(name):
+    """
+    Private function that looks up (and caches) the ``_header_names``
+    entry for a header name, which is bytes.  Raises ValueError if it
+    isn't a valid name.
+    """
+    try:
+        return _header_names[name]
+    except KeyError:
+        pass
+    if not name or not _token_chars.issuperset(name):
+        raise ValueError("Bad header name %r" % name)
+    name_str = name.decode('ascii')
+    key = 'HTTP_' + name_str.replace('-', '_').upper()
+    if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+        key = None
+    entry = (name_str, name_str.lower(), key)
+    if len(_header_names) < _header_names_limit:
+        _header_names[name] = entry
+    return entry
+
+def _head_end(data, start=0):
+    """
+    Private function that returns the position just past the blank
+    line ending the headers in ``data`` (which starts at a header line
+    or at the blank line itself), or -1 if the blank line hasn't been
+    received yet.  ``start`` is where to start searching for the
+    terminator.
+    """
+    if data[:1] == b'\n':
+        return 1
+    if data[:2] == b'\r\n':
+        return 2
+    end = data.find(b'\n\r\n', start)
+    if end >= 0:
+        end += 3
+    lf_end = data.find(b'\n\n', start, end if end >= 0 else len(data))
+    if lf_end >= 0:
+        end = lf_end + 2
+    return end
+
+
+class RequestHeaders:
+    """
+    The headers of a request, parsed by ``parse_headers``.
+
+    This stands in for the ``email.message.Message`` that
+    ``BaseHTTPRequestHandler`` puts in ``self.headers``: ``get()``,
+    ``get_all()``, ``items()``, ``keys()``, ``in`` and ``[]`` work the
+    same (looking names up case-insensitively).  ``environ`` holds the
+    ``HTTP_*`` keys of the WSGI environment, with the values of
+    repeated headers joined by commas.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._values = {}
+        self.environ = {}
+
+    def get(self, name, failobj=None):
+        values = self._values.get(name.lower())
+        if values is None:
+            return failobj
+        return values[0]
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def get_all(self, name, failobj=None):
+        values = self._values.get(name.lower())
+        if values is None:
+            return failobj
+        return list(values)
+
+    def __contains__(self, name):
+        return name.lower() in self._values
+
+    def items(self):
+        return list(self._items)
+
+    def keys(self):
+        return [name for name, value in self._items]
+
+    def values(self):
+        return [value for name, value in self._items]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __str__(self):
+        return ''.join('%s: %s\n' % item for item in self._items) + '\n'
+
+class _TooManyHeaders(ValueError):
+    pass
+
+def parse_headers(data, max_headers=100):
+    """
+    Parse the header lines of a request (bytes, up to the blank line
+    that ends them) into a ``RequestHeaders``.
+
+    Raises ValueError for a malformed header line, or if there are
+    more than ``max_headers`` headers.
+    """
+    headers = RequestHeaders()
+    items = headers._items
+    values = headers._values
+    environ = headers.environ
+    pos = 0
+    size = len(data)
+    while pos < size:
+        end = data.find(b'\n', pos)
+        if end < 0:
+            end = size
+        line_end = end
+        if line_end > pos and data[line_end - 1] == 13:  # \r
+            line_end -= 1
+        if line_end == pos:
+            # The blank line
+            break
+        if data[pos] in (32, 9) and items:
+            # An obsolete folded line, continuing the last header
+            name, value = items[-1]
+            value += ' ' + data[pos:line_end].strip().decode('latin-1')
+            items[-1] = (name, value)
+            lower_values = values[name.lower()]
+            lower_values[-1] = value
+            key = _header_name(name.encode('ascii'))[2]
+            if key is not None:
+                environ[key] = ','.join(lower_values)
+            pos = end + 1
+            continue
+        colon = data.find(b':', pos, line_end)
+        if colon < 0:
+            raise ValueError("Bad header line %r" % data[pos:line_end])
+        name, lower, key = _header_name(data[pos:colon])
+        value = data[colon + 1:line_end].strip().decode('latin-1')
+        items.append((name, value))
+        if len(items) > max_headers:
+            raise _TooManyHeaders("Got more than %d headers" % max_headers)
+        if lower in values:
+            values[lower].append(value)
+            if key is not None:
+                environ[key] += ',' + value
+        else:
+            values[lower] = [value]
+            if key is not None:
+                environ[key] = value
+        pos = end + 1
+    return headers
+
+
+def _readinto(file, buffer, method='readinto'):
+    """
+    Private function that reads from ``file`` into ``buffer`` (a
+    memoryview), with its ``readinto()`` (or ``readinto1()``) where it
+    has one, and returns the number of bytes read.
+    """
+    readinto = getattr(file, method, None) or getattr(file, 'readinto', None)
+    if readinto is not None:
+        return readinto(buffer) or 0
+    data = file.read(len(buffer))
+    buffer[:len(data)] = data
+    return len(data)
+
+def _iter_chunks(file, size):
+    """
+    Private generator that reads ``file`` to its end into one buffer of
+    ``size`` bytes, yielding a memoryview of the part filled each time.
+    """
+    buffer = memoryview(bytearray(size))
+    while True:
+        n = _readinto(file, buffer)
+        if not n:
+            break
+        yield buffer[:n]
+
+
 class ContinueHook:
     """
     When a client request includes a 'Expect: 100-continue' header, then
@@ -71,18 +330,22 @@ class ContinueHook:
     def __init__(self, rfile, write):
         self._ContinueFile_rfile = rfile
         self._ContinueFile_write = write
+        self._ContinueFile_sent = False
         for attr in ('close', 'closed', 'fileno', 'flush',
                      'mode', 'bufsize', 'softspace'):
             if hasattr(rfile, attr):
                 setattr(self, attr, getattr(rfile, attr))
-        for attr in ('read', 'readline', 'readlines'):
+        for attr in ('read', 'readline', 'readlines', 'readinto',
+                     'readinto1', 'chunks'):
             if hasattr(rfile, attr):
                 setattr(self, attr, getattr(self, '_ContinueFile_' + attr))
 
     def _ContinueFile_send(self):
         self._ContinueFile_write("HTTP/1.1 100 Continue\r\n\r\n".encode('utf-8'))
+        self._ContinueFile_sent = True
         rfile = self._ContinueFile_rfile
-        for attr in ('read', 'readline', 'readlines'):
+        for attr in ('read', 'readline', 'readlines', 'readinto',
+                     'readinto1', 'chunks'):
             if hasattr(rfile, attr):
                 setattr(self, attr, getattr(rfile, attr))
 
@@ -98,6 +361,59 @@ class ContinueHook:
         self._ContinueFile_send()
         return self._ContinueFile_rfile.readlines(sizehint)
 
+    def _ContinueFile_readinto(self, buffer):
+        self._ContinueFile_send()
+        return self._ContinueFile_rfile.readinto(buffer)
+
+    def _ContinueFile_readinto1(self, buffer):
+        self._ContinueFile_send()
+        return self._ContinueFile_rfile.readinto1(buffer)
+
+    def _ContinueFile_chunks(self, size=65536):
+        self._ContinueFile_send()
+        return self._ContinueFile_rfile.chunks(size)
+
+class FileWrapper:
+    """
+    The ``wsgi.file_wrapper`` provided by this server.
+
+    Iterating over it reads the file in ``block_size`` blocks, like
+    any file wrapper.  But when it is returned to the server as is,
+    and wraps a regular file that is being sent over a plain socket,
+    the server sends the file with ``socket.sendfile()`` (that is,
+    ``os.sendfile()``), without copying its contents through Python.
+
+    As an extension, ``size`` limits how much of the file (from its
+    current position) is sent; ``paste.fileapp`` uses this for
+    ``Range`` requests.
+    """
+
+    sized = True
+
+    def __init__(self, filelike, block_size=8192, size=None):
+        self.filelike = filelike
+        self.block_size = block_size
+        self.size = size
+        if hasattr(filelike, 'close'):
+            self.close = filelike.close
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        chunk_size = self.block_size
+        if self.size is not None:
+            if self.size <= 0:
+                raise StopIteration
+            chunk_size = min(chunk_size, self.size)
+        data = self.filelike.read(chunk_size)
+        if not data:
+            raise StopIteration
+        if self.size is not None:
+            self.size -= len(data)
+        return data
+    __next__ = next
+
 class WSGIHandlerMixin:
     """
     WSGI mix-in for HTTPRequestHandler
@@ -108,6 +424,165 @@ class WSGIHandlerMixin:
     """
     lookup_addresses = True
 
+    # The most of a request body left unread by the application that
+    # will be read and thrown away to keep the connection alive
+    max_discard_input = 65536
+
+    # Limits on the request headers (the same as http.client's), and
+    # on the size of the whole request head
+    max_header_line = 65536
+    max_headers = 100
+    max_head_size = 65536
+
+    # The absolute time by which the current request must be finished
+    # (from the server's ``request_timeout``), or None
+    wsgi_request_deadline = None
+
+    # The output held for the server's ``OutputWriter`` (a list of
+    # byte strings and files), while the response may be offloaded
+    wsgi_output = None
+
+    # Set once the connection has been handed to the ``OutputWriter``
+    wsgi_offloaded = False
+
+    def wsgi_watch(self, phase, timeout=None):
+        """
+        Tell the server's ``ConnectionReaper`` (if it has one) that the
+        connection is entering ``phase`` and must leave it within
+        ``timeout`` seconds, or by ``wsgi_request_deadline`` if that
+        is sooner; with neither the connection isn't watched.
+        """
+        reaper = getattr(self.server, 'reaper', None)
+        if reaper is None:
+            return
+        deadline = timeout and time.time() + timeout
+        request_deadline = self.wsgi_request_deadline
+        if request_deadline and (not deadline or request_deadline < deadline):
+            deadline, phase = request_deadline, 'request'
+        if deadline:
+            reaper.watch(self.connection, phase, deadline)
+        else:
+            reaper.unwatch(self.connection)
+
+    def wsgi_read_head(self):
+        """
+        Read the header lines of the request, up to and including the
+        blank line that ends them.  When the whole head is already in
+        the read buffer it is taken in one piece; otherwise it is read
+        line by line.  Returns None if a line is longer than
+        ``max_header_line``, or the head longer than ``max_head_size``.
+        """
+        rfile = self.rfile
+        peek = getattr(rfile, 'peek', None)
+        if peek is not None:
+            end = _head_end(peek())
+            if end > self.max_head_size:
+                return None
+            if end >= 0:
+                return rfile.read(end)
+        lines = []
+        size = 0
+        while True:
+            line = rfile.readline(self.max_header_line + 1)
+            size += len(line)
+            if len(line) > self.max_header_line or size > self.max_head_size:
+                return None
+            lines.append(line)
+            if line in (b'\r\n', b'\n', b''):
+                return b''.join(lines)
+            if len(lines) > self.max_headers:
+                # parse_headers will complain about this
+                return b''.join(lines)
+
+    def handle_expect_100(self):
+        # ContinueHook sends ``100 Continue`` once the application
+        # starts reading the body (if it does)
+        return True
+
+    def parse_request(self):
+        """
+        Parse the request line in ``self.raw_requestline`` and the
+        headers (read with ``wsgi_read_head()``), setting
+        ``self.command``, ``self.path``, ``self.request_version`` and
+        ``self.headers`` (a ``RequestHeaders``).
+
+        This does what ``BaseHTTPRequestHandler.parse_request`` does,
+        but without the ``email`` package.  Returns False if the
+        request is bad, after sending an error response.
+        """
+        self.command = None
+        self.request_version = version = self.default_request_version
+        self.close_connection = True
+        requestline = str(self.raw_requestline, 'iso-8859-1').rstrip('\r\n')
+        self.requestline = requestline
+        words = requestline.split()
+        if not words:
+            return False
+        if len(words) >= 3:
+            version = words[-1]
+            try:
+                if not version.startswith('HTTP/'):
+                    raise ValueError
+                version_number = version[5:].split('.')
+                if (len(version_number) != 2
+                    or not all(number.isdigit() and len(number) <= 10
+                               for number in version_number)):
+                    raise ValueError
+                version_number = int(version_number[0]), int(version_number[1])
+            except ValueError:
+                self.send_error(HTTPStatus.BAD_REQUEST,
+                                "Bad request version (%r)" % version)
+                return False
+            if version_number >= (1, 1) and self.protocol_version >= "HTTP/1.1":
+                self.close_connection = False
+            if version_number >= (2, 0):
+                self.send_error(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED,
+                                "Invalid HTTP version (%s)" % version[5:])
+                return False
+            self.request_version = version
+        if not 2 <= len(words) <= 3:
+            self.send_error(HTTPStatus.BAD_REQUEST,
+                            "Bad request syntax (%r)" % requestline)
+            return False
+        command, path = words[:2]
+        if len(words) == 2:
+            self.close_connection = True
+            if command != 'GET':
+                self.send_error(HTTPStatus.BAD_REQUEST,
+                                "Bad HTTP/0.9 request type (%r)" % command)
+                return False
+        if path.startswith('//'):
+            # Don't let this look like a scheme-relative URL
+            path = '/' + path.lstrip('/')
+        self.command, self.path = command, path
+
+        head = self.wsgi_read_head()
+        if head is None:
+            self.send_error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                            "Headers too long")
+            return False
+        try:
+            self.headers = parse_headers(head, self.max_headers)
+        except _TooManyHeaders as exc:
+            self.send_error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                            "Too many headers", str(exc))
+            return False
+        except ValueError as exc:
+            self.send_error(HTTPStatus.BAD_REQUEST, str(exc))
+            return False
+
+        conntype = self.headers.get('Connection', '').lower()
+        if conntype == 'close':
+            self.close_connection = True
+        elif conntype == 'keep-alive' and self.protocol_version >= "HTTP/1.1":
+            self.close_connection = False
+        if (self.headers.get('Expect', '').lower() == '100-continue'
+            and self.protocol_version >= "HTTP/1.1"
+            and self.request_version >= "HTTP/1.1"):
+            if not self.handle_expect_100():
+                return False
+        return True
+
     def log_request(self, *args, **kwargs):
         """ disable success request logging
 
@@ -131,39 +606,245 @@ class WSGIHandlerMixin:
         else:
             return self.server_version + ' ' + self.sys_version
 
-    def wsgi_write_chunk(self, chunk):
+    def wsgi_write_chunk(self, chunk, last=False):
         """
         Write a chunk of the output stream; send headers if they
         have not already been sent.
+
+        The response head is held back until there is body data to go
+        with it (as PEP 3333 asks), and then goes out in the same write
+        as that data.  If ``last`` is true this is the final chunk, and
+        the end of the response is written along with it.
         """
         if not self.wsgi_headers_sent and not self.wsgi_curr_headers:
             raise RuntimeError(
                 "Content returned before start_response called")
         if not self.wsgi_headers_sent:
             self.wsgi_headers_sent = True
-            (status, headers) = self.wsgi_curr_headers
-            code, message = status.split(" ", 1)
-            self.send_response(int(code), message)
-            #
-            # HTTP/1.1 compliance; either send Content-Length or
-            # signal that the connection is being closed.
-            #
-            send_close = True
-            for (k, v) in  headers:
-                lk = k.lower()
-                if 'content-length' == lk:
+            self.wsgi_pending_head = self.wsgi_response_head(
+                *self.wsgi_curr_headers)
+        buffers = []
+        if self.wsgi_pending_head:
+            buffers.append(self.wsgi_pending_head)
+        if chunk and not self.wsgi_no_body:
+            if self.wsgi_chunked:
+                buffers.extend((b'%x\r\n' % len(chunk), chunk, b'\r\n'))
+            else:
+                buffers.append(chunk)
+        elif not last:
+            # Nothing to send yet
+            return
+        if last and self.wsgi_chunked:
+            # The last-chunk marker, with no trailers
+            buffers.append(b'0\r\n\r\n')
+        self.wsgi_pending_head = None
+        if buffers:
+            self.wsgi_send(buffers)
+
+    def wsgi_response_head(self, status, headers):
+        """
+        Serialize the status line and headers of the response.  This
+        also decides how the body is delimited: by the application's
+        ``Content-Length``, by chunked encoding, or by closing the
+        connection.
+        """
+        code, message = status.split(" ", 1)
+        code = int(code)
+        self.wsgi_status_code = code
+        self.log_request(code)
+        # HEAD requests and these statuses never have a body, so
+        # they don't need a length either
+        self.wsgi_no_body = (self.command == 'HEAD'
+                             or code < 200 or code in (204, 304))
+        if self.request_version == 'HTTP/0.9':
+            return b''
+        lines = ['%s %d %s\r\n' % (self.protocol_version, code, message),
+                 'Server: %s\r\n' % self.version_string(),
+                 'Date: %s\r\n' % self.date_time_string()]
+        #
+        # HTTP/1.1 compliance; either send Content-Length, use
+        # chunked encoding, or signal that the connection is being
+        # closed.
+        #
+        send_close = not self.wsgi_no_body
+        for (k, v) in  headers:
+            lk = k.lower()
+            if 'content-length' == lk:
+                send_close = False
+            if 'transfer-encoding' == lk:
+                # The application has done its own framing
+                send_close = False
+            if 'connection' == lk:
+                lv = v.lower()
+                if 'close' == lv:
+                    self.close_connection = 1
                     send_close = False
-                if 'connection' == lk:
-                    if 'close' == v.lower():
-                        self.close_connection = 1
-                        send_close = False
-                self.send_header(k, v)
-            if send_close:
+                elif 'keep-alive' == lv:
+                    self.close_connection = 0
+            lines.append('%s: %s\r\n' % (k, v))
+        if send_close and self.wsgi_can_chunk():
+            self.wsgi_chunked = True
+            lines.append('Transfer-Encoding: chunked\r\n')
+        elif send_close:
+            self.close_connection = 1
+            lines.append('Connection: close\r\n')
+        lines.append('\r\n')
+        return ''.join(lines).encode('latin-1', 'strict')
+
+    def wsgi_sendfile(self, wrapper):
+        """
+        Send the file in a ``FileWrapper`` with ``socket.sendfile()``.
+        Returns False if that isn't possible here (for instance with
+        an SSL connection), and the wrapper should be iterated over
+        instead.
+        """
+        if (self.wsgi_is_secure()
+            or not hasattr(self.connection, 'sendfile')
+            or self.wbufsize != 0):
+            return False
+        try:
+            file_stat = os.fstat(wrapper.filelike.fileno())
+            offset = wrapper.filelike.tell()
+        except (AttributeError, OSError, ValueError):
+            return False
+        if not stat.S_ISREG(file_stat.st_mode):
+            return False
+        # Settle the response head
+        self.wsgi_write_chunk(b'')
+        if self.wsgi_chunked or self.wsgi_no_body:
+            return False
+        count = file_stat.st_size - offset
+        if wrapper.size is not None:
+            count = min(count, wrapper.size)
+        if self.wsgi_output is not None and count > 0:
+            # Leave the file to the OutputWriter (with its own
+            # descriptor, as the application's is closed when we're
+            # done here)
+            if self.wsgi_pending_head:
+                self.wsgi_send([self.wsgi_pending_head])
+            self.wsgi_pending_head = None
+            self.wsgi_output.append(
+                (os.dup(wrapper.filelike.fileno()), offset, count))
+            self.wsgi_bytes_out += count
+            return True
+        if self.wsgi_pending_head:
+            # MSG_MORE lets the head share a packet with the file data
+            self.connection.sendall(self.wsgi_pending_head,
+                                    getattr(socket, 'MSG_MORE', 0))
+            self.wsgi_bytes_out += len(self.wsgi_pending_head)
+        self.wsgi_pending_head = None
+        if count > 0:
+            sent = self.connection.sendfile(wrapper.filelike, offset, count)
+            self.wsgi_bytes_out += sent
+            if sent < count:
+                # The file was truncated underneath us
                 self.close_connection = 1
-                self.send_header('Connection', 'close')
+        return True
+
+    def wsgi_send(self, buffers):
+        """
+        Write a list of byte strings to the client, with a single
+        ``sendmsg()`` (``writev``) call where the connection allows.
+        """
+        self.wsgi_bytes_out += sum(map(len, buffers))
+        if self.wsgi_output is not None:
+            self.wsgi_buffer_output(buffers)
+            return
+        if len(buffers) > 1 and self.wbufsize == 0:
+            sendmsg = None
+            if not self.wsgi_is_secure():
+                sendmsg = getattr(self.connection, 'sendmsg', None)
+            if sendmsg is not None:
+                _sendmsg_all(sendmsg, buffers)
+                return
+            self.wfile.write(b''.join(buffers))
+        else:
+            for data in buffers:
+                self.wfile.write(data)
+
+    def wsgi_can_offload(self):
+        """
+        True if the rest of the response can be left to the server's
+        ``OutputWriter``: the server has one, the connection is a plain
+        socket that is written to directly, and after the response it
+        is either closed or can be handed to the connection manager.
+        """
+        return (getattr(self.server, 'output_writer', None) is not None
+                and self.wbufsize == 0
+                and not self.wsgi_is_secure()
+                and hasattr(self.connection, 'sendmsg')
+                and (self.close_connection
+                     or isinstance(self.request, _ManagedConnection)))
+
+    def wsgi_buffer_output(self, buffers):
+        """
+        Send as much of ``buffers`` as the client takes right away, and
+        hold on to the rest for the ``OutputWriter``.  Once more than
+        the server's ``offload_buffer`` bytes are held, this thread
+        sends them, and the rest of the response, itself after all.
+        """
+        output = self.wsgi_output
+        output.extend(buffers)
+        self.wsgi_output_size += sum(map(len, buffers))
+        self.wsgi_output_size -= _send_nowait(self.connection, output)
+        if self.wsgi_output_size > self.server.offload_buffer:
+            self.wsgi_output = None
+            self.wsgi_flush_output(output)
+
+    def wsgi_flush_output(self, output):
+        """
+        Send the held ``output`` from this thread.
+        """
+        buffers = []
+        for data in output + [None]:
+            if not isinstance(data, (tuple, type(None))):
+                buffers.append(data)
+                continue
+            if buffers:
+                _sendmsg_all(self.connection.sendmsg, buffers)
+                buffers = []
+            if data is not None:
+                fd, offset, count = data
+                with open(fd, 'rb') as file:
+                    if self.connection.sendfile(file, offset, count) < count:
+                        # The file was truncated underneath us
+                        self.close_connection = 1
+
+    def wsgi_offload(self):
+        """
+        Hand what is left of the response to the server's
+        ``OutputWriter``, if anything is.  The connection then belongs
+        to the writer, which closes it, or (if it is kept alive) hands
+        it back to the connection manager, once it is done.
+        """
+        output, self.wsgi_output = self.wsgi_output, None
+        if not output:
+            return
+        if (not self.close_connection
+            and not isinstance(self.request, _ManagedConnection)):
+            # The response asked for a kept-alive connection after all,
+            # which only the connection manager could take back
+            self.wsgi_flush_output(output)
+            return
+        self.wsgi_offloaded = True
+        self.server.output_writer.write(self.request, self.client_address,
+                                        output, not self.close_connection)
+
+    def wsgi_is_secure(self):
+        """
+        True if the connection is over SSL (with either pyOpenSSL or
+        the ``ssl`` module)
+        """
+        return (hasattr(self.connection, 'get_context')
+                or hasattr(self.connection, 'cipher'))
 
-            self.end_headers()
-        self.wfile.write(chunk)
+    def wsgi_can_chunk(self):
+        """
+        True if the response can use chunked transfer-coding, which is
+        the case when both the server and the client speak HTTP/1.1
+        """
+        return (self.protocol_version >= 'HTTP/1.1'
+                and self.request_version >= 'HTTP/1.1')
 
     def wsgi_start_response(self, status, response_headers, exc_info=None):
         if exc_info:
@@ -183,6 +864,72 @@ class WSGIHandlerMixin:
         self.wsgi_curr_headers = (status, response_headers)
         return self.wsgi_write_chunk
 
+    def wsgi_server_environ(self):
+        """
+        The part of the environment that is the same for every request
+        to the server.  It is worked out for the first request and kept
+        on the server (as ``wsgi_base_environ``).
+        """
+        server = self.server
+        base = getattr(server, 'wsgi_base_environ', None)
+        if base is None:
+            (server_name, server_port) = server.server_address[:2]
+            base = {
+                    'wsgi.version': (1,0)
+                   ,'wsgi.url_scheme': 'http'
+                   ,'wsgi.errors': sys.stderr
+                   ,'wsgi.multithread': True
+                   ,'wsgi.multiprocess': False
+                   ,'wsgi.run_once': False
+                   ,'wsgi.file_wrapper': FileWrapper
+                   ,'SCRIPT_NAME': '' # application is root of server
+                   ,'SERVER_NAME': server_name
+                   ,'SERVER_PORT': str(server_port)
+                   # Set for every request that uses the fast path
+                   # for ``/path?query`` targets in wsgi_setup
+                   ,'paste.httpserver.proxy.scheme': 'http'
+                   ,'paste.httpserver.proxy.host': 'dummy'
+                   }
+            if hasattr(server, 'thread_pool'):
+                base['paste.httpserver.thread_pool'] = server.thread_pool
+                if server.thread_pool.cpu_executor is not None:
+                    base['paste.cpu_executor'] = server.thread_pool.cpu_executor
+            if hasattr(server, 'stats'):
+                base['paste.httpserver.stats'] = server.stats
+            server.wsgi_base_environ = base
+        return base
+
+    def wsgi_connection_environ(self):
+        """
+        ``wsgi_server_environ()`` plus the part of the environment that
+        is the same for every request on this connection (the client's
+        address, and the URL scheme).  This is copied to start the
+        environment of each request.
+        """
+        base = self.__dict__.get('_wsgi_connection_environ')
+        if base is not None:
+            return base
+        base = dict(self.wsgi_server_environ())
+        remote_address = base['REMOTE_ADDR'] = self.client_address[0]
+        if self.lookup_addresses:
+            # @@: make lookup_addreses actually work, at this point
+            #     it has been address_string() is overriden down in
+            #     file and hence is a noop
+            if remote_address.startswith("192.168.") \
+            or remote_address.startswith("10.") \
+            or remote_address.startswith("172.16."):
+                pass
+            else:
+                address_string = None # self.address_string()
+                if address_string:
+                    base['REMOTE_HOST'] = address_string
+        if self.wsgi_is_secure():
+            base['wsgi.url_scheme'] = 'https'
+            # @@: extract other SSL parameters from pyOpenSSL at...
+            # http://www.modssl.org/docs/2.8/ssl_reference.html#ToC25
+        self._wsgi_connection_environ = base
+        return base
+
     def wsgi_setup(self, environ=None):
         """
         Setup the member variables used by this WSGI mixin, including
@@ -192,15 +939,23 @@ class WSGIHandlerMixin:
         argument can be used to override any settings.
         """
 
-        dummy_url = 'http://dummy%s' % (self.path,)
-        (scheme, netloc, path, query, fragment) = urlsplit(dummy_url)
-        path = unquote(path)
-        endslash = path.endswith('/')
-        path = posixpath.normpath(path)
-        if endslash and path != '/':
-            # Put the slash back...
-            path += '/'
-        (server_name, server_port) = self.server.server_address[:2]
+        target = self.path
+        if target[:1] == '/' and '#' not in target:
+            # The usual origin-form target (``/path?query``)
+            path, _, query = target.partition('?')
+            scheme = netloc = None
+            if '%' in path:
+                path = unquote(path)
+        else:
+            dummy_url = 'http://dummy%s' % (target,)
+            (scheme, netloc, path, query, fragment) = urlsplit(dummy_url)
+            path = unquote(path)
+        if '/.' in path or '//' in path or not path.startswith('/'):
+            endslash = path.endswith('/')
+            path = posixpath.normpath(path)
+            if endslash and path != '/':
+                # Put the slash back...
+                path += '/'
 
         rfile = self.rfile
         # We can put in the protection to keep from over-reading the
@@ -209,71 +964,77 @@ class WSGIHandlerMixin:
             content_length = int(self.headers.get('Content-Length', '0'))
         except ValueError:
             content_length = 0
+        transfer_coding = self.headers.get('Transfer-Encoding', '')
+        chunked = (
+            transfer_coding.rsplit(',', 1)[-1].strip().lower() == 'chunked')
+        # Kept to tell, after the application, whether the client is
+        # still waiting for ``100 Continue``
+        self.wsgi_continue_hook = None
         if '100-continue' == self.headers.get('Expect','').lower():
-            rfile = LimitedLengthFile(ContinueHook(rfile, self.wfile.write), content_length)
+            rfile = self.wsgi_continue_hook = ContinueHook(
+                rfile, self.wfile.write)
+        if chunked:
+            rfile = ChunkedInputFile(rfile)
         else:
-            if not hasattr(self.connection, 'get_context'):
-                # @@: LimitedLengthFile is currently broken in connection
-                # with SSL (sporatic errors that are diffcult to trace, but
-                # ones that go away when you don't use LimitedLengthFile)
-                rfile = LimitedLengthFile(rfile, content_length)
-
-        remote_address = self.client_address[0]
-        self.wsgi_environ = {
-                'wsgi.version': (1,0)
-               ,'wsgi.url_scheme': 'http'
-               ,'wsgi.input': rfile
-               ,'wsgi.errors': sys.stderr
-               ,'wsgi.multithread': True
-               ,'wsgi.multiprocess': False
-               ,'wsgi.run_once': False
+            rfile = LimitedLengthFile(rfile, content_length)
+        body_timeout = getattr(self.server, 'body_timeout', None)
+        if (body_timeout and getattr(self.server, 'reaper', None) is not None
+            and (chunked or content_length > 0)):
+            # Only the time spent waiting for the body counts
+            rfile.file = _BodyDeadline(rfile.file, self,
+                                       time.time() + body_timeout)
+        self.wsgi_input = rfile
+
+        self.wsgi_environ = self.wsgi_connection_environ().copy()
+        self.wsgi_environ.update({
+                'wsgi.input': rfile
+               ,'wsgi.input_terminated': isinstance(
+                   rfile, (LimitedLengthFile, ChunkedInputFile))
                # CGI variables required by PEP-333
                ,'REQUEST_METHOD': self.command
-               ,'SCRIPT_NAME': '' # application is root of server
                ,'PATH_INFO': path
                ,'QUERY_STRING': query
                ,'CONTENT_TYPE': self.headers.get('Content-Type', '')
-               ,'CONTENT_LENGTH': self.headers.get('Content-Length', '0')
-               ,'SERVER_NAME': server_name
-               ,'SERVER_PORT': str(server_port)
                ,'SERVER_PROTOCOL': self.request_version
-               # CGI not required by PEP-333
-               ,'REMOTE_ADDR': remote_address
-               }
+               })
+        if not chunked:
+            # (If it is chunked the length isn't known in advance;
+            # wsgi.input_terminated tells the application to read
+            # wsgi.input to its end)
+            self.wsgi_environ['CONTENT_LENGTH'] = self.headers.get(
+                'Content-Length', '0')
         if scheme:
             self.wsgi_environ['paste.httpserver.proxy.scheme'] = scheme
         if netloc:
             self.wsgi_environ['paste.httpserver.proxy.host'] = netloc
 
-        if self.lookup_addresses:
-            # @@: make lookup_addreses actually work, at this point
-            #     it has been address_string() is overriden down in
-            #     file and hence is a noop
-            if remote_address.startswith("192.168.") \
-            or remote_address.startswith("10.") \
-            or remote_address.startswith("172.16."):
-                pass
-            else:
-                address_string = None # self.address_string()
-                if address_string:
-                    self.wsgi_environ['REMOTE_HOST'] = address_string
-
+        cpu_started = time.thread_time()
+        self.wsgi_environ['paste.httpserver.thread_cpu'] = (
+            lambda: time.thread_time() - cpu_started)
         if hasattr(self.server, 'thread_pool'):
             # Now that we know what the request was for, we should
             # tell the thread pool what its worker is working on
-            self.server.thread_pool.worker_tracker[_thread.get_ident()][1] = self.wsgi_environ
-            self.wsgi_environ['paste.httpserver.thread_pool'] = self.server.thread_pool
-
-        for k, v in self.headers.items():
-            key = 'HTTP_' + k.replace("-","_").upper()
-            if key in ('HTTP_CONTENT_TYPE','HTTP_CONTENT_LENGTH'):
-                continue
-            self.wsgi_environ[key] = ','.join(_get_headers(self.headers, k))
-
-        if hasattr(self.connection,'get_context'):
-            self.wsgi_environ['wsgi.url_scheme'] = 'https'
-            # @@: extract other SSL parameters from pyOpenSSL at...
-            # http://www.modssl.org/docs/2.8/ssl_reference.html#ToC25
+            info = self.server.thread_pool.worker_tracker[_thread.get_ident()]
+            if info[1] is None:
+                # The first request the task handles (later requests
+                # on the same connection didn't wait in the queue)
+                self.wsgi_environ['paste.httpserver.queue_wait'] = (
+                    info[0] - info[2])
+            else:
+                self.wsgi_environ['paste.httpserver.queue_wait'] = 0
+            self.wsgi_environ['paste.httpserver.dequeued'] = info[0]
+            info[1] = self.wsgi_environ
+
+        header_environ = getattr(self.headers, 'environ', None)
+        if header_environ is not None:
+            # Already worked out by parse_headers
+            self.wsgi_environ.update(header_environ)
+        else:
+            for k, v in self.headers.items():
+                key = 'HTTP_' + k.replace("-","_").upper()
+                if key in ('HTTP_CONTENT_TYPE','HTTP_CONTENT_LENGTH'):
+                    continue
+                self.wsgi_environ[key] = ','.join(_get_headers(self.headers, k))
 
         if environ:
             assert isinstance(environ, dict)
@@ -283,6 +1044,72 @@ class WSGIHandlerMixin:
 
         self.wsgi_curr_headers = None
         self.wsgi_headers_sent = False
+        self.wsgi_pending_head = None
+        self.wsgi_chunked = False
+        self.wsgi_no_body = False
+        self.wsgi_status_code = None
+        self.wsgi_bytes_out = 0
+        self.wsgi_output = None
+        if self.wsgi_can_offload():
+            self.wsgi_output = []
+            self.wsgi_output_size = 0
+
+    def wsgi_record_stats(self, time_started):
+        """
+        Record the request that started at ``time_started`` in the
+        server's ``ServerStats`` (if it has one).
+        """
+        stats = getattr(self.server, 'stats', None)
+        if stats is None:
+            return
+        stats.observe('service_time', time.time() - time_started)
+        stats.incr('requests')
+        code = getattr(self, 'wsgi_status_code', None)
+        if code:
+            stats.incr('status_%dxx' % (code // 100))
+        stats.incr('bytes_out', getattr(self, 'wsgi_bytes_out', 0))
+        rfile = getattr(self, 'wsgi_input', None)
+        if isinstance(rfile, (LimitedLengthFile, ChunkedInputFile)):
+            stats.incr('bytes_in', rfile.tell())
+
+    def wsgi_discard_input(self):
+        """
+        Skip over any part of the request body the application didn't
+        read, so that the next request on a kept-alive connection
+        (which may already be buffered, if the client pipelines its
+        requests) is read from the right place.  If too much is left,
+        or the client is still waiting for ``100 Continue``, the
+        connection is closed instead.
+        """
+        rfile = self.wsgi_input
+        if isinstance(rfile, LimitedLengthFile):
+            left = rfile.length - rfile._consumed
+            if left <= 0:
+                return
+            if left > self.max_discard_input:
+                self.close_connection = 1
+                return
+        elif isinstance(rfile, ChunkedInputFile):
+            if rfile.done:
+                return
+        else:
+            return
+        hook = getattr(self, 'wsgi_continue_hook', None)
+        if hook is not None and not hook._ContinueFile_sent:
+            self.close_connection = 1
+            return
+        discarded = 0
+        while discarded <= self.max_discard_input:
+            data = rfile.read(65536)
+            if not data:
+                break
+            discarded += len(data)
+        if isinstance(rfile, ChunkedInputFile):
+            finished = rfile.done
+        else:
+            finished = rfile._consumed >= rfile.length
+        if not finished:
+            self.close_connection = 1
 
     def wsgi_connection_drop(self, exce, environ=None):
         """
@@ -302,30 +1129,126 @@ class WSGIHandlerMixin:
             result = self.server.wsgi_application(self.wsgi_environ,
                                                   self.wsgi_start_response)
             try:
-                for chunk in result:
-                    self.wsgi_write_chunk(chunk)
-                if not self.wsgi_headers_sent:
-                    self.wsgi_write_chunk(b'')
+                if (isinstance(result, FileWrapper)
+                    and self.wsgi_sendfile(result)):
+                    pass
+                elif isinstance(result, (list, tuple)) and result:
+                    # The end of the response can go out with the last
+                    # chunk (which, for the common one-item list, is
+                    # also where the head goes)
+                    for chunk in result[:-1]:
+                        self.wsgi_write_chunk(chunk)
+                    self.wsgi_write_chunk(result[-1], last=True)
+                else:
+                    for chunk in result:
+                        self.wsgi_write_chunk(chunk)
+                    self.wsgi_write_chunk(b'', last=True)
             finally:
                 if hasattr(result,'close'):
                     result.close()
                 result = None
         except socket.error as exce:
+            self.close_connection = 1
             self.wsgi_connection_drop(exce, environ)
             return
         except Exception:
-            if not self.wsgi_headers_sent:
+            if self.wsgi_headers_sent and self.wsgi_pending_head is None:
+                # The response is incomplete; the client can only tell
+                # if we close the connection
+                self.close_connection = 1
+            else:
+                # Nothing has been written yet (though the application
+                # may have committed to a response), so report an error
                 error_msg = "Internal Server Error\n"
+                self.wsgi_headers_sent = False
+                self.wsgi_chunked = False
+                self.wsgi_pending_head = None
                 self.wsgi_curr_headers = (
                     '500 Internal Server Error',
                     [('Content-type', 'text/plain'),
                      ('Content-length', str(len(error_msg)))])
-                self.wsgi_write_chunk(b"Internal Server Error\n")
+                self.wsgi_write_chunk(b"Internal Server Error\n", last=True)
             raise
 
+def _use_listen_socket(server, listen_socket):
+    """
+    Private function that sets up ``server`` to accept connections on
+    a socket that is already bound and listening (such as one shared
+    with a parent process), in place of binding its own.
+    """
+    server.socket = listen_socket
+    server.server_address = listen_socket.getsockname()
+    host, port = server.server_address[:2]
+    server.server_name = socket.getfqdn(host)
+    server.server_port = port
+
+# Environment variable giving the file descriptor of a listening socket
+# that a new server process should take over
+LISTEN_FD_ENVIRON = 'PASTE_LISTEN_FD'
+
+def spawn_successor(listen_socket, args=None):
+    """
+    Start a new process that inherits ``listen_socket``, running the
+    command ``args`` (by default, the command line this process was
+    started with).  The socket's file descriptor is given in the
+    ``PASTE_LISTEN_FD`` environment variable, which ``serve()`` (see
+    ``inherited_listen_socket``) uses in place of binding a socket.
+
+    As the socket is never closed, connections that arrive while the
+    new process starts up wait in its backlog rather than being
+    refused.  Returns a ``subprocess.Popen``.
+    """
+    if args is None:
+        args = [sys.executable] + sys.argv
+    fd = listen_socket.fileno()
+    env = dict(os.environ)
+    env[LISTEN_FD_ENVIRON] = str(fd)
+    return subprocess.Popen(args, env=env, pass_fds=(fd,))
+
+def inherited_listen_socket():
+    """
+    Return the listening socket handed to this process by
+    ``spawn_successor``, or None.
+    """
+    fd = os.environ.pop(LISTEN_FD_ENVIRON, None)
+    if not fd:
+        return None
+    return socket.socket(fileno=int(fd))
+
 #
 # SSL Functionality
 #
+
+def _is_stdlib_ssl_context(ssl_context):
+    """
+    True if ``ssl_context`` is from the ``ssl`` module (rather than
+    from pyOpenSSL)
+    """
+    return ssl is not None and isinstance(ssl_context, ssl.SSLContext)
+
+def make_ssl_context(certfile, keyfile=None, session_tickets=None):
+    """
+    Create an ``ssl.SSLContext`` for a server, with the certificate
+    chain (and the private key, if ``keyfile`` is not given) in the PEM
+    file ``certfile``.
+
+    Clients can resume sessions (skipping most of the handshake) with
+    session tickets, and, for TLS 1.2, from OpenSSL's server-side
+    session cache.  ``session_tickets`` is the number of tickets sent
+    to a TLS 1.3 client after a handshake; 0 turns tickets off
+    altogether (leaving only the session cache).  The default is
+    OpenSSL's (2 tickets).
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile)
+    if session_tickets is not None:
+        session_tickets = int(session_tickets)
+        if not session_tickets:
+            context.options |= ssl.OP_NO_TICKET
+        if hasattr(context, 'num_tickets'):
+            context.num_tickets = session_tickets
+    return context
+
 # This implementation was motivated by Sebastien Martini's SSL example
 # http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/442473
 #
@@ -339,9 +1262,19 @@ except ImportError:
     SocketErrors = (socket.error,)
     class SecureHTTPServer(HTTPServer):
         def __init__(self, server_address, RequestHandlerClass,
-                     ssl_context=None, request_queue_size=None):
-            assert not ssl_context, "pyOpenSSL not installed"
-            HTTPServer.__init__(self, server_address, RequestHandlerClass)
+                     ssl_context=None, request_queue_size=None,
+                     listen_socket=None):
+            assert not ssl_context or _is_stdlib_ssl_context(ssl_context), (
+                "pyOpenSSL not installed")
+            self.ssl_context = ssl_context
+            if listen_socket is None:
+                HTTPServer.__init__(self, server_address, RequestHandlerClass)
+            else:
+                HTTPServer.__init__(self, server_address, RequestHandlerClass,
+                                    bind_and_activate=False)
+                self.socket.close()
+                _use_listen_socket(self, listen_socket)
+                self.server_activate()
             if request_queue_size:
                 self.socket.listen(request_queue_size)
 else:
@@ -351,7 +1284,12 @@ else:
         def __init__(self, conn):
             self.__conn = conn
         def makefile(self, mode, bufsize):
-            return socket.SocketIO(self.__conn, mode)
+            raw = socket.SocketIO(self.__conn, mode)
+            if 'r' in mode:
+                # Buffered, so that read(size) doesn't come back short
+                # (and readline() doesn't read a byte at a time)
+                return io.BufferedReader(raw)
+            return raw
         def __getattr__(self, attrib):
             return getattr(self.__conn, attrib)
 
@@ -369,15 +1307,21 @@ else:
         """
 
         def __init__(self, server_address, RequestHandlerClass,
-                     ssl_context=None, request_queue_size=None):
+                     ssl_context=None, request_queue_size=None,
+                     listen_socket=None):
             # This overrides the implementation of __init__ in python's
             # SocketServer.TCPServer (which BaseHTTPServer.HTTPServer
             # does not override, thankfully).
-            HTTPServer.__init__(self, server_address, RequestHandlerClass)
-            self.socket = socket.socket(self.address_family,
-                                        self.socket_type)
+            HTTPServer.__init__(self, server_address, RequestHandlerClass,
+                                bind_and_activate=listen_socket is None)
+            if listen_socket is None:
+                self.socket = socket.socket(self.address_family,
+                                            self.socket_type)
+            else:
+                self.socket.close()
+                _use_listen_socket(self, listen_socket)
             self.ssl_context = ssl_context
-            if ssl_context:
+            if ssl_context and not _is_stdlib_ssl_context(ssl_context):
                 class TSafeConnection(tsafe.Connection):
                     def settimeout(self, *args):
                         self._lock.acquire()
@@ -392,7 +1336,8 @@ else:
                         finally:
                             self._lock.release()
                 self.socket = TSafeConnection(ssl_context, self.socket)
-            self.server_bind()
+            if listen_socket is None:
+                self.server_bind()
             if request_queue_size:
                 self.socket.listen(request_queue_size)
             self.server_activate()
@@ -402,7 +1347,7 @@ else:
             # ``makefile(mode, bufsize)`` method as expected by
             # Socketserver.StreamRequestHandler.
             (conn, info) = self.socket.accept()
-            if self.ssl_context:
+            if self.ssl_context and not _is_stdlib_ssl_context(self.ssl_context):
                 conn = _ConnFixer(conn)
             return (conn, info)
 
@@ -436,6 +1381,13 @@ class WSGIHandler(WSGIHandlerMixin, BaseHTTPRequestHandler):
     """
     server_version = 'PasteWSGIServer/' + __version__
 
+    # Set when the connection was kept alive and should be handed to
+    # the server's ConnectionManager rather than closed
+    wsgi_parked = False
+
+    # Set once the connection has handled a request
+    wsgi_kept_alive = False
+
     def handle_one_request(self):
         """Handle a single HTTP request.
 
@@ -444,20 +1396,68 @@ class WSGIHandler(WSGIHandlerMixin, BaseHTTPRequestHandler):
         commands such as GET and POST.
 
         """
-        self.raw_requestline = self.rfile.readline()
+        server = self.server
+        if getattr(server, 'reaper', None) is not None:
+            if self.wsgi_kept_alive:
+                # Wait for the client to start its next request
+                self.wsgi_request_deadline = None
+                self.wsgi_watch('idle', server.keepalive_timeout)
+                self.rfile.peek(1)
+            self.wsgi_kept_alive = True
+            if server.request_timeout:
+                self.wsgi_request_deadline = (
+                    time.time() + server.request_timeout)
+            self.wsgi_watch('head', server.header_timeout)
+        self.raw_requestline = self.rfile.readline(self.max_header_line + 1)
         if not self.raw_requestline:
             self.close_connection = 1
             return
+        if len(self.raw_requestline) > self.max_header_line:
+            self.requestline = ''
+            self.request_version = self.default_request_version
+            self.command = None
+            self.send_error(HTTPStatus.REQUEST_URI_TOO_LONG)
+            self.close_connection = 1
+            return
         if not self.parse_request(): # An error code has been sent, just exit
             return
-        self.wsgi_execute()
+        self.wsgi_watch('request')
+        time_started = time.time()
+        try:
+            self.wsgi_execute()
+            if not self.close_connection:
+                self.wsgi_discard_input()
+            self.wsgi_offload()
+        finally:
+            if self.wsgi_output:
+                # Something went wrong; send what we have
+                output, self.wsgi_output = self.wsgi_output, None
+                self.wsgi_flush_output(output)
+            self.wsgi_record_stats(time_started)
 
     def handle(self):
         # don't bother logging disconnects while handling a request
         try:
-            BaseHTTPRequestHandler.handle(self)
+            self.close_connection = True
+            self.handle_one_request()
+            can_park = (
+                isinstance(self.request, _ManagedConnection)
+                and getattr(self.server, 'connection_manager', None) is not None)
+            while not self.close_connection and not self.wsgi_offloaded:
+                if can_park and not self.rfile.has_request_head():
+                    # Wait for the next request in the connection
+                    # manager instead of blocking this thread
+                    self.wsgi_parked = True
+                    break
+                # Either the client pipelined its next request and it
+                # is already buffered, or we just block until it comes
+                self.handle_one_request()
         except SocketErrors as exce:
             self.wsgi_connection_drop(exce)
+        finally:
+            reaper = getattr(self.server, 'reaper', None)
+            if reaper is not None:
+                reaper.unwatch(self.connection)
 
     def address_string(self):
         """Return the client address formatted for logging.
@@ -480,7 +1480,7 @@ class LimitedLengthFile:
 
     def read(self, length=None):
         left = self.length - self._consumed
-        if length is None:
+        if length is None or length < 0:
             length = left
         else:
             length = min(length, left)
@@ -493,16 +1493,53 @@ class LimitedLengthFile:
 
     def readline(self, *args):
         max_read = self.length - self._consumed
-        if len(args):
+        if len(args) and args[0] is not None and args[0] >= 0:
             max_read = min(args[0], max_read)
+        if max_read <= 0:
+            return b''
         data = self.file.readline(max_read)
         self._consumed += len(data)
         return data
 
+    def readinto(self, buffer):
+        return self._readinto(buffer, 'readinto')
+
+    def readinto1(self, buffer):
+        return self._readinto(buffer, 'readinto1')
+
+    def _readinto(self, buffer, method):
+        left = self.length - self._consumed
+        if left <= 0:
+            return 0
+        buffer = memoryview(buffer).cast('B')
+        if len(buffer) > left:
+            buffer = buffer[:left]
+        n = _readinto(self.file, buffer, method)
+        self._consumed += n
+        return n
+
+    def chunks(self, size=65536):
+        """
+        Iterate over the rest of the body in chunks of up to ``size``
+        bytes, which are read into one buffer: each chunk is a
+        memoryview that is only good until the next one is read.
+        """
+        return _iter_chunks(self, size)
+
     def readlines(self, hint=None):
-        data = self.file.readlines(hint)
-        for chunk in data:
-            self._consumed += len(chunk)
+        # Read line by line rather than with self.file.readlines(),
+        # which would read past the end of the body (and into the
+        # next request, on a kept-alive connection)
+        data = []
+        total = 0
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            data.append(line)
+            total += len(line)
+            if hint and total >= hint:
+                break
         return data
 
     def __iter__(self):
@@ -528,54 +1565,1472 @@ class LimitedLengthFile:
                 pass
         return self._consumed
 
-class ThreadPool:
+class _BodyDeadline:
+    """
+    Wraps the file a request body is read from, so that while a read
+    is waiting for the client the handler's connection is watched by
+    the server's ``ConnectionReaper`` with the body ``deadline``.
     """
-    Generic thread pool with a queue of callables to consume.
-
-    Keeps a notion of the status of its worker threads:
 
-    idle: worker thread with nothing to do
+    def __init__(self, file, handler, deadline):
+        self.file = file
+        self.handler = handler
+        self.deadline = deadline
 
-    busy: worker thread doing its job
+    def _call(self, method, *args):
+        handler = self.handler
+        reaper = handler.server.reaper
+        reaper.watch(handler.connection, 'body', self.deadline)
+        try:
+            return getattr(self.file, method)(*args)
+        finally:
+            handler.wsgi_watch('request')
 
-    hung: worker thread that's been doing a job for too long
+    def read(self, size=-1):
+        return self._call('read', size)
 
-    dying: a hung thread that has been killed, but hasn't died quite
-    yet.
+    def readline(self, size=-1):
+        return self._call('readline', size)
 
-    zombie: what was a worker thread that we've tried to kill but
-    isn't dead yet.
+    def readinto(self, buffer):
+        return self._call('readinto', buffer)
 
-    At any time you can call track_threads, to get a dictionary with
-    these keys and lists of thread_ids that fall in that status.  All
-    keys will be present, even if they point to emty lists.
+    def readinto1(self, buffer):
+        return self._call('readinto1', buffer)
 
-    hung threads are threads that have been busy more than
-    hung_thread_limit seconds.  Hung threads are killed when they live
-    longer than kill_thread_limit seconds.  A thread is then
-    considered dying for dying_limit seconds, if it is still alive
-    after that it is considered a zombie.
+    def peek(self, size=0):
+        return self._call('peek', size)
 
-    When there are no idle workers and a request comes in, another
-    worker *may* be spawned.  If there are less than spawn_if_under
-    threads in the busy state, another thread will be spawned.  So if
-    the limit is 5, and there are 4 hung threads and 6 busy threads,
-    no thread will be spawned.
+    def __getattr__(self, attr):
+        return getattr(self.file, attr)
 
-    When there are more than max_zombie_threads_before_die zombie
-    threads, a SystemExit exception will be raised, stopping the
-    server.  Use 0 or None to never raise this exception.  Zombie
-    threads *should* get cleaned up, but killing threads is no
-    necessarily reliable.  This is turned off by default, since it is
-    only a good idea if you've deployed the server with some process
-    watching from above (something similar to daemontools or zdaemon).
+class ChunkedInputFile:
+    """
+    Decodes a request body sent with ``Transfer-Encoding: chunked``,
+    presenting it as a file that ends where the body ends (as
+    ``LimitedLengthFile`` does for a body with a ``Content-Length``).
 
-    Each worker thread only processes ``max_requests`` tasks before it
-    dies and replaces itself with a new worker thread.
+    Chunks are decoded as they are read, so the body is never held in
+    memory as a whole.  A malformed or truncated body raises
+    ``IOError``, which the server treats like a dropped connection.
     """
 
+    # The longest chunk-size or trailer line that is accepted
+    max_line = 4096
 
-    SHUTDOWN = object()
+    def __init__(self, file):
+        self.file = file
+        self.done = False
+        self._chunk_left = 0
+        self._first_chunk = True
+        self._consumed = 0
+
+    def __repr__(self):
+        base_repr = repr(self.file)
+        return base_repr[:-1] + ' chunked>'
+
+    def _readline(self):
+        line = self.file.readline(self.max_line + 1)
+        if not line.endswith(b'\n'):
+            raise IOError("Truncated or invalid chunked request body")
+        return line
+
+    def _start_chunk(self):
+        """
+        Reads the size of the next chunk (or, after the last chunk,
+        the trailers).
+        """
+        if not self._first_chunk:
+            # The CRLF that ends the previous chunk's data
+            if self._readline().strip():
+                raise IOError("Chunk data longer than chunk size")
+        self._first_chunk = False
+        size = self._readline().split(b';', 1)[0].strip()
+        if not size or size.strip(b'0123456789abcdefABCDEF'):
+            raise IOError("Invalid chunk size: %r" % size)
+        self._chunk_left = int(size, 16)
+        if not self._chunk_left:
+            # The last chunk; skip any trailers
+            while self._readline().strip():
+                pass
+            self.done = True
+
+    def _read_chunk(self, size):
+        """
+        Reads at most ``size`` bytes, from a single chunk
+        """
+        if not self._chunk_left:
+            if self.done:
+                return b''
+            self._start_chunk()
+            if self.done:
+                return b''
+        data = self.file.read(min(size, self._chunk_left))
+        if not data:
+            raise IOError("Truncated chunked request body")
+        self._chunk_left -= len(data)
+        self._consumed += len(data)
+        return data
+
+    def read(self, size=None):
+        if size is None or size < 0:
+            size = sys.maxsize
+        chunks = []
+        while size > 0:
+            data = self._read_chunk(min(size, 65536))
+            if not data:
+                break
+            chunks.append(data)
+            size -= len(data)
+        return b''.join(chunks)
+
+    def readline(self, size=None):
+        if size is None or size < 0:
+            size = sys.maxsize
+        parts = []
+        while size > 0:
+            if not self._chunk_left:
+                if self.done:
+                    break
+                self._start_chunk()
+                continue
+            line = self.file.readline(min(size, self._chunk_left))
+            if not line:
+                raise IOError("Truncated chunked request body")
+            self._chunk_left -= len(line)
+            self._consumed += len(line)
+            size -= len(line)
+            parts.append(line)
+            if line.endswith(b'\n'):
+                break
+        return b''.join(parts)
+
+    def readinto(self, buffer):
+        """
+        Read from a single chunk straight into ``buffer``.
+        """
+        if not self._chunk_left:
+            if self.done:
+                return 0
+            self._start_chunk()
+            if self.done:
+                return 0
+        buffer = memoryview(buffer).cast('B')
+        if len(buffer) > self._chunk_left:
+            buffer = buffer[:self._chunk_left]
+        n = _readinto(self.file, buffer)
+        if not n:
+            raise IOError("Truncated chunked request body")
+        self._chunk_left -= n
+        self._consumed += n
+        return n
+
+    readinto1 = readinto
+
+    def chunks(self, size=65536):
+        """
+        Iterate over the rest of the body (see
+        ``LimitedLengthFile.chunks``).
+        """
+        return _iter_chunks(self, size)
+
+    def readlines(self, hint=None):
+        data = []
+        total = 0
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            data.append(line)
+            total += len(line)
+            if hint and total >= hint:
+                break
+        return data
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+    __next__ = next
+
+    def tell(self):
+        return self._consumed
+
+class _SocketReader:
+    """
+    A small buffered reader for a socket.
+
+    Unlike the file returned by ``socket.makefile('rb')``, its
+    read-ahead buffer is accessible: a ``ConnectionManager`` can fill
+    it without blocking while the connection is parked, and tell when
+    a complete request head has arrived.
+    """
+
+    bufsize = 65536
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._buf = bytearray()
+        self.closed = False
+
+    def buffered(self):
+        """
+        Number of bytes that have been received but not read yet.
+        """
+        return len(self._buf)
+
+    def peek(self, size=0):
+        """
+        The bytes that have been received but not read yet (without
+        copying them, so don't change them).  If there are none, this
+        waits for some.
+        """
+        if not self._buf:
+            self._recv()
+        return self._buf
+
+    def has_request_head(self):
+        """
+        True if the buffer holds a complete request line and headers.
+        """
+        buf = self._buf
+        return b'\r\n\r\n' in buf or b'\n\n' in buf
+
+    def fill(self):
+        """
+        Receive whatever is available from a non-blocking socket.
+        Returns False if the peer has closed the connection.
+        """
+        try:
+            data = self._sock.recv(self.bufsize)
+        except (BlockingIOError, InterruptedError) + _SSLWouldBlock:
+            return True
+        if not data:
+            return False
+        self._buf += data
+        pending = getattr(self._sock, 'pending', None)
+        while pending is not None and pending():
+            # An SSL socket may have decrypted more than it returned,
+            # which the selector can't see
+            self._buf += self._sock.recv(self.bufsize)
+        return True
+
+    def _recv(self):
+        data = self._sock.recv(self.bufsize)
+        self._buf += data
+        return len(data)
+
+    def read(self, size=-1):
+        buf = self._buf
+        if size is None or size < 0:
+            while self._recv():
+                pass
+            size = len(buf)
+        else:
+            while len(buf) < size:
+                if not self._recv():
+                    break
+        data = bytes(buf[:size])
+        del buf[:size]
+        return data
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast('B')
+        buf = self._buf
+        if not buf:
+            # Nothing buffered: receive straight into the caller's buffer
+            return self._sock.recv_into(buffer)
+        n = min(len(buffer), len(buf))
+        buffer[:n] = buf[:n]
+        del buf[:n]
+        return n
+
+    # readinto() never receives more than once already
+    readinto1 = readinto
+
+    def readline(self, size=-1):
+        if size is None:
+            size = -1
+        buf = self._buf
+        start = 0
+        while True:
+            end = buf.find(b'\n', start) + 1
+            if end:
+                break
+            if 0 <= size <= len(buf):
+                end = size
+                break
+            start = len(buf)
+            if not self._recv():
+                end = len(buf)
+                break
+        if 0 <= size < end:
+            end = size
+        data = bytes(buf[:end])
+        del buf[:end]
+        return data
+
+    def readlines(self, hint=-1):
+        lines = []
+        total = 0
+        for line in self:
+            lines.append(line)
+            total += len(line)
+            if hint and 0 < hint <= total:
+                break
+        return lines
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        # The socket (and anything left in the buffer) belongs to the
+        # connection, which may be kept alive for another request
+        pass
+
+class _ManagedConnection:
+    """
+    Wraps an accepted socket so that ``makefile('rb')`` hands back a
+    ``_SocketReader`` that stays with the connection while it is
+    parked in a ``ConnectionManager``.
+    """
+    # True until the manager has done the SSL handshake
+    handshaking = False
+
+    def __init__(self, conn):
+        self.__conn = conn
+        self.reader = _SocketReader(conn)
+    def makefile(self, mode, bufsize=-1):
+        if 'r' in mode:
+            return self.reader
+        return self.__conn.makefile(mode, bufsize)
+    def __getattr__(self, attrib):
+        return getattr(self.__conn, attrib)
+
+class ConnectionManager:
+    """
+    Holds idle keep-alive connections in a selector loop, so that a
+    client that keeps its connection open between requests does not
+    tie up a worker thread while it is thinking.
+
+    Worker threads hand a connection over with ``park()`` once they
+    have finished a request.  The manager's thread then waits for the
+    connection to become readable and buffers what arrives; only once
+    a complete request head has been received (or the head has grown
+    past ``max_head_size``, so the handler can reject it) is the
+    connection passed back with ``dispatch(conn, client_address)``.
+
+    Connections that the client closes, or that stay idle for longer
+    than the ``timeout`` given to ``park()``, are closed with
+    ``close(conn)``.  Once part of a request head has arrived, the
+    rest of it must come within ``head_timeout`` seconds (if that is
+    set).
+
+    New SSL connections (made with the ``ssl`` module) are handed over
+    with ``handshake()``, so that the manager does the handshake
+    without blocking, before any worker thread is involved.
+    """
+
+    max_head_size = 65536
+
+    # Seconds a client gets to finish the SSL handshake, if no other
+    # timeout is given
+    handshake_timeout = 30
+
+    # Seconds a client gets to send the rest of a request head
+    head_timeout = None
+
+    def __init__(self, dispatch, close, name="ConnectionManager",
+                 logger=None, stats=None):
+        self.dispatch = dispatch
+        self.close = close
+        self.name = name
+        self.stats = stats
+        if logger is None:
+            logger = logging.getLogger('paste.httpserver.ConnectionManager')
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self.selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        # Connections parked by worker threads, waiting to be
+        # registered by the manager thread:
+        self._incoming = []
+        self._lock = threading.Lock()
+        # Heap of (deadline, sequence, conn) for idle timeouts; entries
+        # for connections that have since been dispatched are skipped
+        self._deadlines = []
+        self._sequence = count()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def park(self, conn, client_address, timeout=None):
+        """
+        Hand an idle connection (a ``_ManagedConnection``) to the
+        manager.  This is called from worker threads.
+        """
+        if not self.running:
+            self._close(conn)
+            return
+        conn.setblocking(False)
+        with self._lock:
+            self._incoming.append((conn, client_address, timeout))
+        self._wakeup()
+
+    def handshake(self, conn, client_address, timeout=None):
+        """
+        Hand a new connection (a ``_ManagedConnection`` around an
+        ``ssl.SSLSocket`` created with ``do_handshake_on_connect=False``)
+        to the manager, which completes the SSL handshake and then
+        waits for its first request as if it were parked.
+        """
+        conn.handshaking = True
+        self.park(conn, client_address, timeout or self.handshake_timeout)
+
+    def parked_count(self):
+        """
+        Number of connections currently waiting for a request.
+        """
+        return len(self.selector.get_map()) - 1
+
+    def _wakeup(self):
+        try:
+            self._wakeup_send.send(b'\0')
+        except OSError:
+            # The wakeup socket is full (so the loop will wake up
+            # anyway) or already closed
+            pass
+
+    def run(self):
+        """
+        The manager thread's loop.
+        """
+        try:
+            while self.running:
+                try:
+                    self._register_incoming()
+                    timeout = self._close_expired()
+                    for key, events in self.selector.select(timeout):
+                        if key.fileobj is self._wakeup_recv:
+                            self._drain_wakeup()
+                        else:
+                            self._readable(key.fileobj, key.data)
+                except Exception:
+                    self.logger.exception('Error in %s', self.name)
+        finally:
+            self._close_all()
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _register_incoming(self):
+        with self._lock:
+            incoming, self._incoming = self._incoming, []
+        for conn, client_address, timeout in incoming:
+            if conn.reader.has_request_head():
+                self._dispatch(conn, client_address)
+                continue
+            deadline = None
+            if timeout:
+                deadline = time.time() + timeout
+                heapq.heappush(self._deadlines,
+                               (deadline, next(self._sequence), conn))
+            try:
+                self.selector.register(conn, selectors.EVENT_READ,
+                                       (client_address, deadline))
+            except (OSError, ValueError):
+                self._close(conn)
+
+    def _readable(self, conn, data):
+        if conn.handshaking:
+            self._handshake(conn, data)
+            return
+        reader = conn.reader
+        started = reader.buffered()
+        try:
+            alive = reader.fill()
+        except OSError:
+            alive = False
+        if not alive:
+            self.selector.unregister(conn)
+            self._close(conn)
+        elif (reader.has_request_head()
+              or reader.buffered() >= self.max_head_size):
+            self.selector.unregister(conn)
+            self._dispatch(conn, data[0])
+        elif not started and reader.buffered() and self.head_timeout:
+            # The client has started a request; the idle timeout no
+            # longer applies
+            deadline = time.time() + self.head_timeout
+            heapq.heappush(self._deadlines,
+                           (deadline, next(self._sequence), conn))
+            self.selector.modify(conn, selectors.EVENT_READ,
+                                 (data[0], deadline))
+
+    def _handshake(self, conn, data):
+        try:
+            conn.do_handshake()
+        except ssl.SSLWantReadError:
+            self.selector.modify(conn, selectors.EVENT_READ, data)
+            return
+        except ssl.SSLWantWriteError:
+            self.selector.modify(conn, selectors.EVENT_WRITE, data)
+            return
+        except (OSError, ValueError) as e:
+            self.logger.debug('SSL handshake with %s failed: %s', data[0], e)
+            self.selector.unregister(conn)
+            self._close(conn)
+            return
+        conn.handshaking = False
+        self.selector.modify(conn, selectors.EVENT_READ, data)
+        # The client may have sent its request right behind the
+        # handshake
+        self._readable(conn, data)
+
+    def _dispatch(self, conn, client_address):
+        try:
+            conn.setblocking(True)
+        except OSError:
+            self._close(conn)
+            return
+        self.dispatch(conn, client_address)
+
+    def _close(self, conn):
+        try:
+            self.close(conn)
+        except OSError:
+            pass
+
+    def _close_expired(self):
+        """
+        Close connections that have been idle for too long, and
+        return the time until the next one expires.
+        """
+        deadlines = self._deadlines
+        now = time.time()
+        while deadlines and deadlines[0][0] <= now:
+            deadline, _, conn = heapq.heappop(deadlines)
+            try:
+                key = self.selector.get_key(conn)
+            except (KeyError, ValueError):
+                continue
+            if key.fileobj is conn and key.data[1] == deadline:
+                self.logger.debug('Closing idle connection from %s',
+                                  key.data[0])
+                if self.stats is not None:
+                    if conn.reader.buffered():
+                        self.stats.incr('reaped_head')
+                    else:
+                        self.stats.incr('reaped_idle')
+                self.selector.unregister(conn)
+                self._close(conn)
+        if deadlines:
+            return max(deadlines[0][0] - now, 0)
+        return None
+
+    def _close_all(self):
+        with self._lock:
+            incoming, self._incoming = self._incoming, []
+        conns = [conn for conn, client_address, timeout in incoming]
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj is not self._wakeup_recv:
+                conns.append(key.fileobj)
+        for conn in conns:
+            self._close(conn)
+        self.selector.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+
+    def shutdown(self):
+        """
+        Stop the manager thread and close all parked connections.
+        """
+        self.running = False
+        self._wakeup()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+class ConnectionReaper:
+    """
+    Closes the connections of clients that are too slow.
+
+    Handlers tell the reaper what each connection is doing with
+    ``watch(conn, phase, deadline)`` (e.g., reading the request head,
+    or waiting for the next request), and ``unwatch(conn)`` when
+    there is no deadline.  Every ``interval`` seconds the reaper's
+    thread shuts down the connections that are past their deadline,
+    so the worker thread blocked reading from the client gets an end
+    of file and moves on.  Each is counted in ``stats`` as
+    ``reaped_<phase>``.
+    """
+
+    interval = 1
+
+    def __init__(self, name="ConnectionReaper", logger=None, stats=None):
+        self.name = name
+        if logger is None:
+            logger = logging.getLogger('paste.httpserver.ConnectionReaper')
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+        self.stats = stats
+        # conn -> (deadline, phase)
+        self._deadlines = {}
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def watch(self, conn, phase, deadline):
+        self._deadlines[conn] = (deadline, phase)
+
+    def unwatch(self, conn):
+        self._deadlines.pop(conn, None)
+
+    def watched_count(self):
+        return len(self._deadlines)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reap()
+            except Exception:
+                self.logger.exception('Error in %s', self.name)
+
+    def reap(self, now=None):
+        """
+        Shut down the connections that are past their deadline.
+        """
+        if now is None:
+            now = time.time()
+        deadlines = self._deadlines
+        for conn, entry in list(deadlines.items()):
+            if entry[0] > now:
+                continue
+            if deadlines.get(conn) != entry:
+                # The handler has moved on in the meantime
+                continue
+            deadlines.pop(conn, None)
+            phase = entry[1]
+            self.logger.info('Closing a connection that took too long (%s)',
+                             phase)
+            if self.stats is not None:
+                self.stats.incr('reaped_' + phase)
+            # pyOpenSSL connections have the socket's shutdown under
+            # another name
+            shutdown = getattr(conn, 'sock_shutdown', None) or conn.shutdown
+            try:
+                shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self._stop.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+class OutputWriter:
+    """
+    Sends the rest of responses to clients that couldn't take them
+    right away, so that a slow client doesn't hold up a worker thread
+    for the whole download.
+
+    A handler that has its complete response hands the part the client
+    hasn't taken yet to ``write()``: a list of byte strings and
+    ``(fd, offset, count)`` tuples for parts of files (which are sent
+    with ``os.sendfile()``, and whose descriptors the writer closes).
+    The writer's thread sends it as the socket becomes writable, and
+    then calls ``done(conn, client_address)`` if the connection is to
+    be kept alive, or ``close(conn)``.  The connection is also closed
+    if the client goes away, or takes nothing for ``timeout`` seconds.
+    """
+
+    timeout = 60
+
+    def __init__(self, done, close, name="OutputWriter", logger=None,
+                 stats=None):
+        self.done = done
+        self.close = close
+        self.name = name
+        self.stats = stats
+        if logger is None:
+            logger = logging.getLogger('paste.httpserver.OutputWriter')
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self.selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        # Output handed over by worker threads, waiting to be
+        # registered by the writer thread:
+        self._incoming = []
+        self._lock = threading.Lock()
+        self._drain_until = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, conn, client_address, output, keep_alive=False):
+        """
+        Send ``output`` to ``conn``.  This is called from worker
+        threads.
+        """
+        if not self.running:
+            self._finish(conn, [client_address, output, False, 0])
+            return
+        if self.stats is not None:
+            self.stats.incr('offloaded_responses')
+        conn.setblocking(False)
+        with self._lock:
+            self._incoming.append((conn, client_address, output, keep_alive))
+        self._wakeup()
+
+    def writing_count(self):
+        """
+        Number of connections the writer is sending responses to.
+        """
+        return len(self.selector.get_map()) - 1 + len(self._incoming)
+
+    def _wakeup(self):
+        try:
+            self._wakeup_send.send(b'\0')
+        except OSError:
+            pass
+
+    def run(self):
+        """
+        The writer thread's loop.
+        """
+        try:
+            while (self.running
+                   or (self.writing_count()
+                       and time.time() < self._drain_until)):
+                try:
+                    self._register_incoming()
+                    self._close_expired()
+                    for key, events in self.selector.select(1):
+                        if key.fileobj is self._wakeup_recv:
+                            self._drain_wakeup()
+                        else:
+                            self._writable(key.fileobj, key.data)
+                except Exception:
+                    self.logger.exception('Error in %s', self.name)
+        finally:
+            self._close_all()
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _register_incoming(self):
+        with self._lock:
+            incoming, self._incoming = self._incoming, []
+        for conn, client_address, output, keep_alive in incoming:
+            # [client_address, output, keep_alive, time of last progress]
+            job = [client_address, output, keep_alive, time.time()]
+            try:
+                self.selector.register(conn, selectors.EVENT_WRITE, job)
+            except (OSError, ValueError):
+                job[2] = False
+                self._finish(conn, job)
+
+    def _writable(self, conn, job):
+        output = job[1]
+        try:
+            while output:
+                if isinstance(output[0], tuple):
+                    fd, offset, count = output[0]
+                    sent = os.sendfile(conn.fileno(), fd, offset, count)
+                    if not sent:
+                        # The file was truncated underneath us
+                        raise EOFError
+                    if sent < count:
+                        output[0] = (fd, offset + sent, count - sent)
+                    else:
+                        os.close(fd)
+                        output.pop(0)
+                elif not _send_nowait(conn, output):
+                    break
+                job[3] = time.time()
+        except (BlockingIOError, InterruptedError):
+            pass
+        except (OSError, EOFError) as e:
+            self.logger.debug('Error writing to %s: %s', job[0], e)
+            job[2] = False
+        if output and job[2] is not False:
+            return
+        self.selector.unregister(conn)
+        self._finish(conn, job)
+
+    def _finish(self, conn, job):
+        """
+        Done with ``conn``: close any files left, and hand the
+        connection back or close it.
+        """
+        client_address, output, keep_alive = job[:3]
+        for data in output:
+            if isinstance(data, tuple):
+                try:
+                    os.close(data[0])
+                except OSError:
+                    pass
+        del output[:]
+        try:
+            if keep_alive:
+                self.done(conn, client_address)
+            else:
+                self.close(conn)
+        except OSError:
+            pass
+
+    def _close_expired(self):
+        """
+        Close the connections of clients that have taken nothing for
+        ``timeout`` seconds.
+        """
+        expired = time.time() - self.timeout
+        for key in list(self.selector.get_map().values()):
+            job = key.data
+            if job is not None and job[3] < expired:
+                self.logger.debug('Closing connection to %s that stopped '
+                                  'reading', job[0])
+                if self.stats is not None:
+                    self.stats.incr('reaped_output')
+                self.selector.unregister(key.fileobj)
+                job[2] = False
+                self._finish(key.fileobj, job)
+
+    def _close_all(self):
+        with self._lock:
+            incoming, self._incoming = self._incoming, []
+        for conn, client_address, output, keep_alive in incoming:
+            self._finish(conn, [client_address, output, False, 0])
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj is not self._wakeup_recv:
+                key.data[2] = False
+                self._finish(key.fileobj, key.data)
+        self.selector.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+
+    def shutdown(self, drain_timeout=0):
+        """
+        Stop the writer thread, after up to ``drain_timeout`` seconds
+        to finish the responses it is sending, and close the
+        connections that are left.
+        """
+        self._drain_until = time.time() + drain_timeout
+        self.running = False
+        self._wakeup()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+def _is_normal_path(path):
+    # Whether the (unquoted) path can be looked up as it is: wsgi_setup
+    # would normalize one with dot-segments or empty segments, and a
+    # NUL can't be in a filename
+    return not ('/.' in path or '//' in path or '\0' in path)
+
+class StaticFiles:
+    """
+    Serves the files in ``directory``, for the URLs under ``prefix``
+    (except those under one of the ``exclude`` prefixes), without a
+    worker thread or the application (see
+    ``ThreadPoolMixIn.start_static_files``).
+
+    Only the common case is handled here: a ``GET`` or ``HEAD``
+    request, without a body, for a regular file, answered with ``200
+    OK``, ``206 Partial Content`` or ``304 Not Modified``.  Conditional
+    and ``Range`` requests are answered as ``paste.fileapp.FileApp``
+    answers them, as that is what is used.  Any other request (for a
+    directory or a missing file, for instance) goes to the application
+    as usual, so the application must serve the same directory at the
+    same prefix; ``find()`` makes a ``StaticFiles`` for each static
+    mount of an application.
+
+    The files are looked up and opened in the connection manager's
+    thread, so this is only worthwhile for a local disk (or files
+    that are in the page cache): while a lookup waits on a slow disk,
+    no other connection is served by that thread.
+    """
+
+    # The most FileApps kept
+    max_apps = 1000
+
+    def __init__(self, prefix, directory, cache_max_age=None, exclude=()):
+        self.prefix = prefix.rstrip('/') + '/'
+        self.directory = os.path.join(os.path.abspath(directory), '')
+        self.cache_max_age = cache_max_age
+        self.exclude = tuple(url.rstrip('/') + '/' for url in exclude)
+        # filename -> FileApp
+        self._apps = {}
+
+    def __repr__(self):
+        return '<%s %s -> %s>' % (self.__class__.__name__, self.prefix,
+                                  self.directory)
+
+    @classmethod
+    def find(cls, app, prefix=''):
+        """
+        Return a ``StaticFiles`` for ``app``, if it is a
+        ``paste.urlparser.StaticURLParser`` or a
+        ``paste.fileapp.DirectoryApp``, or for each of those mounted
+        in it, if it is a ``paste.urlmap.URLMap``.
+
+        Applications wrapped in middleware are not looked into (as
+        serving their files directly would bypass the middleware).
+        """
+        from paste.fileapp import DirectoryApp
+        from paste.urlmap import URLMap
+        from paste.urlparser import StaticURLParser
+        if type(app) is StaticURLParser:
+            return [cls(prefix, app.directory, app.cache_max_age)]
+        if type(app) is DirectoryApp:
+            return [cls(prefix, app.path)]
+        if not isinstance(app, URLMap):
+            return []
+        found = []
+        for (domain, url), mounted in app.applications:
+            if domain is not None:
+                continue
+            for static in cls.find(mounted, prefix + url):
+                # Don't serve what the map sends to another application
+                static.exclude += tuple(
+                    prefix + other_url + '/'
+                    for (other_domain, other_url), other in app.applications
+                    if other is not mounted
+                    and (prefix + other_url + '/').startswith(static.prefix))
+                found.append(static)
+        return found
+
+    def filename(self, path):
+        """
+        The file for ``path`` (which has been unquoted), or None if it
+        isn't one of this mount's paths.  Paths with dot-segments or
+        empty segments are left to the application (which gets them
+        normalized), as they could get around an ``exclude`` prefix.
+        """
+        if not _is_normal_path(path):
+            return None
+        if not path.startswith(self.prefix) or path.startswith(self.exclude):
+            return None
+        filename = os.path.normpath(
+            os.path.join(self.directory, path[len(self.prefix):]))
+        if not filename.startswith(self.directory):
+            return None
+        return filename
+
+    def respond(self, environ):
+        """
+        Answer the request in ``environ`` (which only needs its method,
+        ``PATH_INFO``, ``HTTP_*`` headers, ``wsgi.version`` and
+        ``wsgi.file_wrapper``).
+        Returns the status, headers and body (a list of byte strings
+        or a ``FileWrapper``), or None if the request should go to the
+        application instead.
+        """
+        filename = self.filename(environ['PATH_INFO'])
+        if filename is None or not os.path.isfile(filename):
+            return None
+        app = self._apps.get(filename)
+        if app is None:
+            from paste.fileapp import FileApp
+            app = FileApp(filename)
+            if self.cache_max_age:
+                app.cache_control(max_age=self.cache_max_age)
+            if len(self._apps) >= self.max_apps:
+                self._apps.clear()
+            self._apps[filename] = app
+        response = []
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+        body = app(environ, start_response)
+        if response and response[0][:3] in ('200', '206', '304'):
+            return response[0], response[1], body
+        if hasattr(body, 'close'):
+            body.close()
+        return None
+
+# The application of the subinterpreter this runs in (see
+# ``SubinterpreterApp``)
+_interpreter_app = None
+
+def _load_interpreter_app(app):
+    global _interpreter_app
+    if isinstance(app, str):
+        from paste.util.import_string import eval_import
+        app = eval_import(app)
+    _interpreter_app = app
+
+def _call_interpreter_app(environ, body):
+    environ['wsgi.input'] = io.BytesIO(body)
+    environ['wsgi.errors'] = sys.stderr
+    response = []
+    output = []
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response:
+            raise exc_info[1].with_traceback(exc_info[2])
+        response[:] = [status, headers]
+        return output.append
+    app_iter = _interpreter_app(environ, start_response)
+    try:
+        output.extend(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    status, headers = response
+    return status, headers, b''.join(output)
+
+class SubinterpreterApp:
+    """
+    Runs ``app`` in a pool of ``interpreters`` subinterpreters, each
+    with its own copy of the application and its own GIL (with
+    ``concurrent.futures.InterpreterPoolExecutor``, in Python 3.14 and
+    later), so a CPU-bound application can use several cores in one
+    process, without the memory and fork-safety costs of
+    ``PreforkServer``.
+
+    ``app`` is either a ``module:name`` string (see
+    ``paste.util.import_string.eval_import``), imported in every
+    subinterpreter, or an application that can be pickled (e.g., a
+    module-level function), which is then passed to each of them.
+
+    A worker thread of the server waits for each request while it
+    runs in a subinterpreter, so the thread pool's hung thread
+    handling still applies (killing a worker only abandons the
+    request, though; the subinterpreter finishes it).  Only the
+    environ values that are strings, numbers, booleans or tuples of
+    these are passed on, with the request body read in full, and
+    the response is collected in full before it is sent.
+    """
+
+    # How often (in seconds) a waiting worker checks whether it was
+    # killed
+    wait_interval = 1
+
+    def __init__(self, app, interpreters=4):
+        self.app = app
+        self.interpreters = interpreters
+        self.executor = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<%s %r interpreters=%s>' % (
+            self.__class__.__name__, self.app, self.interpreters)
+
+    def start(self):
+        """
+        Start the subinterpreters (this is done for the first request
+        otherwise, so that each process of a ``PreforkServer`` has its
+        own).
+        """
+        with self._lock:
+            if self.executor is None:
+                assert InterpreterPoolExecutor is not None, (
+                    "Subinterpreters need concurrent.interpreters (Python 3.14)")
+                self.executor = InterpreterPoolExecutor(
+                    self.interpreters, initializer=_load_interpreter_app,
+                    initargs=(self.app,))
+        return self.executor
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=wait, cancel_futures=True)
+                self.executor = None
+
+    def __call__(self, environ, start_response):
+        executor = self.executor or self.start()
+        environ_copy = {}
+        for key, value in environ.items():
+            if isinstance(value, tuple):
+                if not all(isinstance(item, (str, int, float))
+                           for item in value):
+                    continue
+            elif value is not None and not isinstance(
+                    value, (str, bytes, int, float)):
+                continue
+            environ_copy[key] = value
+        if environ.get('CONTENT_LENGTH'):
+            body = environ['wsgi.input'].read(int(environ['CONTENT_LENGTH']))
+        elif environ.get('wsgi.input_terminated'):
+            body = environ['wsgi.input'].read()
+            environ_copy['CONTENT_LENGTH'] = str(len(body))
+        else:
+            body = b''
+        future = executor.submit(_call_interpreter_app, environ_copy, body)
+        try:
+            # Waits in steps, so that an exception from
+            # ThreadPool.kill_worker can be raised in this thread
+            while not wait_futures([future], self.wait_interval).done:
+                pass
+            status, headers, body = future.result()
+        except BaseException:
+            future.cancel()
+            raise
+        start_response(status, headers)
+        return [body]
+
+class ServerStats:
+    """
+    Counters, gauges and latency histograms for a server and its
+    thread pool.
+
+    Each thread records into its own counters, so recording doesn't
+    take a lock; ``snapshot()`` adds them all up.  Histograms have
+    the fixed upper bounds (in seconds) in ``latency_buckets``.
+    Gauges are functions (registered with ``add_gauge``) that are
+    called when a snapshot is taken.
+    """
+
+    latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                       0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.started = time.time()
+        self._local = threading.local()
+        # (thread, counters, histograms) for each thread that has
+        # recorded something:
+        self._shards = []
+        # What threads that have since exited recorded:
+        self._retired = ({}, {})
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = ({}, {})
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def incr(self, name, amount=1):
+        """
+        Add ``amount`` to the counter ``name``.
+        """
+        counters = self._shard()[0]
+        counters[name] = counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        """
+        Record ``value`` (in seconds) in the histogram ``name``.
+        """
+        histograms = self._shard()[1]
+        hist = histograms.get(name)
+        if hist is None:
+            # A count for each bucket, one for larger values, and the sum
+            hist = histograms[name] = [0] * (len(self.latency_buckets) + 2)
+        hist[bisect.bisect_left(self.latency_buckets, value)] += 1
+        hist[-1] += value
+
+    def add_gauge(self, name, func):
+        """
+        Report the value ``func()`` as the gauge ``name``.
+        """
+        self._gauges[name] = func
+
+    def snapshot(self):
+        """
+        Return a dict with the current ``counters``, ``gauges`` and
+        ``histograms`` (each a dict by name), and the ``uptime`` in
+        seconds.  A histogram is a dict with ``count``, ``sum`` and
+        ``buckets``, a list of ``(upper bound, cumulative count)``
+        ending with ``(None, count)``.
+        """
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    # Nothing can change these anymore, so keep them
+                    # in one place (worker threads come and go)
+                    self._merge(self._retired, shard)
+            self._shards = live
+            shards = [shard for thread, shard in live]
+        shards.append(self._retired)
+        totals = ({}, {})
+        for shard in shards:
+            self._merge(totals, shard)
+        counters, sums = totals
+        histograms = {}
+        for name, hist in sums.items():
+            buckets = []
+            cumulative = 0
+            for bound, hits in zip(self.latency_buckets + (None,), hist):
+                cumulative += hits
+                buckets.append((bound, cumulative))
+            histograms[name] = dict(count=cumulative, sum=hist[-1],
+                                    buckets=buckets)
+        gauges = {}
+        for name, func in list(self._gauges.items()):
+            gauges[name] = func()
+        return dict(uptime=time.time() - self.started, counters=counters,
+                    gauges=gauges, histograms=histograms)
+
+    def _merge(self, into, shard):
+        counters, histograms = into
+        for name, value in dict(shard[0]).items():
+            counters[name] = counters.get(name, 0) + value
+        for name, hist in dict(shard[1]).items():
+            total = histograms.get(name)
+            if total is None:
+                histograms[name] = list(hist)
+            else:
+                histograms[name] = [a + b for a, b in zip(total, hist)]
+
+class FifoScheduler(queue.Queue):
+    """
+    The queue a ``ThreadPool``'s workers take their tasks from; this
+    one (the default) runs tasks in the order they were added.
+
+    A task is queued as a tuple of the time it was added, the
+    callable, its ``shed`` callable, the client it is for and whether
+    it has priority (see ``ThreadPool.add_task``).  The pool also
+    queues ``ThreadPool.SHUTDOWN`` markers; these are only counted,
+    and only handed out once no task is left, so that a worker never
+    stops while there is work waiting for it.  The other schedulers
+    override ``_init_tasks``, ``_task_count``, ``_put_task`` and
+    ``_get_task`` to pick the next task differently.
+    """
+
+    def _init(self, maxsize):
+        self.shutdowns = 0
+        self._init_tasks(maxsize)
+
+    def _qsize(self):
+        return self._task_count() + self.shutdowns
+
+    def _put(self, item):
+        if item is ThreadPool.SHUTDOWN:
+            self.shutdowns += 1
+        else:
+            self._put_task(item)
+
+    def _get(self):
+        if self.shutdowns and not self._task_count():
+            self.shutdowns -= 1
+            return ThreadPool.SHUTDOWN
+        return self._get_task()
+
+    def _init_tasks(self, maxsize):
+        self.queue = deque()
+
+    def _task_count(self):
+        return len(self.queue)
+
+    def _put_task(self, item):
+        self.queue.append(item)
+
+    def _get_task(self):
+        return self.queue.popleft()
+
+    def oldest(self):
+        """
+        Return the time the longest-waiting queued task was added
+        (None if there is none); call this with ``mutex`` held.
+        """
+        if self.queue:
+            return self.queue[0][0]
+        return None
+
+class PriorityScheduler(FifoScheduler):
+    """
+    Runs tasks that have priority (e.g., health checks) before any
+    other queued task, so they don't wait behind a backed-up queue.
+    """
+
+    def _init_tasks(self, maxsize):
+        self.queue = deque()
+        self.priority = deque()
+
+    def _task_count(self):
+        return len(self.queue) + len(self.priority)
+
+    def _put_task(self, item):
+        if item[4]:
+            self.priority.append(item)
+        else:
+            self.queue.append(item)
+
+    def _get_task(self):
+        if self.priority:
+            return self.priority.popleft()
+        return self.queue.popleft()
+
+    def oldest(self):
+        times = [self.priority[0][0]] if self.priority else []
+        normal = FifoScheduler.oldest(self)
+        if normal is not None:
+            times.append(normal)
+        return min(times, default=None)
+
+class FairScheduler(FifoScheduler):
+    """
+    Shares the workers fairly between clients: each client (e.g.,
+    each remote address) has its own queue, and the clients with
+    queued tasks take turns.  A client that sends many requests at
+    once only holds up its own.
+    """
+
+    def _init_tasks(self, maxsize):
+        # client -> deque of its tasks, in the order the clients get
+        # their turns
+        self.clients = OrderedDict()
+        self.count = 0
+
+    def _task_count(self):
+        return self.count
+
+    def _put_task(self, item):
+        client = item[3]
+        tasks = self.clients.get(client)
+        if tasks is None:
+            tasks = self.clients[client] = deque()
+        tasks.append(item)
+        self.count += 1
+
+    def _get_task(self):
+        client, tasks = next(iter(self.clients.items()))
+        item = tasks.popleft()
+        if tasks:
+            # Back of the line
+            self.clients.move_to_end(client)
+        else:
+            del self.clients[client]
+        self.count -= 1
+        return item
+
+    def oldest(self):
+        return min((tasks[0][0] for tasks in self.clients.values()),
+                   default=None)
+
+class LifoScheduler(FifoScheduler):
+    """
+    Runs tasks in order until the pool is overloaded, i.e. the oldest
+    queued task has waited for more than ``overload_wait`` seconds;
+    then the newest tasks are run first.  Under overload the requests
+    that are still fresh get served in time, rather than every request
+    waiting so long its client gives up.
+    """
+
+    def __init__(self, maxsize=0, overload_wait=0.1):
+        self.overload_wait = overload_wait
+        FifoScheduler.__init__(self, maxsize)
+
+    def _get_task(self):
+        enqueued = self.oldest()
+        if (enqueued is not None
+            and time.time() - enqueued > self.overload_wait):
+            return self.queue.pop()
+        return self.queue.popleft()
+
+def _thread_cpu_clock(thread_id):
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+
+class ThreadPool:
+    """
+    Generic thread pool with a queue of callables to consume.
+
+    Keeps a notion of the status of its worker threads:
+
+    idle: worker thread with nothing to do
+
+    busy: worker thread doing its job
+
+    hung: worker thread that's been doing a job for too long
+
+    dying: a hung thread that has been killed, but hasn't died quite
+    yet.
+
+    zombie: what was a worker thread that we've tried to kill but
+    isn't dead yet.
+
+    At any time you can call track_threads, to get a dictionary with
+    these keys and lists of thread_ids that fall in that status.  All
+    keys will be present, even if they point to emty lists.
+
+    hung threads are threads that have been busy more than
+    hung_thread_limit seconds.  Hung threads are killed when they live
+    longer than kill_thread_limit seconds.  A thread is then
+    considered dying for dying_limit seconds, if it is still alive
+    after that it is considered a zombie.
+
+    When there are no idle workers and a request comes in, another
+    worker *may* be spawned.  If there are less than spawn_if_under
+    threads in the busy state, another thread will be spawned.  So if
+    the limit is 5, and there are 4 hung threads and 6 busy threads,
+    no thread will be spawned.
+
+    When there are more than max_zombie_threads_before_die zombie
+    threads, a SystemExit exception will be raised, stopping the
+    server.  Use 0 or None to never raise this exception.  Zombie
+    threads *should* get cleaned up, but killing threads is no
+    necessarily reliable.  This is turned off by default, since it is
+    only a good idea if you've deployed the server with some process
+    watching from above (something similar to daemontools or zdaemon).
+
+    Each worker thread only processes ``max_requests`` tasks before it
+    dies and replaces itself with a new worker thread.
+
+    These arguments are described further in
+    ``docs/paste-httpserver-threadpool.txt``:
+
+    ``stats``: the ``ServerStats`` to record into (a new one by
+    default; see ``get_stats()``).
+
+    ``max_workers`` and the ``autoscale_*`` arguments: grow and shrink
+    the pool, between ``nworkers`` and ``max_workers``, with the load.
+
+    ``max_queue``, ``codel_target`` and ``codel_interval``: shed tasks
+    (calling the ``shed`` given to ``add_task``) when overloaded.
+
+    ``scheduler``: which queued task runs next, ``'fifo'`` (the
+    default), ``'priority'``, ``'fair'``, ``'lifo'``, or a scheduler
+    instance (see ``FifoScheduler``).
+
+    ``cpu_workers`` and ``cpu_start_method``: a process pool
+    (``cpu_executor``) for CPU-bound work.
+    """
+
+    schedulers = {
+        'fifo': FifoScheduler,
+        'priority': PriorityScheduler,
+        'fair': FairScheduler,
+        'lifo': LifoScheduler,
+    }
+
+    SHUTDOWN = object()
 
     def __init__(
         self, nworkers, name="ThreadPool", daemon=False,
@@ -588,6 +3043,19 @@ class ThreadPool:
         hung_check_period=100, # every 100 requests check for hung workers
         logger=None, # Place to log messages to
         error_email=None, # Person(s) to notify if serious problem occurs
+        max_workers=None, # autoscale the pool up to this many workers
+        autoscale_period=1, # seconds between autoscaling samples
+        autoscale_queue_wait=0.1, # add workers when tasks wait this long
+        autoscale_busy_high=0.9, # add workers when this ratio are busy
+        autoscale_busy_low=0.5, # remove workers below this ratio busy
+        autoscale_cooldown=10, # seconds to be below that before removing
+        stats=None, # ServerStats to record into
+        max_queue=0, # shed new tasks when this many are queued
+        codel_target=None, # shed tasks that wait this long under overload
+        codel_interval=0.1, # seconds a queue may persist before that
+        scheduler='fifo', # which queued task runs next
+        cpu_workers=0, # processes for CPU-bound work
+        cpu_start_method=None, # how those processes are started
         ):
         """
         Create thread pool with `nworkers` worker threads.
@@ -595,7 +3063,11 @@ class ThreadPool:
         self.nworkers = nworkers
         self.max_requests = max_requests
         self.name = name
-        self.queue = queue.Queue()
+        if isinstance(scheduler, str):
+            scheduler = self.schedulers[scheduler]
+        if isinstance(scheduler, type):
+            scheduler = scheduler()
+        self.queue = scheduler
         self.workers = []
         self.daemon = daemon
         if logger is None:
@@ -627,22 +3099,87 @@ class ThreadPool:
         # Used to keep track of what worker is doing what:
         self.worker_tracker = {}
         # Used to keep track of the workers not doing anything:
-        self.idle_workers = []
+        self.idle_workers = set()
+        # A heap of (hung deadline, thread_id, time_started) for busy
+        # workers, so that hung workers can be found without looking
+        # at every worker.  Entries for tasks that have finished are
+        # skipped when they come up:
+        self._hung_deadlines = []
+        # thread_id -> time_started, for the workers known to be hung:
+        self._hung_workers = {}
+        # Sum of the start times of all busy workers (for their
+        # average time working):
+        self._busy_started_total = 0
+        # Guards all of these, and workers and dying_threads, which
+        # are changed by several threads at once (there may be no GIL
+        # to keep them consistent).  Reading a length or looking up a
+        # key doesn't need it, but going through one does:
+        self._tracker_lock = threading.Lock()
+        if stats is None:
+            stats = ServerStats()
+        self.stats = stats
+        stats.add_gauge('workers', lambda: len(self.workers))
+        stats.add_gauge('idle_workers', lambda: len(self.idle_workers))
+        stats.add_gauge('busy_workers', self.busy_count)
+        stats.add_gauge('hung_workers', lambda: len(self.hung_workers()))
+        stats.add_gauge('queued_tasks', self.queue.qsize)
         # Used to keep track of threads that have been killed, but maybe aren't dead yet:
         self.dying_threads = {}
         # This is used to track when we last had to add idle workers;
         # we shouldn't cull extra workers until some time has passed
         # (hung_thread_limit) since workers were added:
         self._last_added_new_idle_workers = 0
+        assert not max_workers or max_workers >= nworkers, (
+            "max_workers (%s) should be at least nworkers (%s)"
+            % (max_workers, nworkers))
+        self.max_workers = max_workers
+        self.autoscale_period = autoscale_period
+        self.autoscale_queue_wait = autoscale_queue_wait
+        self.autoscale_busy_high = autoscale_busy_high
+        self.autoscale_busy_low = autoscale_busy_low
+        self.autoscale_cooldown = autoscale_cooldown
+        self.cpu_executor = None
+        if cpu_workers:
+            if cpu_start_method is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    cpu_start_method = 'forkserver'
+                else:
+                    cpu_start_method = 'spawn'
+            self.cpu_executor = ProcessPoolExecutor(
+                cpu_workers, multiprocessing.get_context(cpu_start_method))
+        self.max_queue = max_queue
+        self.codel_target = codel_target
+        self.codel_interval = codel_interval
+        # When the queue was last seen empty:
+        self._queue_empty_at = time.time()
+        # When the pool was last found to be over-provisioned (None if
+        # it wasn't, the last time we looked):
+        self._autoscale_low_since = None
+        self._autoscale_stop = threading.Event()
         if not daemon:
             atexit.register(self.shutdown)
         for i in range(self.nworkers):
             self.add_worker_thread(message='Initial worker pool')
+        if self.max_workers:
+            autoscaler = threading.Thread(target=self.autoscale_thread_callback,
+                                          name="%s autoscaler" % self.name)
+            autoscaler.daemon = True
+            autoscaler.start()
 
-    def add_task(self, task):
+    def add_task(self, task, shed=None, client=None, priority=False):
         """
-        Add a task to the queue
+        Add a task to the queue.
+
+        If ``shed`` is given, the task may be shed instead (see the
+        ThreadPool docstring): then ``shed()`` is called and False
+        returned.  ``client`` and ``priority`` are for the scheduler.
         """
+        if shed is not None and not priority:
+            reason = self.shed_reason()
+            if reason is not None:
+                self.stats.incr('shed_' + reason)
+                shed()
+                return False
         self.logger.debug('Added task (%i tasks queued)', self.queue.qsize())
         if self.hung_check_period:
             self.requests_since_last_hung_check += 1
@@ -651,18 +3188,8 @@ class ThreadPool:
                 self.kill_hung_threads()
         if not self.idle_workers and self.spawn_if_under:
             # spawn_if_under can come into effect...
-            busy = 0
-            now = time.time()
             self.logger.debug('No idle workers for task; checking if we need to make more workers')
-            for worker in self.workers:
-                if not hasattr(worker, 'thread_id'):
-                    # Not initialized
-                    continue
-                time_started, info = self.worker_tracker.get(worker.thread_id,
-                                                             (None, None))
-                if time_started is not None:
-                    if now - time_started < self.hung_thread_limit:
-                        busy += 1
+            busy = self.busy_count()
             if busy < self.spawn_if_under:
                 self.logger.info(
                     'No idle tasks, and only %s busy tasks; adding %s more '
@@ -674,7 +3201,8 @@ class ThreadPool:
                 self.logger.debug(
                     'No extra workers needed (%s busy workers)',
                     busy)
-        if (len(self.workers) > self.nworkers
+        if (not self.max_workers
+            and len(self.workers) > self.nworkers
             and len(self.idle_workers) > 3
             and time.time()-self._last_added_new_idle_workers > self.hung_thread_limit):
             # We've spawned worers in the past, but they aren't needed
@@ -686,38 +3214,243 @@ class ThreadPool:
                 'Idle workers: %s', self.idle_workers)
             for i in range(len(self.workers) - self.nworkers):
                 self.queue.put(self.SHUTDOWN)
-        self.queue.put(task)
+        now = time.time()
+        if not self.queue.qsize():
+            self._queue_empty_at = now
+        self.queue.put((now, task, shed, client, priority))
+        return True
+
+    def shed_reason(self):
+        """
+        Return why a task added now should be shed (``'queue_full'``
+        or ``'overload'``), or None if it can be queued.
+        """
+        if self.max_queue and self.queue.qsize() >= self.max_queue:
+            return 'queue_full'
+        if self.codel_target:
+            if (self.queue_standing(time.time())
+                and self.queue_wait() > self.codel_target):
+                return 'overload'
+        return None
+
+    def queue_standing(self, now):
+        """
+        True if the queue hasn't been empty in the ``codel_interval``
+        seconds before ``now``.  Only then are tasks that waited longer
+        than ``codel_target`` shed; a task can't wait longer than the
+        interval without the queue standing, so that is all the
+        allowance bursts get.
+        """
+        return now - self._queue_empty_at > self.codel_interval
+
+    def task_started(self, thread_id, enqueued=None, cpu_clock=None):
+        """
+        Record that the worker ``thread_id`` has started on a task
+        (that was put in the queue at ``enqueued``), and so isn't idle.
+
+        The worker's entry in ``worker_tracker`` is a list of the time
+        it started, the environ of its request (once known), the time
+        the task was queued, the thread's CPU time when it started,
+        and the thread's CPU clock (``cpu_clock``, looked up if not
+        given; None where threads have none).
+        """
+        now = time.time()
+        if cpu_clock is None:
+            cpu_clock = _thread_cpu_clock(thread_id)
+        info = [now, None, enqueued or now, time.thread_time(), cpu_clock]
+        with self._tracker_lock:
+            self.idle_workers.discard(thread_id)
+            self.worker_tracker[thread_id] = info
+            self._busy_started_total += now
+            heapq.heappush(self._hung_deadlines,
+                           (now + self.hung_thread_limit, thread_id, now))
+
+    def task_finished(self, thread_id, idle=False):
+        """
+        Record that the worker ``thread_id`` isn't working on a task
+        anymore (it finished it, or was killed), and if ``idle`` that
+        it is waiting for another.
+        """
+        with self._tracker_lock:
+            if idle:
+                self.idle_workers.add(thread_id)
+            info = self.worker_tracker.pop(thread_id, None)
+            if info is None:
+                return
+            self._busy_started_total -= info[0]
+            if not self.worker_tracker:
+                # Don't let rounding errors build up
+                self._busy_started_total = 0
+            self._hung_workers.pop(thread_id, None)
+            if len(self._hung_deadlines) > 2 * len(self.worker_tracker) + 64:
+                # Too many entries for finished tasks; rebuild the heap
+                self._hung_deadlines = [
+                    (info[0] + self.hung_thread_limit, tid, info[0])
+                    for tid, info in self.worker_tracker.items()
+                    if tid not in self._hung_workers]
+                heapq.heapify(self._hung_deadlines)
+
+    def _update_hung_workers(self, now):
+        """
+        Move workers that have passed their hung deadline into
+        ``_hung_workers``; must be called with ``_tracker_lock`` held.
+        """
+        heap = self._hung_deadlines
+        while heap:
+            deadline, thread_id, time_started = heap[0]
+            info = self.worker_tracker.get(thread_id)
+            if info is None or info[0] != time_started:
+                # That task has finished
+                heapq.heappop(heap)
+            elif deadline < now:
+                heapq.heappop(heap)
+                self._hung_workers[thread_id] = time_started
+            else:
+                break
+
+    def busy_count(self):
+        """
+        Return the number of workers that are working on a task, but
+        aren't hung.
+        """
+        with self._tracker_lock:
+            self._update_hung_workers(time.time())
+            return len(self.worker_tracker) - len(self._hung_workers)
+
+    def hung_workers(self):
+        """
+        Return a dict of thread_id: time_started for the workers that
+        have been working on a task for more than hung_thread_limit.
+        """
+        with self._tracker_lock:
+            self._update_hung_workers(time.time())
+            return dict(self._hung_workers)
+
+    def get_stats(self):
+        """
+        Return a snapshot of the pool's statistics (see
+        ``ServerStats.snapshot``).
+        """
+        return self.stats.snapshot()
+
+    def queue_wait(self):
+        """
+        Return how many seconds the oldest queued task has been
+        waiting (0 if nothing is queued).
+        """
+        with self.queue.mutex:
+            enqueued = self.queue.oldest()
+        if enqueued is None:
+            return 0
+        return time.time() - enqueued
+
+    def autoscale_thread_callback(self):
+        """
+        The autoscaling thread runs this, sampling the pool every
+        ``autoscale_period`` seconds until the pool is shut down.
+        """
+        while not self._autoscale_stop.wait(self.autoscale_period):
+            try:
+                self.autoscale()
+            except Exception:
+                self.logger.exception('Error autoscaling %s', self.name)
+
+    def autoscale(self):
+        """
+        Grow or shrink the pool according to the current load (see
+        the ThreadPool docstring).
+        """
+        now = time.time()
+        workers = len(self.workers)
+        busy = len(self.worker_tracker)
+        queued = self.queue.qsize()
+        queue_wait = self.queue_wait()
+        if workers:
+            busy_ratio = float(busy) / workers
+        else:
+            busy_ratio = 1.0
+        if (queue_wait > self.autoscale_queue_wait
+            or busy_ratio >= self.autoscale_busy_high):
+            self._autoscale_low_since = None
+            # Enough workers for everything that is waiting
+            wanted = min(self.max_workers, max(busy + queued, workers + 1))
+            if wanted > workers:
+                self.logger.info(
+                    'Autoscaling up from %s to %s workers (%s queued, '
+                    'waiting %.3fsec, %s busy)',
+                    workers, wanted, queued, queue_wait, busy)
+                self._last_added_new_idle_workers = now
+                for i in range(wanted - workers):
+                    self.add_worker_thread(message='Autoscaling up')
+        elif (not queued and busy_ratio <= self.autoscale_busy_low
+              and workers > self.nworkers):
+            if self._autoscale_low_since is None:
+                self._autoscale_low_since = now
+            elif now - self._autoscale_low_since >= self.autoscale_cooldown:
+                self.logger.info(
+                    'Autoscaling down from %s workers (%s busy)',
+                    workers, busy)
+                # Restart the cool down, so we shrink gradually
+                self._autoscale_low_since = now
+                self.queue.put(self.SHUTDOWN)
+        else:
+            self._autoscale_low_since = None
+
+    def task_times(self):
+        """
+        Return a dict of thread_id: dict(queue_wait, busy, cpu) for the
+        workers working on a task: the seconds the task waited in the
+        queue, has been worked on, and has used the CPU for (None where
+        another thread's CPU time can't be read).  A busy worker with
+        little CPU time is waiting on I/O (or a lock); requests with a
+        long queue_wait mean the pool is overloaded.
+        """
+        now = time.time()
+        with self._tracker_lock:
+            infos = list(self.worker_tracker.items())
+        times = {}
+        for thread_id, info in infos:
+            cpu = None
+            if info[4] is not None:
+                try:
+                    cpu = time.clock_gettime(info[4]) - info[3]
+                except OSError:
+                    # The thread has exited
+                    continue
+            times[thread_id] = dict(queue_wait=info[0] - info[2],
+                                    busy=now - info[0], cpu=cpu)
+        return times
 
     def track_threads(self):
         """
         Return a dict summarizing the threads in the pool (as
-        described in the ThreadPool docstring).
+        described in the ThreadPool docstring), with the ``task_times()``
+        of the busy and hung workers under ``times``.
         """
         result = dict(idle=[], busy=[], hung=[], dying=[], zombie=[])
+        result['times'] = self.task_times()
         now = time.time()
-        for worker in self.workers:
+        hung = self.hung_workers()
+        with self._tracker_lock:
+            workers = list(self.workers)
+            dying_threads = list(self.dying_threads.items())
+        for worker in workers:
             if not hasattr(worker, 'thread_id'):
                 # The worker hasn't fully started up, we should just
                 # ignore it
                 continue
-            time_started, info = self.worker_tracker.get(worker.thread_id,
-                                                         (None, None))
-            if time_started is not None:
-                if now - time_started > self.hung_thread_limit:
-                    result['hung'].append(worker)
-                else:
-                    result['busy'].append(worker)
+            if worker.thread_id in hung:
+                result['hung'].append(worker)
+            elif worker.thread_id in self.worker_tracker:
+                result['busy'].append(worker)
             else:
                 result['idle'].append(worker)
-        for thread_id, (time_killed, worker) in self.dying_threads.items():
+        for thread_id, (time_killed, worker) in dying_threads:
             if not self.thread_exists(thread_id):
                 # Cull dying threads that are actually dead and gone
                 self.logger.info('Killed thread %s no longer around',
                                  thread_id)
-                try:
-                    del self.dying_threads[thread_id]
-                except KeyError:
-                    pass
+                self.dying_threads.pop(thread_id, None)
                 continue
             if now - time_killed > self.dying_limit:
                 result['zombie'].append(worker)
@@ -741,14 +3474,12 @@ class ThreadPool:
         except ValueError:
             # invalid thread id -- the thread has died in the mean time
             pass
-        try:
-            del self.worker_tracker[thread_id]
-        except KeyError:
-            pass
+        self.task_finished(thread_id)
         self.logger.info('Killing thread %s', thread_id)
-        if thread_obj in self.workers:
-            self.workers.remove(thread_obj)
-        self.dying_threads[thread_id] = (time.time(), thread_obj)
+        with self._tracker_lock:
+            if thread_obj in self.workers:
+                self.workers.remove(thread_obj)
+            self.dying_threads[thread_id] = (time.time(), thread_obj)
         self.add_worker_thread(message='Replacement for killed thread %s' % thread_id)
 
     def thread_exists(self, thread_id):
@@ -773,30 +3504,29 @@ class ThreadPool:
             # No killing should occur
             return
         now = time.time()
-        max_time = 0
-        total_time = 0
-        idle_workers = 0
-        starting_workers = 0
-        working_workers = 0
+        with self._tracker_lock:
+            self._update_hung_workers(now)
+            hung = dict(self._hung_workers)
+            working_workers = len(self.worker_tracker)
+            total_time = now * working_workers - self._busy_started_total
+            if hung:
+                max_time = now - min(hung.values())
+            elif self._hung_deadlines:
+                max_time = now - self._hung_deadlines[0][2]
+            else:
+                max_time = 0
+        idle_workers = len(self.idle_workers)
+        starting_workers = max(
+            0, len(self.workers) - working_workers - idle_workers)
         killed_workers = 0
-        for worker in self.workers:
-            if not hasattr(worker, 'thread_id'):
-                # Not setup yet
-                starting_workers += 1
-                continue
-            time_started, info = self.worker_tracker.get(worker.thread_id,
-                                                         (None, None))
-            if time_started is None:
-                # Must be idle
-                idle_workers += 1
-                continue
-            working_workers += 1
-            max_time = max(max_time, now-time_started)
-            total_time += now-time_started
+        # Only hung workers can have worked for longer than
+        # kill_thread_limit (which is at least hung_thread_limit)
+        for thread_id, time_started in hung.items():
+            info = self.worker_tracker.get(thread_id, (None, None))[1]
             if now - time_started > self.kill_thread_limit:
                 self.logger.warning(
                     'Thread %s hung (working on task for %i seconds)',
-                    worker.thread_id, now - time_started)
+                    thread_id, now - time_started)
                 try:
                     import pprint
                     info_desc = pprint.pformat(info)
@@ -809,11 +3539,11 @@ class ThreadPool:
                     "working on task for %(time)s seconds (limit is %(limit)s)\n"
                     "Info on task:\n"
                     "%(info)s"
-                    % dict(thread_id=worker.thread_id,
+                    % dict(thread_id=thread_id,
                            time=now - time_started,
                            limit=self.kill_thread_limit,
                            info=info_desc))
-                self.kill_worker(worker.thread_id)
+                self.kill_worker(thread_id)
                 killed_workers += 1
         if working_workers:
             ave_time = float(total_time) / working_workers
@@ -837,13 +3567,12 @@ class ThreadPool:
             return
         found = []
         now = time.time()
-        for thread_id, (time_killed, worker) in self.dying_threads.items():
+        with self._tracker_lock:
+            dying_threads = list(self.dying_threads.items())
+        for thread_id, (time_killed, worker) in dying_threads:
             if not self.thread_exists(thread_id):
                 # Cull dying threads that are actually dead and gone
-                try:
-                    del self.dying_threads[thread_id]
-                except KeyError:
-                    pass
+                self.dying_threads.pop(thread_id, None)
                 continue
             if now - time_killed > self.dying_limit:
                 found.append(thread_id)
@@ -873,8 +3602,10 @@ class ThreadPool:
         """
         thread_obj = threading.current_thread()
         thread_id = thread_obj.thread_id = _thread.get_ident()
-        self.workers.append(thread_obj)
-        self.idle_workers.append(thread_id)
+        cpu_clock = _thread_cpu_clock(thread_id)
+        with self._tracker_lock:
+            self.workers.append(thread_obj)
+            self.idle_workers.add(thread_id)
         requests_processed = 0
         add_replacement_worker = False
         self.logger.debug('Started new worker %s: %s', thread_id, message)
@@ -886,15 +3617,29 @@ class ThreadPool:
                                       % (thread_id, requests_processed, self.max_requests))
                     add_replacement_worker = True
                     break
-                runnable = self.queue.get()
-                if runnable is ThreadPool.SHUTDOWN:
+                item = self.queue.get()
+                if item is ThreadPool.SHUTDOWN:
                     self.logger.debug('Worker %s asked to SHUTDOWN', thread_id)
                     break
-                try:
-                    self.idle_workers.remove(thread_id)
-                except ValueError:
-                    pass
-                self.worker_tracker[thread_id] = [time.time(), None]
+                enqueued, runnable, shed, client, priority = item
+                now = time.time()
+                self.stats.observe('queue_wait', now - enqueued)
+                shedding = (shed is not None and not priority
+                            and self.codel_target
+                            and self.queue_standing(now)
+                            and now - enqueued > self.codel_target)
+                if not self.queue.qsize():
+                    self._queue_empty_at = now
+                if shedding:
+                    self.stats.incr('shed_queue_wait')
+                    try:
+                        shed()
+                    except Exception:
+                        self.logger.exception('Error shedding task %r',
+                                              runnable)
+                    continue
+                self.task_started(thread_id, enqueued, cpu_clock)
+                cpu_started = time.thread_time()
                 requests_processed += 1
                 try:
                     try:
@@ -906,52 +3651,46 @@ class ThreadPool:
                         # exception should reach this level
                         print('Unexpected exception in worker %r' % runnable,
                               file=sys.stderr)
-                        traceback.print_exc()
-                    if thread_id in self.dying_threads:
-                        # That last exception was intended to kill me
-                        break
-                finally:
-                    try:
-                        del self.worker_tracker[thread_id]
-                    except KeyError:
-                        pass
-                self.idle_workers.append(thread_id)
-        finally:
-            try:
-                del self.worker_tracker[thread_id]
-            except KeyError:
-                pass
-            try:
-                self.idle_workers.remove(thread_id)
-            except ValueError:
-                pass
-            try:
-                self.workers.remove(thread_obj)
-            except ValueError:
-                pass
-            try:
-                del self.dying_threads[thread_id]
-            except KeyError:
-                pass
+                        traceback.print_exc()
+                    if thread_id in self.dying_threads:
+                        # That last exception was intended to kill me
+                        break
+                finally:
+                    self.stats.observe('task_cpu',
+                                       time.thread_time() - cpu_started)
+                    self.task_finished(thread_id, idle=True)
+        finally:
+            self.task_finished(thread_id)
+            with self._tracker_lock:
+                self.idle_workers.discard(thread_id)
+                if thread_obj in self.workers:
+                    self.workers.remove(thread_obj)
+                self.dying_threads.pop(thread_id, None)
             if add_replacement_worker:
                 self.add_worker_thread(message='Voluntary replacement for thread %s' % thread_id)
 
-    def shutdown(self, force_quit_timeout=0):
+    def shutdown(self, force_quit_timeout=0, drain_timeout=0):
         """
         Shutdown the queue (after finishing any pending requests).
+
+        Workers that are still working after ``drain_timeout`` seconds
+        (or half a second each, if that is longer) are killed.  Then
+        the ``cpu_executor`` (if any) is shut down.
         """
         self.logger.info('Shutting down threadpool')
+        self._autoscale_stop.set()
         # Add a shutdown request for every worker
         for i in range(len(self.workers)):
             self.queue.put(ThreadPool.SHUTDOWN)
         # Wait for each thread to terminate
         hung_workers = []
-        for worker in self.workers:
-            worker.join(0.5)
+        drain_until = time.time() + drain_timeout
+        for worker in list(self.workers):
+            worker.join(max(0.5, drain_until - time.time()))
             if worker.is_alive():
                 hung_workers.append(worker)
         zombies = []
-        for thread_id in self.dying_threads:
+        for thread_id in list(self.dying_threads):
             if self.thread_exists(thread_id):
                 zombies.append(thread_id)
         if hung_workers or zombies:
@@ -964,7 +3703,7 @@ class ThreadPool:
             if force_quit_timeout:
                 timed_out = False
                 need_force_quit = bool(zombies)
-                for worker in self.workers:
+                for worker in list(self.workers):
                     if not timed_out and worker.is_alive():
                         timed_out = True
                         worker.join(force_quit_timeout)
@@ -989,6 +3728,13 @@ class ThreadPool:
                     self.logger.info('All workers eventually killed')
         else:
             self.logger.info('All workers stopped')
+        if self.cpu_executor is not None:
+            # Work that killed workers were waiting for isn't waited for
+            if sys.version_info >= (3, 9):
+                self.cpu_executor.shutdown(wait=not hung_workers,
+                                           cancel_futures=True)
+            else:
+                self.cpu_executor.shutdown(wait=not hung_workers)
 
     def notify_problem(self, msg, subject=None, spawn_thread=True):
         """
@@ -1047,17 +3793,244 @@ class ThreadPool:
 class ThreadPoolMixIn:
     """
     Mix-in class to process requests from a thread pool
+
+    If ``use_connection_manager`` is true, idle keep-alive connections
+    are parked in a ``ConnectionManager`` between requests instead of
+    holding on to a worker thread.  With an ``ssl.SSLContext`` the
+    connection manager is always used, and also does the SSL
+    handshakes, so only connections ready with a request reach the
+    worker threads.
+
+    When the thread pool sheds a request (see ``max_queue`` and
+    ``codel_target`` in ``ThreadPool``), the thread that accepted it
+    writes ``shed_response`` to the connection and closes it, without
+    a worker or the WSGI application being involved.  The response is
+    rendered once, as a ``503 Service Unavailable`` with a
+    ``Retry-After`` of ``retry_after`` seconds.
+
+    Requests are queued for the pool's scheduler with the client's
+    address, and with priority if they are for one of
+    ``priority_paths`` (a path or the prefix of a path, e.g.
+    ``/healthz``).  Whether a request is for such a path is only known
+    if its request line has arrived by the time it is queued.  So with
+    ``priority_paths`` (or ``static_files``) and a connection manager,
+    new connections wait in the manager (like kept-alive ones) until
+    their request head has arrived.
+
+    After ``start_output_writer()``, a worker only writes as much of a
+    response as the client takes right away; the rest is held (up to
+    ``offload_buffer`` bytes) and sent by an ``OutputWriter`` once the
+    application is done, and the worker goes back to the pool.
+
+    After ``start_static_files()``, the connection manager answers
+    requests for static files itself (see ``StaticFiles``), and the
+    ``OutputWriter`` sends them.
     """
-    def __init__(self, nworkers, daemon=False, **threadpool_options):
+
+    connection_manager = None
+
+    output_writer = None
+
+    offload_buffer = 1 << 20
+
+    static_files = ()
+
+    retry_after = 1
+
+    priority_paths = ()
+
+    # Seconds that requests in progress get to finish when the server
+    # stops (see ``handoff``)
+    drain_timeout = 0
+
+    def __init__(self, nworkers, daemon=False, use_connection_manager=False,
+                 **threadpool_options):
         # Create and start the workers
         self.running = True
         assert nworkers > 0, "ThreadPoolMixIn servers must have at least one worker"
+        stats = getattr(self, 'stats', None)
+        if stats is not None:
+            threadpool_options.setdefault('stats', stats)
+        if 'priority_paths' in threadpool_options:
+            self.priority_paths = tuple(converters.aslist(
+                threadpool_options.pop('priority_paths')))
         self.thread_pool = ThreadPool(
             nworkers,
             "ThreadPoolMixIn HTTP server on %s:%d"
             % (self.server_name, self.server_port),
             daemon,
             **threadpool_options)
+        self.stats = self.thread_pool.stats
+        body = b'The server is overloaded; please try again later.\r\n'
+        self.shed_response = (
+            b'HTTP/1.1 503 Service Unavailable\r\n'
+            b'Content-Type: text/plain\r\n'
+            b'Content-Length: %d\r\n'
+            b'Retry-After: %d\r\n'
+            b'Connection: close\r\n\r\n%s'
+            % (len(body), self.retry_after, body))
+        if (use_connection_manager
+            or _is_stdlib_ssl_context(getattr(self, 'ssl_context', None))):
+            self.start_connection_manager()
+        # Each worker handles one connection at a time
+        self.stats.add_gauge('active_connections',
+                             lambda: len(self.thread_pool.worker_tracker))
+        self.stats.add_gauge('idle_connections', self.idle_connection_count)
+
+    def start_connection_manager(self):
+        self.connection_manager = ConnectionManager(
+            self.dispatch_request, self.close_request,
+            "ConnectionManager for HTTP server on %s:%d"
+            % (self.server_name, self.server_port),
+            logger=self.thread_pool.logger, stats=self.stats)
+
+    def start_output_writer(self):
+        """
+        Start an ``OutputWriter`` to offload responses to.  A kept-alive
+        connection can only be offloaded with a connection manager (that
+        the writer hands it back to), so one is started if there isn't
+        one yet.
+        """
+        if self.connection_manager is None:
+            self.start_connection_manager()
+        self.output_writer = OutputWriter(
+            self.output_written, self.close_request,
+            "OutputWriter for HTTP server on %s:%d"
+            % (self.server_name, self.server_port),
+            logger=self.thread_pool.logger, stats=self.stats)
+        if getattr(self, 'wsgi_socket_timeout', None):
+            self.output_writer.timeout = self.wsgi_socket_timeout
+        self.stats.add_gauge('writing_connections',
+                             self.output_writer.writing_count)
+
+    def start_static_files(self, static_files):
+        """
+        Answer requests for the ``StaticFiles`` in ``static_files``
+        from the connection manager's thread (so they don't use a
+        worker thread, or go through the application).  This starts
+        an ``OutputWriter`` (and a connection manager) if there isn't
+        one.
+        """
+        if self.output_writer is None:
+            self.start_output_writer()
+        self.static_files = list(static_files)
+
+    def send_static(self, request, client_address):
+        """
+        Answer the request on this connection from ``static_files``,
+        if its head has arrived and one of them can.  Returns True if
+        it did.
+        """
+        reader = getattr(request, 'reader', None)
+        if (reader is None or not reader.has_request_head()
+            or getattr(self, 'ssl_context', None)):
+            return False
+        data = bytes(reader.peek())
+        line_end = data.find(b'\n') + 1
+        end = _head_end(data[line_end:])
+        if end < 0:
+            return False
+        end += line_end
+        parts = data[:line_end].decode('latin-1').split()
+        if (len(parts) != 3 or parts[0] not in ('GET', 'HEAD')
+            or parts[1][:1] != '/' or parts[2] not in ('HTTP/1.0', 'HTTP/1.1')):
+            return False
+        method, target, version = parts
+        path, _, query = target.partition('?')
+        path = unquote(path)
+        if not _is_normal_path(path):
+            # wsgi_setup normalizes these; the application gets them
+            return False
+        for static in self.static_files:
+            if path.startswith(static.prefix):
+                break
+        else:
+            return False
+        handler = self.RequestHandlerClass
+        try:
+            headers = parse_headers(data[line_end:end],
+                                    getattr(handler, 'max_headers', 100))
+        except ValueError:
+            return False
+        if ('Transfer-Encoding' in headers or 'Expect' in headers
+            or headers.get('Content-Length', '0') != '0'):
+            return False
+        environ = headers.environ.copy()
+        environ.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_PROTOCOL': version,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.file_wrapper': FileWrapper,
+        })
+        try:
+            response = static.respond(environ)
+        except Exception:
+            self.thread_pool.logger.exception('Error serving %s', path)
+            return False
+        if response is None:
+            return False
+        status, response_headers, body = response
+        output = []
+        if isinstance(body, FileWrapper):
+            file = body.filelike
+            offset = file.tell()
+            count = os.fstat(file.fileno()).st_size - offset
+            if body.size is not None:
+                count = min(count, body.size)
+            output.append((os.dup(file.fileno()), offset, count))
+            body_size = count
+        else:
+            output.append(b''.join(body))
+            body_size = len(output[0])
+        if hasattr(body, 'close'):
+            body.close()
+        connection = headers.get('Connection', '').lower()
+        keep_alive = (handler.protocol_version >= 'HTTP/1.1'
+                      and connection != 'close'
+                      and (version >= 'HTTP/1.1' or connection == 'keep-alive'))
+        server_version = handler.server_version
+        if handler.sys_version:
+            server_version += ' ' + handler.sys_version
+        lines = ['%s %s\r\n' % (handler.protocol_version, status),
+                 'Server: %s\r\n' % server_version,
+                 'Date: %s\r\n' % formatdate(usegmt=True)]
+        lines.extend('%s: %s\r\n' % header for header in response_headers)
+        if not keep_alive:
+            lines.append('Connection: close\r\n')
+        lines.append('\r\n')
+        head = ''.join(lines).encode('latin-1')
+        output.insert(0, head)
+        # The request is answered; take it out of the buffer
+        reader.read(end)
+        stats = self.stats
+        stats.incr('requests')
+        stats.incr('static_requests')
+        stats.incr('status_%sxx' % status[0])
+        stats.incr('bytes_out', len(head) + body_size)
+        self.output_writer.write(request, client_address, output, keep_alive)
+        return True
+
+    def output_written(self, request, client_address):
+        """
+        The ``OutputWriter`` has finished a response on a kept-alive
+        connection; wait for the next request in the connection manager.
+        """
+        self.connection_manager.park(
+            request, client_address,
+            getattr(self, 'keepalive_timeout', None)
+            or getattr(self, 'wsgi_socket_timeout', None))
+
+    def idle_connection_count(self):
+        """
+        The number of kept-alive connections waiting for their next
+        request in the connection manager.
+        """
+        if self.connection_manager is None:
+            return 0
+        return self.connection_manager.parked_count()
 
     def process_request(self, request, client_address):
         """
@@ -1068,9 +4041,96 @@ class ThreadPoolMixIn:
         # is the default but since we set a timeout on the parent socket so
         # that we can trap interrupts we need to restore this,.)
         request.setblocking(1)
-        # Queue processing of the request
+        ssl_context = getattr(self, 'ssl_context', None)
+        if _is_stdlib_ssl_context(ssl_context):
+            self.connection_manager.handshake(
+                _ManagedConnection(request), client_address,
+                getattr(self, 'wsgi_socket_timeout', None))
+            return
+        if self.connection_manager is not None and not ssl_context:
+            # pyOpenSSL connections can't be read without blocking,
+            # so only plain sockets can be parked
+            request = _ManagedConnection(request)
+            if self.priority_paths or self.static_files:
+                self.connection_manager.park(
+                    request, client_address,
+                    getattr(self, 'header_timeout', None)
+                    or getattr(self, 'wsgi_socket_timeout', None))
+                return
+        self.dispatch_request(request, client_address)
+
+    def dispatch_request(self, request, client_address):
+        """
+        Queue processing of the request (this is also how the
+        connection manager hands back a connection with a new request)
+        """
+        if self.static_files and self.send_static(request, client_address):
+            return
         self.thread_pool.add_task(
-             lambda: self.process_request_in_thread(request, client_address))
+             lambda: self.process_request_in_thread(request, client_address),
+             shed=lambda: self.shed_request(request, client_address),
+             client=client_address and client_address[0],
+             priority=self.has_priority(request))
+
+    def has_priority(self, request):
+        """
+        True if the request on this connection (as far as it has
+        arrived) is for one of ``priority_paths``.
+        """
+        if not self.priority_paths:
+            return False
+        reader = getattr(request, 'reader', None)
+        if reader is not None and reader.buffered():
+            head = bytes(reader.peek()[:4096])
+        elif getattr(self, 'ssl_context', None):
+            return False
+        else:
+            # Look at what has arrived without taking it (or waiting)
+            try:
+                request.setblocking(False)
+                try:
+                    head = request.recv(4096, socket.MSG_PEEK)
+                finally:
+                    request.setblocking(True)
+            except OSError:
+                return False
+        parts = head.split(b'\n', 1)[0].split(b' ')
+        if len(parts) < 3:
+            # Not the whole request target
+            return False
+        path = parts[1].split(b'?', 1)[0].decode('latin-1')
+        for prefix in self.priority_paths:
+            if path == prefix or path.startswith(prefix.rstrip('/') + '/'):
+                return True
+        return False
+
+    def shed_request(self, request, client_address):
+        """
+        Refuse a request the thread pool has shed, by writing
+        ``shed_response`` and closing the connection.
+        """
+        ssl_context = getattr(self, 'ssl_context', None)
+        try:
+            if not ssl_context or _is_stdlib_ssl_context(ssl_context):
+                # (A pyOpenSSL connection hasn't done its handshake
+                # yet, so it just gets closed.)  This mustn't block;
+                # the response fits in the socket's send buffer
+                request.settimeout(0)
+                request.send(self.shed_response)
+                request.shutdown(socket.SHUT_WR)
+                # Closing a socket with unread data resets the
+                # connection, which could lose the response
+                request.recv(65536)
+        except OSError:
+            pass
+        self.close_request(request)
+
+    def finish_request(self, request, client_address):
+        """
+        Finish one request by instantiating RequestHandlerClass; the
+        handler is returned so we can tell if the connection was parked
+        """
+        return self.RequestHandlerClass(request, client_address, self)
 
     def handle_error(self, request, client_address):
         if sys.exc_info()[0] is ServerExit:
@@ -1085,8 +4145,18 @@ class ThreadPoolMixIn:
         must be done here.
         """
         try:
-            self.finish_request(request, client_address)
-            self.close_request(request)
+            handler = self.finish_request(request, client_address)
+            if getattr(handler, 'wsgi_offloaded', False):
+                # The OutputWriter has the connection now
+                pass
+            elif (getattr(handler, 'wsgi_parked', False)
+                and self.connection_manager is not None):
+                self.connection_manager.park(
+                    request, client_address,
+                    getattr(self, 'keepalive_timeout', None)
+                    or getattr(self, 'wsgi_socket_timeout', None))
+            else:
+                self.close_request(request)
         except BaseException as e:
             self.handle_error(request, client_address)
             self.close_request(request)
@@ -1106,8 +4176,29 @@ class ThreadPoolMixIn:
                     # propogate, just keep handling
                     pass
         finally:
+            if self.connection_manager is not None:
+                self.connection_manager.shutdown()
             if hasattr(self, 'thread_pool'):
-                self.thread_pool.shutdown()
+                self.thread_pool.shutdown(drain_timeout=self.drain_timeout)
+            if self.output_writer is not None:
+                self.output_writer.shutdown(self.drain_timeout)
+
+    def handoff(self, args=None, drain_timeout=60):
+        """
+        Restart the server without dropping connections: start a new
+        server process that takes over the listening socket (see
+        ``spawn_successor``), then stop accepting connections, and let
+        requests in progress finish for up to ``drain_timeout``
+        seconds before ``serve_forever`` returns.
+
+        Returns the new process (a ``subprocess.Popen``).
+        """
+        process = spawn_successor(self.socket, args)
+        self.thread_pool.logger.info(
+            'Handed off the listening socket to process %s', process.pid)
+        self.drain_timeout = drain_timeout
+        self.running = False
+        return process
 
     def server_activate(self):
         """
@@ -1122,24 +4213,100 @@ class ThreadPoolMixIn:
         """
         self.running = False
         self.socket.close()
+        if self.connection_manager is not None:
+            self.connection_manager.shutdown()
+        if getattr(self, 'reaper', None) is not None:
+            self.reaper.shutdown()
         if hasattr(self, 'thread_pool'):
             self.thread_pool.shutdown(60)
+        if self.output_writer is not None:
+            self.output_writer.shutdown()
 
 class WSGIServerBase(SecureHTTPServer):
+
+    # Deadlines (in seconds) for slow clients; see ``start_reaper``
+    header_timeout = None
+    body_timeout = None
+    keepalive_timeout = None
+    request_timeout = None
+    reaper = None
+
     def __init__(self, wsgi_application, server_address,
                  RequestHandlerClass=None, ssl_context=None,
-                 request_queue_size=None):
+                 request_queue_size=None, listen_socket=None,
+                 reuse_port=False):
+        self.reuse_port = reuse_port
         SecureHTTPServer.__init__(self, server_address,
                                   RequestHandlerClass, ssl_context,
-                                  request_queue_size=request_queue_size)
+                                  request_queue_size=request_queue_size,
+                                  listen_socket=listen_socket)
         self.wsgi_application = wsgi_application
         self.wsgi_socket_timeout = None
+        self.stats = ServerStats()
+        if _is_stdlib_ssl_context(ssl_context):
+            self.stats.add_gauge(
+                'ssl_handshakes', lambda: ssl_context.session_stats()['accept_good'])
+            self.stats.add_gauge(
+                'ssl_session_hits', lambda: ssl_context.session_stats()['hits'])
+
+    def start_reaper(self):
+        """
+        Start a ``ConnectionReaper`` that closes the connections of
+        clients that take too long:
+
+        * ``header_timeout``: to send the request head, from when the
+          server starts reading it;
+        * ``body_timeout``: to send the request body, after the head
+          (only time spent waiting for the body counts);
+        * ``keepalive_timeout``: to start the next request on a
+          kept-alive connection;
+        * ``request_timeout``: for the whole request, from reading the
+          head to writing the end of the response.
+
+        With a ``ConnectionManager``, parked connections are timed out
+        by the manager instead.
+        """
+        self.reaper = ConnectionReaper(
+            "ConnectionReaper for HTTP server on %s:%d"
+            % (self.server_name, self.server_port), stats=self.stats)
+        manager = getattr(self, 'connection_manager', None)
+        if manager is not None:
+            manager.head_timeout = self.header_timeout
+        self.stats.add_gauge('watched_connections', self.reaper.watched_count)
+
+    def server_close(self):
+        if self.reaper is not None:
+            self.reaper.shutdown()
+        SecureHTTPServer.server_close(self)
+
+    def get_stats(self):
+        """
+        Return a snapshot of the server's statistics (see
+        ``ServerStats.snapshot``): requests, bytes in (request bodies)
+        and out, responses by status class, and the service time of
+        requests.  With a thread pool this includes the pool's
+        statistics as well.
+        """
+        return self.stats.snapshot()
+
+    def server_bind(self):
+        if self.reuse_port:
+            # Let several processes each listen on this address, with
+            # the kernel spreading connections between them
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        SecureHTTPServer.server_bind(self)
 
     def get_request(self):
         # If there is a socket_timeout, set it on the accepted
         (conn,info) = SecureHTTPServer.get_request(self)
         if self.wsgi_socket_timeout:
             conn.settimeout(self.wsgi_socket_timeout)
+        if _is_stdlib_ssl_context(self.ssl_context):
+            # The handshake is left to the connection manager (or the
+            # thread handling the connection), so it can't hold up
+            # accepting other connections
+            conn = self.ssl_context.wrap_socket(
+                conn, server_side=True, do_handshake_on_connect=False)
         return (conn, info)
 
 class WSGIServer(ThreadingMixIn, WSGIServerBase):
@@ -1149,15 +4316,752 @@ class WSGIThreadPoolServer(ThreadPoolMixIn, WSGIServerBase):
     def __init__(self, wsgi_application, server_address,
                  RequestHandlerClass=None, ssl_context=None,
                  nworkers=10, daemon_threads=False,
-                 threadpool_options=None, request_queue_size=None):
+                 threadpool_options=None, request_queue_size=None,
+                 use_connection_manager=False, listen_socket=None,
+                 reuse_port=False):
         WSGIServerBase.__init__(self, wsgi_application, server_address,
                                 RequestHandlerClass, ssl_context,
-                                request_queue_size=request_queue_size)
+                                request_queue_size=request_queue_size,
+                                listen_socket=listen_socket,
+                                reuse_port=reuse_port)
         if threadpool_options is None:
             threadpool_options = {}
         ThreadPoolMixIn.__init__(self, nworkers, daemon_threads,
+                                 use_connection_manager,
                                  **threadpool_options)
 
+def _process_rss(pid):
+    """
+    Private function that returns the resident set size of a process
+    in bytes, or None where that can't be found (it needs ``/proc``).
+    """
+    try:
+        with open('/proc/%d/statm' % pid) as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+class PreforkServer:
+    """
+    Runs a server in ``processes`` forked child processes, each with
+    its own thread pool, so that an application can use more than one
+    CPU core.
+
+    ``make_server`` is called in each child to create its server; it
+    is passed either ``listen_socket``, a socket bound and listening
+    in this process that all children share, or (if ``reuse_port`` is
+    true) ``reuse_port=True`` and ``server_address``, in which case
+    each child binds its own socket with ``SO_REUSEPORT`` and the
+    kernel spreads connections evenly between them.
+
+    This process supervises the children: a child that dies is
+    replaced, and a child whose resident memory grows past
+    ``max_child_rss`` megabytes is recycled (a replacement is started,
+    then the old child is asked to finish its requests and exit).
+
+    If ``listen_socket`` is given (such as one inherited from a
+    previous server, see ``handoff``) the children share it, and
+    ``reuse_port`` is not used.
+    """
+
+    # Seconds to wait for children to exit before killing them
+    shutdown_timeout = 60
+
+    def __init__(self, make_server, processes, server_address,
+                 request_queue_size=5, reuse_port=None, max_child_rss=None,
+                 check_interval=1, logger=None, listen_socket=None):
+        assert processes > 0, "PreforkServer needs at least one process"
+        if listen_socket is not None:
+            reuse_port = False
+        elif reuse_port is None:
+            reuse_port = hasattr(socket, 'SO_REUSEPORT')
+        self.make_server = make_server
+        self.processes = processes
+        self.reuse_port = reuse_port
+        self.max_child_rss = max_child_rss
+        self.check_interval = check_interval
+        if logger is None:
+            logger = logging.getLogger('paste.httpserver.PreforkServer')
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+        # pid -> start time
+        self.children = {}
+        # Children that have been asked to exit
+        self.retiring = set()
+        self.running = False
+        # Bind here, so problems with the address show up right away
+        # (and a port of 0 is resolved once, for all the children).
+        # With reuse_port this socket is never listened on, so it
+        # receives no connections.
+        if listen_socket is not None:
+            self.socket = listen_socket
+        else:
+            self.socket = socket.socket(HTTPServer.address_family,
+                                        socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                self.socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.socket.bind(server_address)
+        if not reuse_port:
+            self.socket.listen(request_queue_size)
+        self.server_address = self.socket.getsockname()
+
+    def spawn_child(self):
+        """
+        Fork a new child process that runs a server.
+        """
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.time()
+            self.logger.info('Started child process %s', pid)
+            return pid
+        status = 0
+        try:
+            if self.reuse_port:
+                self.socket.close()
+                server = self.make_server(
+                    reuse_port=True, server_address=self.server_address)
+            else:
+                server = self.make_server(listen_socket=self.socket)
+            def stop(signum, frame):
+                # serve_forever notices this within a second, and then
+                # lets the thread pool finish pending requests
+                server.drain_timeout = self.shutdown_timeout
+                server.running = False
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+            server.serve_forever()
+            server.server_close()
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            # Never return into the parent's code
+            os._exit(status)
+
+    def reap_children(self):
+        """
+        Collect children that have exited.
+        """
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            if pid not in self.children:
+                continue
+            del self.children[pid]
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                self.logger.info('Child process %s exited', pid)
+            elif self.running:
+                self.logger.warning(
+                    'Child process %s died (status %s); replacing it',
+                    pid, status)
+
+    def check_memory(self):
+        """
+        Recycle children that have grown past ``max_child_rss``.
+        """
+        if not self.max_child_rss:
+            return
+        limit = self.max_child_rss * 1024 * 1024
+        for pid in list(self.children):
+            if pid in self.retiring:
+                continue
+            rss = _process_rss(pid)
+            if rss is not None and rss > limit:
+                self.logger.info(
+                    'Child process %s uses %iMB (limit %sMB); recycling it',
+                    pid, rss // (1024 * 1024), self.max_child_rss)
+                self.retiring.add(pid)
+                self.spawn_child()
+                self.signal_child(pid, signal.SIGTERM)
+
+    def signal_child(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def serve_forever(self):
+        """
+        Start the children, and keep the right number running until
+        ``running`` is set to False (or this process gets SIGTERM).
+        """
+        self.running = True
+        if threading.current_thread() is threading.main_thread():
+            def stop(signum, frame):
+                self.running = False
+            signal.signal(signal.SIGTERM, stop)
+        try:
+            while self.running:
+                self.reap_children()
+                while (len(self.children) - len(self.retiring)
+                       < self.processes):
+                    self.spawn_child()
+                self.check_memory()
+                time.sleep(self.check_interval)
+        finally:
+            self.stop_children()
+
+    def stop_children(self):
+        """
+        Ask all children to exit, and kill those that don't in time.
+        """
+        self.running = False
+        for pid in self.children:
+            self.signal_child(pid, signal.SIGTERM)
+        deadline = time.time() + self.shutdown_timeout
+        while self.children and time.time() < deadline:
+            self.retiring.update(self.children)
+            self.reap_children()
+            time.sleep(0.1)
+        for pid in self.children:
+            self.logger.warning('Killing child process %s', pid)
+            self.signal_child(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.children.clear()
+        self.retiring.clear()
+
+    def handoff(self, args=None):
+        """
+        Start a new server process that takes over the listening
+        socket (see ``spawn_successor``), then stop the children,
+        letting them finish the requests they have.  With
+        ``reuse_port`` the new process binds its own sockets, and
+        connections still waiting in the old children's backlogs are
+        lost.
+        """
+        process = spawn_successor(self.socket, args)
+        self.logger.info('Handed off the listening socket to process %s',
+                         process.pid)
+        self.running = False
+        return process
+
+    def server_close(self):
+        self.stop_children()
+        self.socket.close()
+
+class _AsyncioInput:
+    """
+    The bytes received on an asyncio connection.  The event loop
+    feeds them in and takes the request heads off the front; a worker
+    thread reads the request body (blocking until it arrives).
+
+    Reading from the connection is paused while more than
+    ``high_water`` bytes are waiting to be read.
+    """
+
+    high_water = 262144
+
+    def __init__(self, protocol):
+        self.protocol = protocol
+        self._buf = bytearray()
+        self._eof = False
+        self._paused = False
+        self._cond = threading.Condition()
+
+    def feed(self, data):
+        with self._cond:
+            self._buf += data
+            self._cond.notify_all()
+            if len(self._buf) > self.high_water and not self._paused:
+                self._paused = True
+                self.protocol.transport.pause_reading()
+
+    def feed_eof(self):
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def at_eof(self):
+        return self._eof and not self._buf
+
+    def buffered(self):
+        return len(self._buf)
+
+    def take_head(self):
+        """
+        Remove and return a complete request head (request line and
+        headers) from the buffer, or return None if there isn't one
+        yet.  Called from the event loop.
+        """
+        with self._cond:
+            buf = self._buf
+            # Ignore empty lines in front of a request (RFC 7230 3.5)
+            start = 0
+            while buf.startswith(b'\r\n', start) or buf.startswith(b'\n', start):
+                start += buf.startswith(b'\r\n', start) and 2 or 1
+            del buf[:start]
+            end = buf.find(b'\r\n\r\n')
+            if end >= 0:
+                end += 4
+            lf_end = buf.find(b'\n\n', 0, end if end >= 0 else len(buf))
+            if lf_end >= 0:
+                end = lf_end + 2
+            if end < 0:
+                return None
+            head = bytes(buf[:end])
+            del buf[:end]
+            self._resume()
+            return head
+
+    def _resume(self):
+        # Must be called with the lock held
+        if self._paused and len(self._buf) < self.high_water // 2:
+            self._paused = False
+            self.protocol.loop.call_soon_threadsafe(
+                self.protocol.resume_reading)
+
+    def _wait(self, size):
+        while len(self._buf) < size and not self._eof:
+            if self._paused:
+                # We're waiting for more than the high water mark
+                self._paused = False
+                self.protocol.loop.call_soon_threadsafe(
+                    self.protocol.resume_reading)
+            self._cond.wait()
+
+    def read(self, size=-1):
+        with self._cond:
+            if size is None or size < 0:
+                self._wait(float('inf'))
+                size = len(self._buf)
+            else:
+                self._wait(size)
+            data = bytes(self._buf[:size])
+            del self._buf[:size]
+            self._resume()
+            return data
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast('B')
+        with self._cond:
+            self._wait(1)
+            n = min(len(buffer), len(self._buf))
+            buffer[:n] = self._buf[:n]
+            del self._buf[:n]
+            self._resume()
+            return n
+
+    def readline(self, size=-1):
+        if size is None:
+            size = -1
+        with self._cond:
+            start = 0
+            while True:
+                end = self._buf.find(b'\n', start) + 1
+                if end or self._eof or 0 <= size <= len(self._buf):
+                    break
+                start = len(self._buf)
+                self._wait(start + 1)
+            if not end:
+                end = len(self._buf)
+            if 0 <= size < end:
+                end = size
+            data = bytes(self._buf[:end])
+            del self._buf[:end]
+            self._resume()
+            return data
+
+    def close(self):
+        # The buffer belongs to the connection
+        pass
+
+class _AsyncioOutput:
+    """
+    File-like object a worker thread writes the response to; the data
+    is written by the event loop.  Writes block while the transport's
+    buffer is full.
+    """
+
+    def __init__(self, protocol):
+        self.protocol = protocol
+
+    def write(self, data):
+        protocol = self.protocol
+        if protocol.closed:
+            raise ConnectionResetError('The client closed the connection')
+        if threading.get_ident() == protocol.server.loop_thread_id:
+            protocol.write(data)
+            return
+        # The event loop sets can_write again once the data is written
+        # and the transport's buffer isn't full; pause_writing() alone
+        # could come after this thread's next write
+        protocol.can_write.clear()
+        protocol.loop.call_soon_threadsafe(protocol.write_for_worker,
+                                           bytes(data))
+        protocol.can_write.wait()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class _AsyncioHTTPProtocol(asyncio.Protocol):
+    """
+    An HTTP connection in ``AsyncioWSGIServer``: reads requests,
+    hands each one to a worker thread, and keeps the connection alive
+    (closing it if it idles for longer than the server's
+    ``keepalive_timeout`` or ``wsgi_socket_timeout``, or takes longer
+    than ``header_timeout`` to send a request head).
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = server.loop
+        self.transport = None
+        self.client_address = None
+        self.input = _AsyncioInput(self)
+        self.output = _AsyncioOutput(self)
+        # The handler of the request in progress:
+        self.handler = None
+        self.closed = False
+        # AsyncioWSGIHandler.wsgi_connection_environ() keeps this
+        self.base_environ = None
+        self.can_write = threading.Event()
+        self.can_write.set()
+        self.writing_paused = False
+        # Closes the connection if it is idle, or the client is slow
+        # sending a request head, for too long
+        self._timer = None
+        self._timer_phase = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.client_address = transport.get_extra_info('peername')
+        self.server.connections.add(self)
+        self._next_request()
+
+    def data_received(self, data):
+        self.input.feed(data)
+        if self.handler is None:
+            self._next_request()
+
+    def eof_received(self):
+        self.input.feed_eof()
+        # Keep the transport open if there's a response to write
+        return self.handler is not None
+
+    def connection_lost(self, exc):
+        self.closed = True
+        self.input.feed_eof()
+        self.can_write.set()
+        self._cancel_timer()
+        self.server.connections.discard(self)
+
+    def pause_writing(self):
+        self.writing_paused = True
+        self.can_write.clear()
+
+    def resume_writing(self):
+        self.writing_paused = False
+        self.can_write.set()
+
+    def resume_reading(self):
+        if not self.closed:
+            self.transport.resume_reading()
+
+    def write(self, data):
+        if not self.closed:
+            self.transport.write(data)
+
+    def write_for_worker(self, data):
+        """
+        Write ``data`` for the worker thread waiting on ``can_write``,
+        and let it go on unless the transport's buffer is now full.
+        """
+        self.write(data)
+        if self.closed or not self.writing_paused:
+            self.can_write.set()
+
+    def shutdown(self, how=None):
+        """
+        Drop the connection (this is how the server's
+        ``ConnectionReaper`` closes it).
+        """
+        self.loop.call_soon_threadsafe(self.transport.abort)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._timer_phase = None
+
+    def _set_timer(self, phase, timeout):
+        self._cancel_timer()
+        self._timer_phase = phase
+        if timeout:
+            self._timer = self.loop.call_later(timeout, self._timed_out, phase)
+
+    def _timed_out(self, phase):
+        self._timer = None
+        self.server.stats.incr('reaped_' + phase)
+        self.transport.close()
+
+    def _next_request(self):
+        server = self.server
+        head = self.input.take_head()
+        if head is None:
+            if self.input.buffered() >= server.RequestHandlerClass.max_head_size:
+                self.write(b'HTTP/1.0 431 Request Header Fields Too Large\r\n'
+                           b'Connection: close\r\n\r\n')
+                self.transport.close()
+            elif self.input.at_eof():
+                self.transport.close()
+            elif self.input.buffered():
+                # Part of a request head has arrived
+                if server.header_timeout and self._timer_phase != 'head':
+                    self._set_timer('head', server.header_timeout)
+            elif self._timer_phase is None:
+                self._set_timer('idle', server.keepalive_timeout
+                                or server.wsgi_socket_timeout)
+            return
+        self._cancel_timer()
+        handler = self.server.RequestHandlerClass(self, head)
+        if not handler.parse_request():
+            # An error response has been written
+            self.transport.close()
+            return
+        self.handler = handler
+        handler.rfile = self.input
+        handler.time_queued = time.time()
+        future = self.loop.run_in_executor(
+            self.server.executor, handler.handle_request)
+        future.add_done_callback(self._request_done)
+
+    def _request_done(self, future):
+        handler, self.handler = self.handler, None
+        error = not future.cancelled() and future.exception()
+        if error:
+            # handle_request handles the application's errors itself,
+            # so this is a failure of the server's
+            self.server.handle_error(self.client_address, error)
+        if self.closed:
+            return
+        if future.cancelled() or error or handler.close_connection:
+            self.transport.close()
+        else:
+            self._next_request()
+
+class AsyncioWSGIHandler(WSGIHandlerMixin, BaseHTTPRequestHandler):
+    """
+    The WSGI handler for ``AsyncioWSGIServer``.  The event loop
+    creates one for each request, with the connection's protocol and
+    the request ``head``, and calls ``parse_request()``; the request
+    is then handled in a worker thread with ``handle_request()``.
+    """
+    server_version = WSGIHandler.server_version
+
+    def __init__(self, protocol, head):
+        # This does not call BaseRequestHandler.__init__, which would
+        # handle the whole connection right away
+        self.protocol = protocol
+        self.server = protocol.server
+        self.client_address = protocol.client_address
+        self.connection = protocol
+        end = head.find(b'\n') + 1
+        self.raw_requestline = head[:end]
+        self.wsgi_head = head[end:]
+        self.wfile = protocol.output
+        self.wbufsize = 0
+        self.close_connection = True
+
+    def wsgi_read_head(self):
+        return self.wsgi_head
+
+    def wsgi_setup(self, environ=None):
+        WSGIHandlerMixin.wsgi_setup(self, environ)
+        # Each request (not just the first on a connection) waits for
+        # a worker on its own
+        self.wsgi_environ.setdefault('paste.httpserver.queue_wait',
+                                     self.time_dequeued - self.time_queued)
+        self.wsgi_environ.setdefault('paste.httpserver.dequeued',
+                                     self.time_dequeued)
+
+    def wsgi_connection_environ(self):
+        # Handlers only last for one request; the protocol lasts for
+        # the connection
+        protocol = self.protocol
+        if protocol.base_environ is None:
+            protocol.base_environ = WSGIHandlerMixin.wsgi_connection_environ(
+                self)
+        return protocol.base_environ
+
+    def wsgi_is_secure(self):
+        return self.protocol.transport.get_extra_info('sslcontext') is not None
+
+    def handle_request(self):
+        """
+        Run the WSGI application for the request (this is called in
+        a worker thread).
+        """
+        time_started = self.time_dequeued = time.time()
+        server = self.server
+        server.stats.observe('queue_wait', time_started - self.time_queued)
+        if server.request_timeout:
+            self.wsgi_request_deadline = (
+                self.time_queued + server.request_timeout)
+        self.wsgi_watch('request')
+        try:
+            self.wsgi_execute()
+            if not self.close_connection:
+                self.wsgi_discard_input()
+        except SocketErrors as exce:
+            self.close_connection = 1
+            self.wsgi_connection_drop(exce)
+        except Exception:
+            self.close_connection = 1
+            server.handle_error(self.client_address)
+        finally:
+            if server.reaper is not None:
+                server.reaper.unwatch(self.connection)
+            self.wsgi_record_stats(time_started)
+
+    def address_string(self):
+        return ''
+
+class AsyncioWSGIServer:
+    """
+    A WSGI server in which an ``asyncio`` event loop accepts
+    connections, reads and parses requests, keeps connections alive,
+    and writes the responses.  Only the WSGI application itself runs
+    in a worker thread, from a ``ThreadPoolExecutor`` of ``nworkers``
+    threads, so idle or slow clients never tie up a worker.
+
+    The environment the application gets is the same as with the
+    threaded servers (the handler is a ``WSGIHandlerMixin``).
+    """
+
+    # How often serve_forever checks ``running``
+    poll_interval = 0.5
+
+    # Seconds requests in progress get to finish when the server stops
+    drain_timeout = 60
+
+    # Deadlines for slow clients (see ``WSGIServerBase.start_reaper``);
+    # the event loop itself times out idle connections and request
+    # heads
+    header_timeout = None
+    body_timeout = None
+    keepalive_timeout = None
+    request_timeout = None
+    reaper = None
+
+    def __init__(self, wsgi_application, server_address,
+                 RequestHandlerClass=None, ssl_context=None, nworkers=10,
+                 request_queue_size=5, listen_socket=None, reuse_port=False):
+        assert not ssl_context or _is_stdlib_ssl_context(ssl_context), (
+            "AsyncioWSGIServer needs an ssl.SSLContext")
+        self.wsgi_application = wsgi_application
+        self.RequestHandlerClass = RequestHandlerClass or AsyncioWSGIHandler
+        self.ssl_context = ssl_context
+        self.request_queue_size = request_queue_size
+        self.wsgi_socket_timeout = None
+        if listen_socket is None:
+            listen_socket = socket.socket(HTTPServer.address_family,
+                                          socket.SOCK_STREAM)
+            listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuse_port:
+                listen_socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            listen_socket.bind(server_address)
+        listen_socket.listen(request_queue_size)
+        _use_listen_socket(self, listen_socket)
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread_id = None
+        self.executor = ThreadPoolExecutor(
+            nworkers, thread_name_prefix='AsyncioWSGIServer worker')
+        self.connections = set()
+        self.running = True
+        self.stats = ServerStats()
+        self.stats.add_gauge('active_connections', lambda: len(
+            [conn for conn in list(self.connections) if conn.handler]))
+        self.stats.add_gauge('idle_connections', lambda: len(
+            [conn for conn in list(self.connections) if not conn.handler]))
+
+    def get_stats(self):
+        """
+        Return a snapshot of the server's statistics (see
+        ``ServerStats.snapshot``).
+        """
+        return self.stats.snapshot()
+
+    def serve_forever(self):
+        """
+        Run the event loop until ``running`` is set to False, then
+        stop accepting connections and let the requests in progress
+        finish (for up to ``drain_timeout`` seconds).
+        """
+        self.loop_thread_id = threading.get_ident()
+        self.running = True
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        server = await self.loop.create_server(
+            lambda: _AsyncioHTTPProtocol(self), sock=self.socket,
+            ssl=self.ssl_context, backlog=self.request_queue_size)
+        try:
+            while self.running:
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            server.close()
+            drain_until = time.time() + self.drain_timeout
+            while True:
+                for conn in list(self.connections):
+                    if conn.handler is None:
+                        conn.transport.close()
+                if not self.connections or time.time() > drain_until:
+                    break
+                await asyncio.sleep(0.05)
+            for conn in list(self.connections):
+                conn.transport.close()
+            # Let the transports finish closing
+            await asyncio.sleep(0)
+
+    def handle_error(self, client_address, error=None):
+        """
+        Report the exception being handled (or ``error``), raised while
+        serving ``client_address``.
+        """
+        print('-'*40, file=sys.stderr)
+        print('Exception happened during processing of request from',
+              client_address, file=sys.stderr)
+        if error is None:
+            traceback.print_exc()
+        else:
+            traceback.print_exception(type(error), error,
+                                      error.__traceback__)
+        print('-'*40, file=sys.stderr)
+
+    def start_reaper(self):
+        """
+        Start a ``ConnectionReaper`` for ``body_timeout`` and
+        ``request_timeout``.
+        """
+        self.reaper = ConnectionReaper(
+            "ConnectionReaper for HTTP server on %s:%d"
+            % (self.server_name, self.server_port), stats=self.stats)
+        self.stats.add_gauge('watched_connections', self.reaper.watched_count)
+
+    def server_close(self):
+        self.running = False
+        self.socket.close()
+        if self.reaper is not None:
+            self.reaper.shutdown()
+        self.executor.shutdown(wait=True)
+
 class ServerExit(SystemExit):
     """
     Raised to tell the server to really exit (SystemExit is normally
@@ -1168,7 +5072,13 @@ def serve(application, host=None, port=None, handler=None, ssl_pem=None,
           ssl_context=None, server_version=None, protocol_version=None,
           start_loop=True, daemon_threads=None, socket_timeout=None,
           use_threadpool=None, threadpool_workers=10,
-          threadpool_options=None, request_queue_size=5):
+          threadpool_options=None, request_queue_size=5,
+          use_connection_manager=None, processes=None, reuse_port=None,
+          max_child_rss=None, restart_signal=None, ssl_session_tickets=None,
+          use_asyncio=None, header_timeout=None, body_timeout=None,
+          keepalive_timeout=None, request_timeout=None, max_headers=None,
+          max_head_size=None, offload_output=None, serve_static=None,
+          subinterpreters=None, subinterpreter_app=None):
     """
     Serves your ``application`` over HTTP(S) via WSGI interface
 
@@ -1190,10 +5100,11 @@ def serve(application, host=None, port=None, handler=None, ssl_pem=None,
 
     ``ssl_pem``
 
-        This an optional SSL certificate file (via OpenSSL). You can
-        supply ``*`` and a development-only certificate will be
-        created for you, or you can generate a self-signed test PEM
-        certificate file as follows::
+        This an optional SSL certificate file, with the certificate
+        chain and the private key (used with the ``ssl`` module).  You
+        can supply ``*`` and a development-only certificate will be
+        created for you (this needs pyOpenSSL), or you can generate a
+        self-signed test PEM certificate file as follows::
 
             $ openssl genrsa 1024 > host.key
             $ chmod 400 host.key
@@ -1202,13 +5113,33 @@ def serve(application, host=None, port=None, handler=None, ssl_pem=None,
             $ cat host.cert host.key > host.pem
             $ chmod 400 host.pem
 
+        The file is loaded into an ``ssl.SSLContext`` (see
+        ``make_ssl_context``), with the ``ssl`` module's defaults for
+        protocol versions and ciphers, even where pyOpenSSL is
+        installed (pyOpenSSL used to be used whenever it was
+        available).  To keep using pyOpenSSL, pass a pyOpenSSL
+        context as ``ssl_context``.
+
     ``ssl_context``
 
-        This an optional SSL context object for the server.  A SSL
-        context will be automatically constructed for you if you supply
+        This an optional SSL context object for the server, either an
+        ``ssl.SSLContext`` or a pyOpenSSL context.  A SSL context will
+        be automatically constructed for you if you supply
         ``ssl_pem``.  Supply this to use a context of your own
         construction.
 
+        With an ``ssl.SSLContext`` and ``use_threadpool``, the
+        handshakes are done by a ``ConnectionManager`` without
+        blocking, rather than by the worker threads.
+
+    ``ssl_session_tickets``
+
+        The number of TLS 1.3 session tickets sent to clients after a
+        handshake (used to resume the session later with a shorter
+        handshake), when the context is made from ``ssl_pem``.  0
+        turns session tickets off, leaving TLS 1.2 clients with the
+        server-side session cache.
+
     ``server_version``
 
         The version of the server as reported in HTTP response line. This
@@ -1220,12 +5151,10 @@ def serve(application, host=None, port=None, handler=None, ssl_pem=None,
         This sets the protocol used by the server, by default
         ``HTTP/1.0``. There is some support for ``HTTP/1.1``, which
         defaults to nicer keep-alive connections.  This server supports
-        ``100 Continue``, but does not yet support HTTP/1.1 Chunked
-        Encoding. Hence, if you use HTTP/1.1, you're somewhat in error
-        since chunked coding is a mandatory requirement of a HTTP/1.1
-        server.  If you specify HTTP/1.1, every response *must* have a
-        ``Content-Length`` and you must be careful not to read past the
-        end of the socket.
+        ``100 Continue``, and responses without a ``Content-Length``
+        are sent to HTTP/1.1 clients with chunked transfer-coding so
+        the connection can stay open.  Responses to HTTP/1.0 clients
+        without a ``Content-Length`` still close the connection.
 
     ``start_loop``
 
@@ -1246,6 +5175,24 @@ def serve(application, host=None, port=None, handler=None, ssl_pem=None,
         disconnect, but at a later time it might follow the RFC a bit
         more closely.
 
+    ``header_timeout``, ``body_timeout``, ``keepalive_timeout``, ``request_timeout``
+
+        Separate deadlines, in seconds, for slow clients: for sending
+        the request head, for sending the request body (only counting
+        the time the server spends waiting for it), for starting the
+        next request on a kept-alive connection, and for the whole
+        request.  A ``ConnectionReaper`` thread closes the connections
+        that miss them, so a client trickling in a request can't hold
+        a worker thread for longer (see
+        ``WSGIServerBase.start_reaper``).  The ``socket_timeout``
+        still applies to every read and write.
+
+    ``max_headers``, ``max_head_size``
+
+        The most header lines a request may have (default 100), and
+        the longest its head may be in bytes (default 65536).  Larger
+        requests get a ``431 Request Header Fields Too Large``.
+
     ``use_threadpool``
 
         Server requests from a pool of worker threads (``threadpool_workers``)
@@ -1270,19 +5217,114 @@ def serve(application, host=None, port=None, handler=None, ssl_pem=None,
         The 'backlog' argument to socket.listen(); specifies the
         maximum number of queued connections.
 
+    ``use_connection_manager``
+
+        When using ``HTTP/1.1`` keep-alive with ``use_threadpool``, hand
+        idle connections to a single selector-driven thread between
+        requests, instead of leaving a worker thread blocked on each
+        one.  A connection goes back to the thread pool once the
+        client's next request head has arrived, and is closed if it is
+        idle for longer than ``socket_timeout``.  This lets a small
+        pool of workers serve a large number of keep-alive clients.
+        It is not used for pyOpenSSL connections.
+
+    ``offload_output``
+
+        With ``use_threadpool``, have a single selector-driven thread
+        send whatever part of a response the client couldn't take
+        right away, once the application is done with it, so a slow
+        client doesn't keep a worker thread busy for its whole
+        download (see ``OutputWriter``).  Up to a megabyte of a
+        response is held for it.  This implies
+        ``use_connection_manager``, and is not used for SSL
+        connections.
+
+    ``serve_static``
+
+        With ``use_threadpool``, answer simple requests for the files
+        of the application's static mounts straight from the connection
+        manager, without a worker thread or the application: the
+        ``application`` itself, or the applications mounted in it if it
+        is a ``paste.urlmap.URLMap``, that are a
+        ``paste.urlparser.StaticURLParser`` or a
+        ``paste.fileapp.DirectoryApp`` (see ``StaticFiles``).  This
+        implies ``offload_output``; SSL connections are not answered
+        this way.  The files are looked up and opened in the
+        connection manager's thread, so don't use this for a slow
+        (e.g., network) file system.
+
+    ``processes``
+
+        Run the server in this many forked child processes, each with
+        its own thread pool (see ``PreforkServer``).  This process
+        then only supervises the children, replacing any that die.
+        Requires ``use_threadpool`` and ``os.fork``.
+
+    ``reuse_port``
+
+        With ``processes``, have each child listen on its own socket
+        using ``SO_REUSEPORT`` (so the kernel balances connections
+        between them) rather than sharing one socket.  Defaults to
+        true where ``SO_REUSEPORT`` is available.
+
+    ``max_child_rss``
+
+        With ``processes``, replace a child once its resident memory
+        grows past this many megabytes.
+
+    ``restart_signal``
+
+        The name of a signal (e.g., ``SIGHUP``) that makes the server
+        restart without dropping connections: a new process is started
+        with the same command line and takes over the listening
+        socket, while this one stops accepting connections and exits
+        once its requests are finished.  Requires ``use_threadpool``.
+
+        A server started with the ``PASTE_LISTEN_FD`` environment
+        variable set uses that socket in place of ``host`` and
+        ``port``.
+
+    ``use_asyncio``
+
+        Use an ``asyncio`` event loop to accept connections, read and
+        parse requests, keep connections alive and write responses,
+        running only the application in a pool of
+        ``threadpool_workers`` threads (see ``AsyncioWSGIServer``).
+        Idle keep-alive connections and slow clients then cost no
+        thread.  The handler must be an ``AsyncioWSGIHandler``, and
+        ``ssl_context`` an ``ssl.SSLContext``; ``threadpool_options``
+        are not used.
+
+    ``subinterpreters``
+
+        Run the application in this many subinterpreters, each with
+        its own GIL, so that it can use several cores in one process
+        (see ``SubinterpreterApp``).  The worker threads then only
+        wait for the subinterpreters, so there should be at least as
+        many of them.  Requires Python 3.14 or later.
+
+    ``subinterpreter_app``
+
+        The application for the subinterpreters to import, as a
+        ``module:name`` string, when ``application`` itself can't be
+        pickled (as is usual for an application made by
+        ``paste.deploy``).
+
     """
     is_ssl = False
     if ssl_pem or ssl_context:
-        assert SSL, "pyOpenSSL is not installed"
         is_ssl = True
         port = int(port or 4443)
         if not ssl_context:
             if ssl_pem == '*':
+                assert SSL, "pyOpenSSL is not installed"
                 ssl_context = _auto_ssl_context()
             else:
-                ssl_context = SSL.Context(SSL.SSLv23_METHOD)
-                ssl_context.use_privatekey_file(ssl_pem)
-                ssl_context.use_certificate_chain_file(ssl_pem)
+                assert ssl, "The ssl module is not available"
+                ssl_context = make_ssl_context(
+                    ssl_pem, session_tickets=ssl_session_tickets)
+        elif not _is_stdlib_ssl_context(ssl_context):
+            assert SSL, "pyOpenSSL is not installed"
 
     host = host or '127.0.0.1'
     is_ipv6 = False
@@ -1318,32 +5360,101 @@ def serve(application, host=None, port=None, handler=None, ssl_pem=None,
     else:
         HTTPServer.address_family = socket.AF_INET
 
+    use_asyncio = converters.asbool(use_asyncio)
     if not handler:
-        handler = WSGIHandler
+        handler = use_asyncio and AsyncioWSGIHandler or WSGIHandler
+    elif use_asyncio:
+        assert issubclass(handler, AsyncioWSGIHandler), (
+            "use_asyncio needs an AsyncioWSGIHandler")
     if server_version:
         handler.server_version = server_version
         handler.sys_version = None
     if protocol_version:
         assert protocol_version in ('HTTP/0.9', 'HTTP/1.0', 'HTTP/1.1')
         handler.protocol_version = protocol_version
+    if max_headers:
+        handler.max_headers = int(max_headers)
+    if max_head_size:
+        handler.max_head_size = int(max_head_size)
 
     if use_threadpool is None:
         use_threadpool = True
 
-    if converters.asbool(use_threadpool):
-        server = WSGIThreadPoolServer(application, server_address, handler,
-                                      ssl_context, int(threadpool_workers),
-                                      daemon_threads,
-                                      threadpool_options=threadpool_options,
-                                      request_queue_size=request_queue_size)
+    static_app = application
+    if subinterpreters and int(subinterpreters):
+        assert InterpreterPoolExecutor is not None, (
+            "subinterpreters need concurrent.interpreters (Python 3.14)")
+        application = SubinterpreterApp(subinterpreter_app or application,
+                                        int(subinterpreters))
+
+    inherited_socket = inherited_listen_socket()
+
+    def make_server(listen_socket=inherited_socket, reuse_port=False,
+                    server_address=server_address):
+        if use_asyncio:
+            server = AsyncioWSGIServer(application, server_address, handler,
+                                       ssl_context, int(threadpool_workers),
+                                       request_queue_size=request_queue_size,
+                                       listen_socket=listen_socket,
+                                       reuse_port=reuse_port)
+        elif converters.asbool(use_threadpool):
+            server = WSGIThreadPoolServer(application, server_address, handler,
+                                          ssl_context, int(threadpool_workers),
+                                          daemon_threads,
+                                          threadpool_options=threadpool_options,
+                                          request_queue_size=request_queue_size,
+                                          use_connection_manager=converters.asbool(
+                                              use_connection_manager),
+                                          listen_socket=listen_socket,
+                                          reuse_port=reuse_port)
+        else:
+            server = WSGIServer(application, server_address, handler, ssl_context,
+                                request_queue_size=request_queue_size,
+                                listen_socket=listen_socket,
+                                reuse_port=reuse_port)
+            if daemon_threads:
+                server.daemon_threads = daemon_threads
+
+        if socket_timeout:
+            server.wsgi_socket_timeout = int(socket_timeout)
+        if converters.asbool(offload_output):
+            assert hasattr(server, 'start_output_writer'), (
+                "offload_output can only be used with use_threadpool")
+            server.start_output_writer()
+        if converters.asbool(serve_static):
+            assert hasattr(server, 'start_static_files'), (
+                "serve_static can only be used with use_threadpool")
+            server.start_static_files(StaticFiles.find(static_app))
+        timeouts = dict(header_timeout=header_timeout,
+                        body_timeout=body_timeout,
+                        keepalive_timeout=keepalive_timeout,
+                        request_timeout=request_timeout)
+        if any(timeouts.values()):
+            for name, value in timeouts.items():
+                setattr(server, name, value and float(value))
+            server.start_reaper()
+        return server
+
+    if processes and int(processes):
+        assert use_asyncio or converters.asbool(use_threadpool), (
+            "processes can only be used with use_threadpool or use_asyncio")
+        if reuse_port is not None:
+            reuse_port = converters.asbool(reuse_port)
+        server = PreforkServer(make_server, int(processes), server_address,
+                               request_queue_size, reuse_port=reuse_port,
+                               max_child_rss=max_child_rss and int(max_child_rss),
+                               listen_socket=inherited_socket)
     else:
-        server = WSGIServer(application, server_address, handler, ssl_context,
-                            request_queue_size=request_queue_size)
-        if daemon_threads:
-            server.daemon_threads = daemon_threads
+        server = make_server()
 
-    if socket_timeout:
-        server.wsgi_socket_timeout = int(socket_timeout)
+    if restart_signal:
+        assert hasattr(server, 'handoff'), (
+            "restart_signal can only be used with use_threadpool")
+        if not restart_signal.upper().startswith('SIG'):
+            restart_signal = 'SIG' + restart_signal
+        def restart(signum, frame):
+            server.handoff()
+        signal.signal(getattr(signal, restart_signal.upper()), restart)
 
     if converters.asbool(start_loop):
         protocol = is_ssl and 'https' or 'http'
@@ -1371,10 +5482,25 @@ def server_runner(wsgi_app, global_conf, **kwargs):
                  'threadpool_dying_limit', 'threadpool_spawn_if_under',
                  'threadpool_max_zombie_threads_before_die',
                  'threadpool_hung_check_period',
-                 'threadpool_max_requests', 'request_queue_size']:
+                 'threadpool_max_requests', 'request_queue_size',
+                 'processes', 'max_child_rss', 'threadpool_max_workers',
+                 'ssl_session_tickets', 'max_headers', 'max_head_size',
+                 'threadpool_max_queue', 'threadpool_cpu_workers',
+                 'subinterpreters']:
         if name in kwargs:
             kwargs[name] = int(kwargs[name])
-    for name in ['use_threadpool', 'daemon_threads']:
+    for name in ['header_timeout', 'body_timeout', 'keepalive_timeout',
+                 'request_timeout', 'threadpool_autoscale_period',
+                 'threadpool_autoscale_queue_wait',
+                 'threadpool_autoscale_busy_high',
+                 'threadpool_autoscale_busy_low',
+                 'threadpool_autoscale_cooldown',
+                 'threadpool_codel_target', 'threadpool_codel_interval']:
+        if name in kwargs:
+            kwargs[name] = float(kwargs[name])
+    for name in ['use_threadpool', 'daemon_threads',
+                 'use_connection_manager', 'reuse_port', 'use_asyncio',
+                 'offload_output', 'serve_static']:
         if name in kwargs:
             kwargs[name] = asbool(kwargs[name])
     threadpool_options = {}
@@ -1439,6 +5565,67 @@ server_runner.__doc__ = (serve.__doc__ or '') + """
         or for zombie threads that should cause a restart.  Default 100
         requests.
 
+    ``threadpool_max_workers``:
+
+        Autoscale the pool between ``threadpool_workers`` and this many
+        workers, according to how busy it is.  Default None (the pool
+        keeps its size).
+
+    ``threadpool_autoscale_period``:
+
+        How often (in seconds) the autoscaler samples the pool.
+        Default 1 second.
+
+    ``threadpool_autoscale_queue_wait``:
+
+        Add workers when a request has waited in the queue for longer
+        than this many seconds.  Default 0.1 seconds.
+
+    ``threadpool_autoscale_busy_high``, ``threadpool_autoscale_busy_low``:
+
+        Add workers when more than the high ratio of workers are busy;
+        remove them once no more than the low ratio have been busy
+        (and nothing queued) for ``threadpool_autoscale_cooldown``
+        seconds.  Defaults 0.9, 0.5 and 10 seconds.
+
+    ``threadpool_max_queue``:
+
+        Refuse new requests with a ``503 Service Unavailable`` while
+        this many are waiting for a worker.  Default 0 (no limit).
+
+    ``threadpool_codel_target``, ``threadpool_codel_interval``:
+
+        Refuse requests that have waited longer than the target in a
+        queue that has persisted for longer than the interval (and
+        new requests while they would).  Default None (disabled) and
+        0.1 seconds.
+
+    ``threadpool_scheduler``:
+
+        The order queued requests are handled in: ``fifo`` (the
+        default), ``priority`` (requests for
+        ``threadpool_priority_paths`` first), ``fair`` (clients take
+        turns, by remote address) or ``lifo`` (the newest first, once
+        a request has waited for more than 0.1 seconds).
+
+    ``threadpool_priority_paths``:
+
+        Paths (or prefixes of paths) that have priority, such as a
+        health check, separated by spaces.  These requests are never
+        refused for overload.
+
+    ``threadpool_cpu_workers``:
+
+        Start this many processes for CPU-bound work, which
+        applications use through ``environ['paste.cpu_executor']``
+        (a ``concurrent.futures.ProcessPoolExecutor``) or
+        ``paste.request.run_cpu_bound``.  Default 0 (none).
+
+    ``threadpool_cpu_start_method``:
+
+        The ``multiprocessing`` start method for those processes.
+        Default ``forkserver`` where available, else ``spawn``.
+
     ``threadpool_logger``:
 
         Logging messages will go the logger named here.
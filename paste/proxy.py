@@ -34,6 +34,7 @@ from urllib import parse as urlparse
 from urllib.parse import quote
 
 from paste import httpexceptions
+from paste.request import iter_input
 from paste.util.converters import aslist
 
 # Remove these headers from response (specify lower case header
@@ -97,7 +98,15 @@ class Proxy:
             else:
                 headers['content-length'] = environ['CONTENT_LENGTH']
                 length = int(environ['CONTENT_LENGTH'])
-                body = environ['wsgi.input'].read(length)
+                # Sent as it is read, through one buffer
+                body = iter_input(environ['wsgi.input'], length)
+        elif environ.get('wsgi.input_terminated'):
+            # A body of unknown length (e.g., a chunked request, that
+            # the server has already decoded)
+            headers.pop('transfer-encoding', None)
+            body = environ['wsgi.input'].read()
+            if body:
+                headers['content-length'] = str(len(body))
         else:
             body = ''
 
@@ -215,9 +224,19 @@ class TransparentProxy:
             headers['content-type'] = environ['CONTENT_TYPE']
         if environ.get('CONTENT_LENGTH'):
             length = int(environ['CONTENT_LENGTH'])
-            body = environ['wsgi.input'].read(length)
             if length == -1:
+                body = environ['wsgi.input'].read(length)
                 environ['CONTENT_LENGTH'] = str(len(body))
+            else:
+                # Sent as it is read, through one buffer
+                body = iter_input(environ['wsgi.input'], length)
+                headers['content-length'] = str(length)
+        elif environ.get('wsgi.input_terminated'):
+            # A body of unknown length (e.g., a chunked request, that
+            # the server has already decoded)
+            headers.pop('transfer-encoding', None)
+            body = environ['wsgi.input'].read()
+            length = len(body)
         elif 'CONTENT_LENGTH' not in environ:
             body = ''
             length = 0
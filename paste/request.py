@@ -15,6 +15,8 @@ environment to solve common requirements.
    * path_info_split(path_info)
    * path_info_pop(environ)
    * resolve_relative_url(url, environ)
+   * iter_input(fp, length=-1, bufsize=65536)
+   * run_cpu_bound(environ, func, *args, **kwargs)
 
 """
 from collections.abc import MutableMapping as DictMixin
@@ -27,7 +29,8 @@ from paste.util.multidict import MultiDict
 
 __all__ = ['get_cookies', 'get_cookie_dict', 'parse_querystring',
            'parse_formvars', 'construct_url', 'path_info_split',
-           'path_info_pop', 'resolve_relative_url', 'EnvironHeaders']
+           'path_info_pop', 'resolve_relative_url', 'iter_input',
+           'run_cpu_bound', 'EnvironHeaders']
 
 def get_cookies(environ):
     """
@@ -154,8 +157,10 @@ def parse_formvars(environ, include_get_vars=True, encoding=None, errors=None):
     use_cgi = ct in (
         '', 'application/x-www-form-urlencoded', 'multipart/form-data')
     # FieldStorage assumes a default CONTENT_LENGTH of -1,
-    # but a default of 0 is better:
-    if not environ.get('CONTENT_LENGTH'):
+    # but a default of 0 is better (unless the server tells us the
+    # input can be read to its end, as with a chunked request body):
+    if (not environ.get('CONTENT_LENGTH')
+        and not environ.get('wsgi.input_terminated')):
         environ['CONTENT_LENGTH'] = '0'
     if use_cgi:
         # Prevent FieldStorage from parsing QUERY_STRING
@@ -314,6 +319,56 @@ _parse_headers_special = {
     'CONTENT_TYPE': 'Content-Type',
     }
 
+def iter_input(fp, length=-1, bufsize=65536):
+    """
+    Iterate over ``length`` bytes of a request body (e.g.,
+    ``wsgi.input``), or over all of it if ``length`` is negative, in
+    chunks of up to ``bufsize`` bytes.  Stops early if the body ends
+    before ``length`` bytes.
+
+    When ``fp`` has a ``readinto()`` method, every chunk is read into
+    the same buffer, and is a memoryview of it that is only good until
+    the next chunk is read; use ``bytes(chunk)`` to keep one.
+    """
+    readinto = getattr(fp, 'readinto', None)
+    if readinto is None:
+        while length:
+            size = bufsize if length < 0 else min(bufsize, length)
+            data = fp.read(size)
+            if not data:
+                break
+            if length > 0:
+                length -= len(data)
+            yield data
+        return
+    buffer = memoryview(bytearray(bufsize))
+    while length:
+        size = bufsize if length < 0 else min(bufsize, length)
+        n = readinto(buffer[:size])
+        if not n:
+            break
+        if length > 0:
+            length -= n
+        yield buffer[:n]
+
+def run_cpu_bound(environ, func, *args, **kwargs):
+    """
+    Call ``func(*args, **kwargs)`` in the server's process pool
+    (``environ['paste.cpu_executor']``, which ``paste.httpserver``
+    provides with ``threadpool_cpu_workers``), and return its result
+    (or raise its exception).  Only the calling thread waits for it;
+    other requests carry on meanwhile, as the work doesn't hold this
+    process's GIL.
+
+    ``func`` and its arguments are pickled to send them to another
+    process, so ``func`` must be defined at the top level of a module.
+    Without a process pool, ``func`` is just called.
+    """
+    executor = environ.get('paste.cpu_executor')
+    if executor is None:
+        return func(*args, **kwargs)
+    return executor.submit(func, *args, **kwargs).result()
+
 def parse_headers(environ):
     """
     Parse the headers in the environment (like ``HTTP_HOST``) and
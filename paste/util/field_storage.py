@@ -505,7 +505,18 @@ class FieldStorage:
         """Internal: read binary data."""
         self.file = self.make_file()
         todo = self.length
-        if todo >= 0:
+        if todo >= 0 and hasattr(self.fp, 'readinto'):
+            # Read every block into the same buffer
+            buffer = memoryview(bytearray(self.bufsize))
+            while todo > 0:
+                n = self.fp.readinto(buffer[:min(todo, self.bufsize)])
+                self.bytes_read += n
+                if not n:
+                    self.done = -1
+                    break
+                self.file.write(buffer[:n])
+                todo = todo - n
+        elif todo >= 0:
             while todo > 0:
                 data = self.fp.read(min(todo, self.bufsize))  # bytes
                 if not isinstance(data, bytes):
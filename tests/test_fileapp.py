@@ -10,6 +10,7 @@ from email.utils import parsedate_tz, mktime_tz
 from paste import fileapp
 from paste.fileapp import DataApp
 from paste.fixture import TestApp
+from paste.httpserver import FileWrapper
 
 # NOTE(haypo): don't use string.letters because the order of lower and upper
 # case letters changes when locale.setlocale() is called for the first time
@@ -201,6 +202,56 @@ def test_file_range():
     finally:
         os.unlink(tempfile)
 
+def test_file_range_with_file_wrapper():
+    tempfile = "test_fileapp.%s.txt" % (random.random())
+    content = LETTERS * (1+(fileapp.CACHE_SIZE // len(LETTERS)))
+    content = content.encode('utf8')
+    with open(tempfile, "wb") as fp:
+        fp.write(content)
+    wrapped = []
+    def file_wrapper(filelike, block_size):
+        # A plain PEP 3333 file_wrapper, which sends to the end of the file
+        wrapped.append(filelike)
+        return iter(lambda: filelike.read(block_size), b'')
+    try:
+        app = TestApp(fileapp.FileApp(tempfile))
+        environ = {'wsgi.file_wrapper': file_wrapper}
+        res = app.get("/", headers={'Range': 'bytes=10-'}, status=206,
+                      extra_environ=environ)
+        assert res.body == content[10:]
+        assert len(wrapped) == 1
+        res = app.get("/", headers={'Range': 'bytes=10-19'}, status=206,
+                      extra_environ=environ)
+        assert res.body == content[10:20]
+        assert len(wrapped) == 1
+        for filelike in wrapped:
+            filelike.close()
+    finally:
+        os.unlink(tempfile)
+
+def test_file_with_sized_file_wrapper():
+    tempfile = "test_fileapp.%s.txt" % (random.random())
+    content = LETTERS.encode('utf8') * 100
+    with open(tempfile, "wb") as fp:
+        fp.write(content)
+    try:
+        app = fileapp.FileApp(tempfile)
+        for range, size in ((None, len(content)),
+                            ('bytes=10-', len(content) - 10),
+                            ('bytes=10-19', 10)):
+            environ = {'REQUEST_METHOD': 'GET', 'wsgi.version': (1, 0),
+                       'wsgi.file_wrapper': FileWrapper}
+            if range:
+                environ['HTTP_RANGE'] = range
+            body = app(environ, lambda status, headers: None)
+            # Even to the end of the file, the wrapper is told where
+            # to stop, in case the file grows
+            assert isinstance(body, FileWrapper)
+            assert body.size == size
+            body.close()
+    finally:
+        os.unlink(tempfile)
+
 def test_file_cache():
     filename = os.path.join(os.path.dirname(__file__),
                             'urlparser_data', 'secured.txt')
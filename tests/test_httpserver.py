@@ -1,8 +1,35 @@
 import email
+import gc
+import http.client
 import io
+import json
+import os
+import shutil
+import signal
 import socket
+import ssl
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
-from paste.httpserver import LimitedLengthFile, WSGIHandler, serve
+import pytest
+
+from paste import httpserver
+from paste.debug import threadpoolbench
+from paste.debug.serverstats import ShowServerStats
+from paste.fileapp import DirectoryApp, FileApp
+from paste.httpserver import (AsyncioWSGIHandler, ChunkedInputFile,
+                              ConnectionReaper, ContinueHook, FileWrapper,
+                              LifoScheduler, LimitedLengthFile, ServerStats,
+                              StaticFiles, SubinterpreterApp, ThreadPool,
+                              WSGIHandler, WSGIServer, _process_rss,
+                              parse_headers, serve)
+from paste.request import run_cpu_bound
+from paste.urlmap import URLMap
+from paste.urlparser import StaticURLParser
 
 
 class MockServer:
@@ -46,6 +73,51 @@ def test_environ_with_multiple_values():
     assert wsgi_handler.wsgi_environ['HTTP_HOST'] == 'host1,host2'
 
 
+def test_environ_paths():
+    wsgi_handler = WSGIHandler(MockSocket(), ('1.2.3.4', 5678), MockServer())
+    wsgi_handler.command = 'GET'
+    wsgi_handler.request_version = 'HTTP/1.0'
+    wsgi_handler.headers = email.message_from_string('Host: mywebsite')
+    for target, path, query in [
+            ('/path', '/path', ''),
+            ('/a%20b/?x=1&y=/2', '/a b/', 'x=1&y=/2'),
+            ('/a/./b/../c/', '/a/c/', ''),
+            ('/a//b%2F..', '/a', ''),
+            ('/frag?q#f', '/frag', 'q'),
+            ('http://example.com/abs?q', '//example.com/abs', 'q')]:
+        wsgi_handler.path = target
+        wsgi_handler.wsgi_setup()
+        environ = wsgi_handler.wsgi_environ
+        assert (environ['PATH_INFO'], environ['QUERY_STRING']) == (path, query)
+        assert environ['REMOTE_ADDR'] == '1.2.3.4'
+        assert environ['SERVER_PORT'] == '80'
+        assert environ['paste.httpserver.proxy.scheme'] == 'http'
+
+
+def test_parse_headers():
+    headers = parse_headers(b'Host: example.com\r\n'
+                            b'Accept:text/html \r\n'
+                            b'X-Folded: one\r\n  two\r\n'
+                            b'Content-Type: text/plain\r\n'
+                            b'accept: text/plain\r\n\r\n'
+                            b'body')
+    assert headers['host'] == 'example.com'
+    assert headers.get('Accept') == 'text/html'
+    assert headers.get_all('ACCEPT') == ['text/html', 'text/plain']
+    assert headers.get('Missing', 'default') == 'default'
+    assert 'content-type' in headers
+    assert headers.keys() == ['Host', 'Accept', 'X-Folded', 'Content-Type',
+                              'accept']
+    assert headers.environ == {'HTTP_HOST': 'example.com',
+                               'HTTP_ACCEPT': 'text/html,text/plain',
+                               'HTTP_X_FOLDED': 'one two'}
+    assert parse_headers(b'\n').items() == []
+    for data in (b'No colon\r\n\r\n', b'Bad name: x\r\n\r\n',
+                 b': x\r\n\r\n', b'X: y\r\n' * 101):
+        with pytest.raises(ValueError):
+            parse_headers(data)
+
+
 def test_limited_length_file():
     backing = io.BytesIO(b'0123456789')
     f = LimitedLengthFile(backing, 9)
@@ -54,6 +126,39 @@ def test_limited_length_file():
     assert f.tell() == 9
     assert f.read() == b''
 
+def test_limited_length_file_does_not_over_read():
+    backing = io.BytesIO(b'line 1\nline 2\nNEXT REQUEST\n')
+    f = LimitedLengthFile(backing, 14)
+    assert f.readlines() == [b'line 1\n', b'line 2\n']
+    assert backing.read() == b'NEXT REQUEST\n'
+    backing = io.BytesIO(b'0123456789')
+    f = LimitedLengthFile(backing, 4)
+    assert f.read(-1) == b'0123'
+    assert f.readline(-1) == b''
+    assert backing.read() == b'456789'
+
+def test_limited_length_file_readinto():
+    backing = io.BytesIO(b'0123456789')
+    f = LimitedLengthFile(backing, 7)
+    buffer = bytearray(4)
+    assert f.readinto(buffer) == 4
+    assert buffer == b'0123'
+    assert f.readinto1(memoryview(buffer)[1:]) == 3
+    assert buffer == b'0456'
+    assert f.readinto(buffer) == 0
+    assert f.tell() == 7
+    f = LimitedLengthFile(io.BytesIO(b'0123456789'), 7)
+    chunks = f.chunks(3)
+    assert bytes(next(chunks)) == b'012'
+    assert [bytes(chunk) for chunk in chunks] == [b'345', b'6']
+    sent = []
+    f = ContinueHook(LimitedLengthFile(io.BytesIO(b'0123456789'), 5),
+                     sent.append)
+    assert f.readinto(buffer) == 4
+    assert sent == [b'HTTP/1.1 100 Continue\r\n\r\n']
+    assert [bytes(chunk) for chunk in f.chunks()] == [b'4']
+    assert len(sent) == 1
+
 def test_limited_length_file_tell_on_socket():
     backing_read, backing_write = socket.socketpair()
     f = LimitedLengthFile(backing_read.makefile('rb'), 10)
@@ -124,3 +229,1354 @@ def test_address_family_v6():
     except (socket.error, OSError) as err:
         # v6 support not available in this OS, pass the test
         assert True
+
+
+def _start_server(app, **kwargs):
+    base = kwargs.get('use_asyncio') and AsyncioWSGIHandler or WSGIHandler
+    class Handler(base):
+        # serve() sets protocol_version on the handler class
+        pass
+    kwargs.setdefault('daemon_threads', True)
+    server = serve(app, host='127.0.0.1', port=0, handler=Handler,
+                   start_loop=False, **kwargs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, thread
+
+
+def _stop_server(server, thread):
+    server.running = False
+    if not hasattr(server, 'thread_pool') and hasattr(server, 'shutdown'):
+        # socketserver's own serve_forever
+        server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def _path_app(environ, start_response):
+    body = environ['PATH_INFO'].encode('ascii')
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def test_connection_manager_parks_idle_keepalive():
+    server, thread = _start_server(
+        _path_app, protocol_version='HTTP/1.1', threadpool_workers=1,
+        threadpool_options={'spawn_if_under': 0},
+        use_connection_manager=True)
+    port = server.server_port
+    try:
+        idle = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        idle.request('GET', '/first')
+        assert idle.getresponse().read() == b'/first'
+        # The only worker would be blocked on the idle connection
+        # without the connection manager
+        other = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        other.request('GET', '/second')
+        assert other.getresponse().read() == b'/second'
+        idle.request('GET', '/third')
+        assert idle.getresponse().read() == b'/third'
+        idle.close()
+        other.close()
+    finally:
+        _stop_server(server, thread)
+
+
+def _streaming_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    yield b'chunk one, '
+    yield b''
+    yield b'chunk two'
+
+
+def test_chunked_response_keeps_connection_open():
+    server, thread = _start_server(_streaming_app,
+                                   protocol_version='HTTP/1.1')
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port,
+                                          timeout=5)
+        for i in range(2):
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            assert response.getheader('Transfer-Encoding') == 'chunked'
+            assert not response.will_close
+            assert response.read() == b'chunk one, chunk two'
+        conn.request('HEAD', '/')
+        response = conn.getresponse()
+        assert response.getheader('Transfer-Encoding') is None
+        assert not response.will_close
+        assert response.read() == b''
+        conn.close()
+    finally:
+        _stop_server(server, thread)
+
+
+def test_no_chunked_response_for_http10_client():
+    server, thread = _start_server(_streaming_app,
+                                   protocol_version='HTTP/1.1')
+    try:
+        client = socket.create_connection(('127.0.0.1', server.server_port),
+                                          timeout=5)
+        client.sendall(b'GET / HTTP/1.0\r\n\r\n')
+        data = b''
+        while True:
+            received = client.recv(4096)
+            if not received:
+                break
+            data += received
+        client.close()
+        head, body = data.split(b'\r\n\r\n', 1)
+        assert b'Connection: close' in head
+        assert b'chunked' not in head
+        assert body == b'chunk one, chunk two'
+    finally:
+        _stop_server(server, thread)
+
+
+def test_error_before_body_data_gives_500():
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        yield b''
+        raise ValueError('broken')
+    server, thread = _start_server(app, protocol_version='HTTP/1.1')
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port,
+                                          timeout=5)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        assert response.status == 500
+        assert response.read() == b'Internal Server Error\n'
+        conn.close()
+    finally:
+        _stop_server(server, thread)
+
+
+def test_file_wrapper_size():
+    wrapper = FileWrapper(io.BytesIO(b'0123456789'), 4, size=6)
+    assert list(wrapper) == [b'0123', b'45']
+    wrapper = FileWrapper(io.BytesIO(b'0123456789'), 4)
+    assert list(wrapper) == [b'0123', b'4567', b'89']
+
+
+def test_sendfile(tmp_path):
+    content = os.urandom(300000)
+    filename = tmp_path / 'data.bin'
+    filename.write_bytes(content)
+    server, thread = _start_server(FileApp(str(filename)),
+                                   protocol_version='HTTP/1.1')
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port,
+                                          timeout=5)
+        conn.request('GET', '/')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.read() == content
+        conn.request('GET', '/', headers={'Range': 'bytes=1000-1999'})
+        response = conn.getresponse()
+        assert response.status == 206
+        assert response.read() == content[1000:2000]
+        conn.request('GET', '/', headers={'Range': 'bytes=200000-'})
+        response = conn.getresponse()
+        assert response.status == 206
+        assert not response.will_close
+        assert response.read() == content[200000:]
+        conn.close()
+    finally:
+        _stop_server(server, thread)
+
+
+def _read_responses(sock, count):
+    """
+    Read ``count`` responses with a Content-Length from a socket
+    """
+    data = b''
+    bodies = []
+    while len(bodies) < count:
+        received = sock.recv(65536)
+        assert received
+        data += received
+        while b'\r\n\r\n' in data:
+            head, rest = data.split(b'\r\n\r\n', 1)
+            length = int(email.message_from_bytes(
+                head.split(b'\r\n', 1)[1])['Content-Length'])
+            if len(rest) < length:
+                break
+            bodies.append(rest[:length])
+            data = rest[length:]
+    return bodies
+
+
+def test_bad_request_head():
+    server, thread = _start_server(_path_app, protocol_version='HTTP/1.1')
+    try:
+        for head, status in [
+                (b'GET / HTTP/1.1\r\nHost : x\r\n\r\n', b'400'),
+                (b'GET / HTTP/1.1\r\n' + b'X: y\r\n' * 101 + b'\r\n',
+                 b'431'),
+                (b'GET / HTTP/1.1\r\nX: ' + b'y' * 70000 + b'\r\n\r\n',
+                 b'431')]:
+            client = socket.create_connection(
+                ('127.0.0.1', server.server_port), timeout=5)
+            client.sendall(head)
+            assert client.recv(4096).split()[1] == status
+            client.close()
+    finally:
+        _stop_server(server, thread)
+
+
+def test_pipelined_requests():
+    for use_connection_manager in (False, True):
+        server, thread = _start_server(
+            _path_app, protocol_version='HTTP/1.1',
+            use_connection_manager=use_connection_manager)
+        try:
+            client = socket.create_connection(
+                ('127.0.0.1', server.server_port), timeout=5)
+            client.sendall(
+                b'GET /one HTTP/1.1\r\nHost: localhost\r\n\r\n'
+                # The application doesn't read this body
+                b'POST /two HTTP/1.1\r\nHost: localhost\r\n'
+                b'Content-Length: 11\r\n\r\nGET /bogus\n'
+                b'GET /three HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            assert _read_responses(client, 3) == [b'/one', b'/two', b'/three']
+            client.close()
+        finally:
+            _stop_server(server, thread)
+
+
+def test_chunked_input_file():
+    body = (b'5;name=value\r\nhello\r\n'
+            b'8\r\n world\nA\r\n'
+            b'3\r\nBC\n\r\n'
+            b'0\r\nTrailer: yes\r\n\r\n'
+            b'NEXT REQUEST')
+    backing = io.BytesIO(body)
+    f = ChunkedInputFile(backing)
+    assert f.readline() == b'hello world\n'
+    assert f.read(2) == b'AB'
+    buffer = bytearray(10)
+    assert f.readinto(buffer) == 2
+    assert buffer[:2] == b'C\n'
+    assert f.read() == b''
+    assert f.done
+    assert f.tell() == 16
+    assert backing.read() == b'NEXT REQUEST'
+    f = ChunkedInputFile(io.BytesIO(body))
+    assert f.readlines() == [b'hello world\n', b'ABC\n']
+
+
+def test_chunked_input_file_invalid():
+    for body in (b'x\r\nhello\r\n0\r\n\r\n',
+                 b'0x5\r\nhello\r\n0\r\n\r\n',
+                 b'3\r\nhello\r\n0\r\n\r\n',
+                 b'5\r\nhel'):
+        f = ChunkedInputFile(io.BytesIO(body))
+        try:
+            f.read()
+        except IOError:
+            pass
+        else:
+            assert False, "No error for %r" % body
+
+
+def _echo_app(environ, start_response):
+    assert 'CONTENT_LENGTH' not in environ
+    assert environ['wsgi.input_terminated']
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def test_chunked_request():
+    server, thread = _start_server(_echo_app, protocol_version='HTTP/1.1')
+    try:
+        client = socket.create_connection(
+            ('127.0.0.1', server.server_port), timeout=5)
+        request = (b'POST / HTTP/1.1\r\nHost: localhost\r\n'
+                   b'Transfer-Encoding: chunked\r\n\r\n'
+                   b'6\r\nchunk \r\n3\r\none\r\n0\r\n\r\n')
+        client.sendall(request + request)
+        assert _read_responses(client, 2) == [b'chunk one', b'chunk one']
+        client.close()
+    finally:
+        _stop_server(server, thread)
+
+
+def _pid_app(environ, start_response):
+    body = str(os.getpid()).encode('ascii')
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def _get_pid(port):
+    # Children may still be starting up
+    for attempt in range(50):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            pid = int(conn.getresponse().read())
+            conn.close()
+            return pid
+        except ConnectionRefusedError:
+            time.sleep(0.1)
+    assert False, "No child process is serving"
+
+
+def test_prefork_replaces_dead_children():
+    for reuse_port in (False, True):
+        server, thread = _start_server(_pid_app, processes=2,
+                                       reuse_port=reuse_port)
+        server.check_interval = 0.05
+        port = server.server_address[1]
+        try:
+            pid = _get_pid(port)
+            assert pid != os.getpid()
+            assert pid in server.children
+            os.kill(pid, signal.SIGKILL)
+            for attempt in range(100):
+                if pid not in server.children and len(server.children) == 2:
+                    break
+                time.sleep(0.05)
+            assert pid not in server.children
+            assert len(server.children) == 2
+            assert _get_pid(port) in server.children
+        finally:
+            _stop_server(server, thread)
+        assert not server.children
+
+
+def test_process_rss():
+    assert _process_rss(os.getpid()) > 0
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def test_threadpool_autoscaling():
+    pool = ThreadPool(1, daemon=True, spawn_if_under=0, max_workers=4,
+                      autoscale_period=0.02, autoscale_queue_wait=0.01,
+                      autoscale_cooldown=0.1)
+    try:
+        release = threading.Event()
+        for i in range(6):
+            pool.add_task(release.wait)
+        _wait_for(lambda: len(pool.workers) == 4)
+        # Never more than max_workers
+        time.sleep(0.1)
+        assert len(pool.workers) == 4
+        release.set()
+        _wait_for(lambda: len(pool.workers) == 1)
+        assert pool.queue_wait() == 0
+    finally:
+        pool.shutdown()
+
+
+def test_threadpool_hung_workers():
+    pool = ThreadPool(2, daemon=True, spawn_if_under=0,
+                      hung_thread_limit=0.05, kill_thread_limit=0)
+    try:
+        release = threading.Event()
+        pool.add_task(release.wait)
+        _wait_for(lambda: pool.worker_tracker)
+        assert pool.busy_count() == 1
+        assert pool.hung_workers() == {}
+        time.sleep(0.1)
+        assert pool.busy_count() == 0
+        assert list(pool.hung_workers()) == list(pool.worker_tracker)
+        threads = pool.track_threads()
+        assert len(threads['hung']) == 1
+        assert len(threads['idle']) == 1
+        release.set()
+        _wait_for(lambda: not pool.worker_tracker)
+        assert pool.hung_workers() == {}
+        done = threading.Semaphore(0)
+        for i in range(500):
+            pool.add_task(done.release)
+        for i in range(500):
+            assert done.acquire(timeout=5)
+        # Entries for finished tasks don't pile up
+        assert len(pool._hung_deadlines) <= 64
+        _wait_for(lambda: len(pool.track_threads()['idle']) == 2)
+    finally:
+        pool.shutdown()
+
+
+def test_threadpool_task_times():
+    pool = ThreadPool(1, daemon=True, spawn_if_under=0)
+    try:
+        release = threading.Event()
+        def spin():
+            # Use some CPU, then wait
+            until = time.thread_time() + 0.1
+            while time.thread_time() < until:
+                pass
+            release.wait()
+        pool.add_task(spin)
+        pool.add_task(release.wait)
+        _wait_for(lambda: any(
+            times['cpu'] is None or times['cpu'] >= 0.1
+            for times in pool.track_threads()['times'].values()))
+        [times] = pool.task_times().values()
+        assert times['queue_wait'] < times['busy']
+        time.sleep(0.1)
+        [times] = pool.task_times().values()
+        if times['cpu'] is not None:
+            # Waiting doesn't use the CPU
+            assert times['cpu'] < times['busy'] - 0.05
+        release.set()
+        _wait_for(lambda: not pool.worker_tracker)
+        histograms = pool.get_stats()['histograms']
+        assert histograms['task_cpu']['count'] == 2
+        # The second task waited for the first
+        assert histograms['queue_wait']['sum'] >= 0.1
+    finally:
+        pool.shutdown()
+
+
+
+def test_threadpool_concurrent_bookkeeping():
+    # Workers replace themselves every few tasks while other threads
+    # add tasks and look at the pool
+    pool = ThreadPool(4, daemon=True, max_requests=3, spawn_if_under=0,
+                      hung_check_period=0)
+    try:
+        done = []
+        def add_tasks():
+            for i in range(200):
+                pool.add_task(lambda: done.append(None))
+                pool.track_threads()
+        adders = [threading.Thread(target=add_tasks) for i in range(4)]
+        for adder in adders:
+            adder.start()
+        for adder in adders:
+            adder.join()
+        _wait_for(lambda: len(done) == 800)
+        _wait_for(lambda: len(pool.idle_workers) == 4)
+        assert not pool.worker_tracker
+        assert pool.idle_workers == set(
+            worker.thread_id for worker in pool.workers)
+    finally:
+        pool.shutdown()
+    assert threadpoolbench.benchmark(2, 20, 100) > 0
+
+
+def test_threadpool_load_shedding():
+    pool = ThreadPool(1, daemon=True, spawn_if_under=0, max_queue=2)
+    try:
+        release = threading.Event()
+        shed = []
+        pool.add_task(release.wait)
+        _wait_for(lambda: pool.worker_tracker)
+        assert pool.add_task(lambda: None, shed=lambda: shed.append(1))
+        assert pool.add_task(lambda: None, shed=lambda: shed.append(2))
+        # The queue is full
+        assert not pool.add_task(lambda: None, shed=lambda: shed.append(3))
+        assert shed == [3]
+        # Tasks that can't be shed are always queued
+        assert pool.add_task(lambda: None)
+        release.set()
+        _wait_for(lambda: not pool.queue.qsize())
+        assert pool.get_stats()['counters']['shed_queue_full'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_threadpool_codel():
+    pool = ThreadPool(1, daemon=True, spawn_if_under=0,
+                      codel_target=0.05, codel_interval=0.1)
+    try:
+        release = threading.Event()
+        ran = []
+        shed = []
+        def add(name):
+            return pool.add_task(lambda: ran.append(name),
+                                 shed=lambda: shed.append(name))
+        pool.add_task(release.wait)
+        _wait_for(lambda: pool.worker_tracker)
+        assert add('first')
+        time.sleep(0.2)
+        # A standing queue, whose head has waited longer than the target
+        assert pool.shed_reason() == 'overload'
+        assert not add('refused')
+        release.set()
+        _wait_for(lambda: len(ran) + len(shed) == 2)
+        assert ran == []
+        assert shed == ['refused', 'first']
+        # Once the queue has drained, tasks are accepted again
+        assert pool.shed_reason() is None
+        assert add('later')
+        _wait_for(lambda: ran)
+        assert ran == ['later']
+        counters = pool.get_stats()['counters']
+        assert counters['shed_overload'] == 1
+        assert counters['shed_queue_wait'] == 1
+    finally:
+        pool.shutdown()
+
+
+
+def _scheduled_order(scheduler, tasks, pause=0):
+    """
+    Queue ``tasks`` (client, priority) behind a blocked worker, and
+    return the order they run in.
+    """
+    pool = ThreadPool(1, daemon=True, spawn_if_under=0, scheduler=scheduler)
+    try:
+        release = threading.Event()
+        ran = []
+        pool.add_task(release.wait)
+        _wait_for(lambda: pool.worker_tracker)
+        for i, (client, priority) in enumerate(tasks):
+            pool.add_task(lambda i=i: ran.append(i), client=client,
+                          priority=priority)
+        time.sleep(pause)
+        release.set()
+        _wait_for(lambda: len(ran) == len(tasks))
+        return ran
+    finally:
+        pool.shutdown()
+
+
+def test_threadpool_schedulers():
+    tasks = [('a', False), ('a', False), ('a', True), ('b', False),
+             ('a', False), ('c', True)]
+    assert _scheduled_order('fifo', tasks) == [0, 1, 2, 3, 4, 5]
+    assert _scheduled_order('priority', tasks) == [2, 5, 0, 1, 3, 4]
+    assert _scheduled_order('fair', tasks) == [0, 3, 5, 1, 2, 4]
+    # Not overloaded yet
+    assert _scheduled_order('lifo', tasks) == [0, 1, 2, 3, 4, 5]
+    # The newest first, until the queue has caught up
+    assert _scheduled_order(LifoScheduler(overload_wait=0.05), tasks,
+                            pause=0.1)[:3] == [5, 4, 3]
+
+
+def test_threadpool_scheduler_shutdown():
+    # Workers only stop once the queued tasks have run, even when a
+    # scheduler runs the tasks out of order
+    for scheduler in ('fifo', 'priority', 'fair', 'lifo'):
+        pool = ThreadPool(2, daemon=True, spawn_if_under=0,
+                          scheduler=scheduler)
+        release = threading.Event()
+        ran = []
+        for i in range(2):
+            pool.add_task(release.wait)
+        _wait_for(lambda: len(pool.worker_tracker) == 2)
+        for i in range(6):
+            pool.add_task(lambda i=i: ran.append(i), client='a',
+                          priority=i == 3)
+        # Overloaded, for the LIFO scheduler
+        time.sleep(0.15)
+        shutdown = threading.Thread(target=pool.shutdown,
+                                    kwargs=dict(drain_timeout=5))
+        shutdown.start()
+        _wait_for(lambda: pool.queue.shutdowns == 2)
+        release.set()
+        shutdown.join(10)
+        assert sorted(ran) == list(range(6)), scheduler
+        assert not pool.queue.qsize()
+
+
+def test_threadpool_scheduler_queue_wait():
+    pool = ThreadPool(1, daemon=True, spawn_if_under=0, scheduler='fair')
+    try:
+        release = threading.Event()
+        pool.add_task(release.wait)
+        _wait_for(lambda: pool.worker_tracker)
+        assert pool.queue_wait() == 0
+        pool.add_task(lambda: None, client='a')
+        time.sleep(0.05)
+        pool.add_task(lambda: None, client='b')
+        assert pool.queue_wait() >= 0.05
+        release.set()
+        _wait_for(lambda: not pool.queue.qsize())
+        assert pool.queue_wait() == 0
+    finally:
+        pool.shutdown()
+
+def _blocking_app(release):
+    def app(environ, start_response):
+        release.wait(5)
+        start_response('200 OK', [('Content-Type', 'text/plain'),
+                                  ('Content-Length', '2')])
+        return [b'ok']
+    return app
+
+
+def test_shed_requests():
+    release = threading.Event()
+    server, thread = _start_server(
+        _blocking_app(release), threadpool_workers=1,
+        threadpool_options={'spawn_if_under': 0, 'max_queue': 1})
+    port = server.server_port
+    try:
+        conns = []
+        for i in range(2):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            conns.append(conn)
+            # One request is being handled, the other queued
+            _wait_for(lambda: server.thread_pool.worker_tracker)
+        _wait_for(lambda: server.thread_pool.queue.qsize())
+        refused = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        refused.request('GET', '/')
+        res = refused.getresponse()
+        assert res.status == 503
+        assert res.getheader('Retry-After') == '1'
+        assert b'overloaded' in res.read()
+        refused.close()
+        release.set()
+        for conn in conns:
+            assert conn.getresponse().read() == b'ok'
+            conn.close()
+        assert server.get_stats()['counters']['shed_queue_full'] == 1
+    finally:
+        release.set()
+        _stop_server(server, thread)
+
+
+def test_priority_paths():
+    release = threading.Event()
+    handled = []
+    def app(environ, start_response):
+        handled.append(environ['PATH_INFO'])
+        if environ['PATH_INFO'] != '/healthz':
+            release.wait(5)
+        return _path_app(environ, start_response)
+    server, thread = _start_server(
+        app, threadpool_workers=1,
+        threadpool_options={'spawn_if_under': 0, 'max_queue': 1,
+                            'scheduler': 'priority',
+                            'priority_paths': '/healthz /status/'},
+        use_connection_manager=True)
+    port = server.server_port
+    try:
+        conns = []
+        for i in range(2):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/slow')
+            conns.append(conn)
+            _wait_for(lambda: server.thread_pool.worker_tracker)
+        _wait_for(lambda: server.thread_pool.queue.qsize())
+        # The queue is full, but a health check isn't refused, and goes
+        # ahead of the queued request
+        health = socket.create_connection(('127.0.0.1', port), timeout=5)
+        health.sendall(b'GET /healthz?full=1 HTTP/1.0\r\n\r\n')
+        time.sleep(0.1)
+        release.set()
+        assert health.makefile('rb').read().endswith(b'\r\n\r\n/healthz')
+        health.close()
+        for conn in conns:
+            assert conn.getresponse().read() == b'/slow'
+            conn.close()
+        assert handled == ['/slow', '/healthz', '/slow']
+        assert 'shed_queue_full' not in server.get_stats()['counters']
+    finally:
+        release.set()
+        _stop_server(server, thread)
+
+
+def _read_response(sock):
+    """
+    Read one response with a Content-Length from a socket; returns
+    the head and the body.
+    """
+    data = b''
+    while b'\r\n\r\n' not in data:
+        data += sock.recv(65536)
+    head, body = data.split(b'\r\n\r\n', 1)
+    length = int(head.lower().split(b'content-length: ')[1].split(b'\r\n')[0])
+    while len(body) < length:
+        body += sock.recv(1 << 20)
+    return head, body
+
+
+def _slow_client(port, request):
+    sock = socket.socket()
+    # A small window, so most of the response waits on the server
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.settimeout(5)
+    sock.connect(('127.0.0.1', port))
+    sock.sendall(request)
+    return sock
+
+
+def test_offload_output(tmp_path):
+    big = os.urandom(1 << 20) * 8
+    filename = tmp_path / 'big'
+    filename.write_bytes(big)
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'application/octet-stream'),
+                                  ('Content-Length', str(len(big)))])
+        if environ['PATH_INFO'] == '/file':
+            return environ['wsgi.file_wrapper'](open(filename, 'rb'))
+        if environ['PATH_INFO'] == '/small':
+            return [b'small']
+        return [big[i:i + 65536] for i in range(0, len(big), 65536)]
+    server, thread = _start_server(
+        app, protocol_version='HTTP/1.1', threadpool_workers=1,
+        threadpool_options={'spawn_if_under': 0}, offload_output=True)
+    server.offload_buffer = 16 << 20
+    port = server.server_port
+    try:
+        slow = [_slow_client(port, b'GET /%s HTTP/1.1\r\nHost: x\r\n\r\n'
+                             % path) for path in (b'', b'file')]
+        # The only worker isn't held up by those clients
+        _wait_for(lambda: server.output_writer.writing_count() == 2)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        conn.request('GET', '/small')
+        res = conn.getresponse()
+        assert res.read(5) == b'small'
+        conn.close()
+        for sock in slow:
+            # Now read it quickly
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            head, body = _read_response(sock)
+            assert head.startswith(b'HTTP/1.1 200 ')
+            assert body == big
+            # The connection is kept alive for another request
+            sock.sendall(b'GET /small HTTP/1.1\r\nHost: x\r\n\r\n')
+            sock.recv(65536)
+            sock.close()
+        counters = server.get_stats()['counters']
+        assert counters['offloaded_responses'] == 2
+        assert counters['bytes_out'] > 2 * len(big)
+        # Too much to hold: the worker sends it
+        server.offload_buffer = 65536
+        sock = _slow_client(port, b'GET / HTTP/1.0\r\n\r\n')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        head, body = _read_response(sock)
+        assert body == big
+        sock.close()
+        assert server.get_stats()['counters']['offloaded_responses'] == 2
+    finally:
+        _stop_server(server, thread)
+
+
+def test_offload_output_many_writes():
+    # More small writes held than sendmsg() takes buffers at once
+    chunk = b'x' * 39 + b'\n'
+    count = 100000
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain'),
+                                  ('Content-Length', str(len(chunk) * count))])
+        for i in range(count):
+            yield chunk
+    server, thread = _start_server(
+        app, protocol_version='HTTP/1.1', offload_output=True)
+    server.offload_buffer = 65536
+    try:
+        sock = _slow_client(server.server_port,
+                            b'GET / HTTP/1.0\r\n\r\n')
+        # Let the held writes pile up before reading
+        time.sleep(0.5)
+        data = b''
+        while True:
+            received = sock.recv(1 << 20)
+            if not received:
+                break
+            data += received
+        sock.close()
+        assert data.split(b'\r\n\r\n', 1)[1] == chunk * count
+    finally:
+        _stop_server(server, thread)
+
+
+def test_static_files_find(tmp_path):
+    mapper = URLMap()
+    mapper['/static'] = StaticURLParser(str(tmp_path), cache_max_age=60)
+    mapper['/static/api'] = _path_app
+    mapper['/files'] = DirectoryApp(str(tmp_path))
+    mapper['/'] = _path_app
+    mapper['http://example.com/other'] = DirectoryApp(str(tmp_path))
+    found = sorted(StaticFiles.find(mapper), key=lambda static: static.prefix)
+    assert [static.prefix for static in found] == ['/files/', '/static/']
+    files, static = found
+    assert static.cache_max_age == 60
+    assert static.exclude == ('/static/api/',)
+    assert static.filename('/static/css/a.css') == str(tmp_path / 'css/a.css')
+    assert static.filename('/static/api/x') is None
+    assert static.filename('/static/../secret') is None
+    # Dot-segments don't get around a mount under the prefix
+    assert static.filename('/static/x/../api/secret') is None
+    assert static.filename('/static/./api/secret') is None
+    assert static.filename('/static//api/secret') is None
+    assert files.filename('/static/a.css') is None
+    # Middleware (here, a plain function) isn't looked into
+    assert StaticFiles.find(_path_app) == []
+
+
+def test_serve_static(tmp_path):
+    (tmp_path / 'a.css').write_bytes(b'body { }')
+    big = os.urandom(100000)
+    (tmp_path / 'big.bin').write_bytes(big)
+    dynamic = []
+    def app(environ, start_response):
+        dynamic.append(environ['PATH_INFO'])
+        return _path_app(environ, start_response)
+    (tmp_path / 'private').mkdir()
+    (tmp_path / 'private' / 'secret').write_bytes(b'secret')
+    mapper = URLMap()
+    mapper['/static'] = DirectoryApp(str(tmp_path))
+    mapper['/static/private'] = app
+    mapper['/'] = app
+    server, thread = _start_server(
+        mapper, protocol_version='HTTP/1.1', threadpool_workers=1,
+        threadpool_options={'spawn_if_under': 0}, serve_static=True)
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port,
+                                          timeout=5)
+        conn.request('GET', '/static/a.css')
+        res = conn.getresponse()
+        assert res.status == 200
+        assert res.getheader('Content-Type') == 'text/css'
+        assert res.read() == b'body { }'
+        etag = res.getheader('ETag')
+        conn.request('GET', '/static/a.css', headers={'If-None-Match': etag})
+        res = conn.getresponse()
+        assert res.status == 304
+        assert res.read() == b''
+        conn.request('GET', '/static/big.bin')
+        assert conn.getresponse().read() == big
+        conn.request('GET', '/static/big.bin',
+                     headers={'Range': 'bytes=1000-1999'})
+        res = conn.getresponse()
+        assert res.status == 206
+        assert res.getheader('Content-Range') == 'bytes 1000-1999/100000'
+        assert res.read() == big[1000:2000]
+        conn.request('HEAD', '/static/big.bin')
+        res = conn.getresponse()
+        assert res.getheader('Content-Length') == '100000'
+        assert res.read() == b''
+        # None of those went to the application...
+        assert dynamic == []
+        assert server.get_stats()['counters']['static_requests'] == 5
+        # ...but this does, on the same connection
+        conn.request('GET', '/dynamic')
+        assert conn.getresponse().read() == b'/dynamic'
+        conn.request('GET', '/static/missing.css')
+        res = conn.getresponse()
+        assert res.status == 404
+        res.read()
+        # Dot-segments don't get around the application mounted under
+        # the static files
+        for path in ('/static/x/../private/secret',
+                     '/static/./private/secret', '/static/%2E/private/secret'):
+            conn.request('GET', path)
+            assert conn.getresponse().read() == b'/secret'
+        conn.close()
+        assert dynamic == ['/dynamic'] + ['/secret'] * 3
+        assert server.get_stats()['counters']['static_requests'] == 5
+    finally:
+        _stop_server(server, thread)
+
+
+def _cpu_app(environ, start_response):
+    pid = run_cpu_bound(environ, os.getpid)
+    body = str(pid).encode('ascii')
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def test_cpu_executor():
+    server, thread = _start_server(
+        _cpu_app, threadpool_options={'cpu_workers': 1})
+    try:
+        executor = server.thread_pool.cpu_executor
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port,
+                                          timeout=30)
+        conn.request('GET', '/')
+        pid = int(conn.getresponse().read())
+        conn.close()
+        # It ran in another process
+        assert pid != os.getpid()
+    finally:
+        _stop_server(server, thread)
+    # The executor is shut down with the pool
+    with pytest.raises(RuntimeError):
+        executor.submit(os.getpid)
+
+def _interpreter_app(environ, start_response):
+    body = environ['wsgi.input'].read()
+    write = start_response('200 OK', [('Content-Type', 'text/plain')])
+    write(environ['PATH_INFO'].encode('ascii') + b' ')
+    return [body, str('paste.httpserver.stats' in environ).encode('ascii')]
+
+
+def test_subinterpreter_app(monkeypatch):
+    if httpserver.InterpreterPoolExecutor is None:
+        # Without subinterpreters, the requests are passed through
+        # threads just the same
+        monkeypatch.setattr(httpserver, 'InterpreterPoolExecutor',
+                            ThreadPoolExecutor)
+    server, thread = _start_server(_interpreter_app,
+                                   protocol_version='HTTP/1.1',
+                                   subinterpreters=2)
+    try:
+        assert isinstance(server.wsgi_application, SubinterpreterApp)
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port,
+                                          timeout=10)
+        conn.request('POST', '/upload', body=b'12345')
+        assert conn.getresponse().read() == b'/upload 12345False'
+        conn.request('POST', '/chunked', body=iter([b'12', b'345']),
+                     encode_chunked=True)
+        assert conn.getresponse().read() == b'/chunked 12345False'
+        conn.close()
+    finally:
+        _stop_server(server, thread)
+        server.wsgi_application.shutdown()
+
+
+def _timing_app(environ, start_response):
+    cpu = environ['paste.httpserver.thread_cpu']()
+    body = json.dumps([environ['paste.httpserver.queue_wait'],
+                       environ['paste.httpserver.dequeued'], cpu])
+    body = body.encode('ascii')
+    start_response('200 OK', [('Content-Type', 'application/json'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def test_request_timing_environ():
+    for options in ({}, {'use_asyncio': True}):
+        server, thread = _start_server(
+            _timing_app, protocol_version='HTTP/1.1', **options)
+        try:
+            conn = http.client.HTTPConnection(
+                '127.0.0.1', server.server_port, timeout=5)
+            for i in range(2):
+                conn.request('GET', '/')
+                queue_wait, dequeued, cpu = json.loads(
+                    conn.getresponse().read())
+                assert 0 <= queue_wait < 5
+                assert dequeued <= time.time()
+                assert 0 <= cpu < 5
+                if i and not options:
+                    # The second request on the connection wasn't queued
+                    assert queue_wait == 0
+            conn.close()
+        finally:
+            _stop_server(server, thread)
+
+
+def test_server_stats_histograms():
+    stats = ServerStats()
+    stats.incr('requests')
+    stats.observe('service_time', 0.003)
+    stats.observe('service_time', 20)
+    stats.add_gauge('answer', lambda: 42)
+    thread = threading.Thread(target=stats.incr, args=('requests', 2))
+    thread.start()
+    thread.join()
+    snapshot = stats.snapshot()
+    assert snapshot['counters'] == {'requests': 3}
+    assert snapshot['gauges'] == {'answer': 42}
+    hist = snapshot['histograms']['service_time']
+    assert hist['count'] == 2
+    assert hist['sum'] == 20.003
+    buckets = dict(hist['buckets'])
+    assert buckets[0.0025] == 0
+    assert buckets[0.005] == 1
+    assert buckets[10] == 1
+    assert buckets[None] == 2
+    # The exited thread's counts are kept
+    assert stats.snapshot()['counters'] == {'requests': 3}
+
+
+def _stats_app(environ, start_response):
+    if environ['PATH_INFO'] == '/stats':
+        return ShowServerStats()(environ, start_response)
+    return _echo_app(environ, start_response)
+
+
+def test_server_stats_app():
+    server, thread = _start_server(_stats_app, protocol_version='HTTP/1.1')
+    try:
+        conn = http.client.HTTPConnection(
+            '127.0.0.1', server.server_port, timeout=5)
+        conn.request('POST', '/', body=b'12345',
+                     headers={'Transfer-Encoding': 'chunked'},
+                     encode_chunked=True)
+        assert conn.getresponse().read() == b'12345'
+        conn.request('GET', '/stats')
+        response = conn.getresponse()
+        assert response.getheader('Content-Type') == 'application/json'
+        stats = json.loads(response.read())
+        assert stats['counters']['requests'] == 1
+        assert stats['counters']['status_2xx'] == 1
+        assert stats['counters']['bytes_in'] == 5
+        assert stats['counters']['bytes_out'] > 5
+        assert stats['histograms']['queue_wait']['count'] == 1
+        assert stats['histograms']['service_time']['count'] == 1
+        assert stats['gauges']['active_connections'] == 1
+        assert stats['gauges']['workers'] == 10
+        conn.request('GET', '/stats?format=prometheus')
+        text = conn.getresponse().read().decode('utf8')
+        assert 'paste_httpserver_requests_total 2\n' in text
+        assert 'paste_httpserver_active_connections 1\n' in text
+        assert ('paste_httpserver_service_time_seconds_bucket{le="+Inf"} 2\n'
+                in text)
+        conn.close()
+        # The request is counted once the response has been sent
+        _wait_for(lambda: server.get_stats()['counters']['requests'] == 3)
+    finally:
+        _stop_server(server, thread)
+
+
+_successor_script = '''
+import sys
+sys.path.insert(0, %r)
+from paste.httpserver import serve
+
+def app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', '9')])
+    return [b'successor']
+
+server = serve(app, host='127.0.0.1', port=1, start_loop=False)
+server.handle_request()
+server.server_close()
+''' % os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_listen_socket():
+    listen_socket = socket.socket()
+    listen_socket.bind(('127.0.0.1', 0))
+    listen_socket.listen(5)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', ResourceWarning)
+        server = WSGIServer(_path_app, ('127.0.0.1', 0), WSGIHandler,
+                            listen_socket=listen_socket)
+        gc.collect()
+    try:
+        assert server.server_address == listen_socket.getsockname()
+        # The socket made in its place was closed, not leaked
+        assert not [warning for warning in caught
+                    if issubclass(warning.category, ResourceWarning)]
+    finally:
+        server.server_close()
+
+
+def test_handoff():
+    release = threading.Event()
+    def slow_app(environ, start_response):
+        release.wait(5)
+        return _path_app(environ, start_response)
+    server, thread = _start_server(slow_app)
+    port = server.server_port
+    try:
+        slow = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        slow.request('GET', '/slow')
+        _wait_for(lambda: server.thread_pool.worker_tracker)
+        process = server.handoff(
+            args=[sys.executable, '-c', _successor_script], drain_timeout=5)
+        # The request in progress is allowed to finish
+        time.sleep(0.5)
+        assert thread.is_alive()
+        release.set()
+        assert slow.getresponse().read() == b'/slow'
+        thread.join(5)
+        assert not thread.is_alive()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.request('GET', '/')
+        assert conn.getresponse().read() == b'successor'
+        assert process.wait(10) == 0
+    finally:
+        release.set()
+        _stop_server(server, thread)
+
+
+def _make_certificate(tmp_path):
+    if not shutil.which('openssl'):
+        pytest.skip('openssl is needed to create a certificate')
+    pem = str(tmp_path / 'host.pem')
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-days', '1', '-subj', '/CN=localhost',
+         '-keyout', pem, '-out', str(tmp_path / 'host.cert')],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(str(tmp_path / 'host.cert')) as f:
+        cert = f.read()
+    with open(pem, 'a') as f:
+        f.write(cert)
+    return pem
+
+
+def _scheme_app(environ, start_response):
+    if environ['PATH_INFO'] == '/upload':
+        body = environ['wsgi.input'].read()
+    else:
+        body = environ['wsgi.url_scheme'].encode('ascii')
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def test_ssl(tmp_path):
+    pem = _make_certificate(tmp_path)
+    client_context = ssl.create_default_context()
+    client_context.check_hostname = False
+    client_context.verify_mode = ssl.CERT_NONE
+    for use_threadpool in (True, False):
+        server, thread = _start_server(
+            _scheme_app, protocol_version='HTTP/1.1', ssl_pem=pem,
+            ssl_session_tickets=0, threadpool_workers=1,
+            threadpool_options={'spawn_if_under': 0},
+            use_threadpool=use_threadpool)
+        port = server.server_address[1]
+        try:
+            if use_threadpool:
+                # A client that never starts its handshake doesn't hold
+                # up the only worker
+                stalled = socket.create_connection(('127.0.0.1', port))
+                time.sleep(0.1)
+            conn = http.client.HTTPSConnection(
+                '127.0.0.1', port, timeout=5, context=client_context)
+            for i in range(2):
+                conn.request('GET', '/')
+                assert conn.getresponse().read() == b'https'
+            conn.close()
+            # The body is limited to its Content-Length over SSL too
+            conn = http.client.HTTPSConnection(
+                '127.0.0.1', port, timeout=5, context=client_context)
+            body = os.urandom(200000)
+            for i in range(2):
+                conn.request('POST', '/upload', body=body)
+                assert conn.getresponse().read() == body
+            conn.close()
+            if use_threadpool:
+                stalled.close()
+                stats = server.get_stats()['gauges']
+                assert stats['ssl_handshakes'] == 2
+        finally:
+            _stop_server(server, thread)
+
+
+def test_asyncio_server():
+    server, thread = _start_server(_path_app, protocol_version='HTTP/1.1',
+                                   use_asyncio=True, threadpool_workers=2)
+    try:
+        # Idle keep-alive connections don't use up the workers
+        idle = [socket.create_connection(('127.0.0.1', server.server_port))
+                for i in range(4)]
+        client = socket.create_connection(
+            ('127.0.0.1', server.server_port), timeout=5)
+        client.sendall(
+            b'GET /one HTTP/1.1\r\nHost: localhost\r\n\r\n'
+            b'POST /two HTTP/1.1\r\nHost: localhost\r\n'
+            b'Content-Length: 11\r\n\r\nGET /bogus\n'
+            b'GET /three HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        assert _read_responses(client, 3) == [b'/one', b'/two', b'/three']
+        client.close()
+        for sock in idle:
+            sock.close()
+    finally:
+        _stop_server(server, thread)
+    server, thread = _start_server(_echo_app, protocol_version='HTTP/1.1',
+                                   use_asyncio=True)
+    try:
+        client = socket.create_connection(
+            ('127.0.0.1', server.server_port), timeout=5)
+        client.sendall(b'POST / HTTP/1.1\r\nHost: localhost\r\n'
+                       b'Transfer-Encoding: chunked\r\n'
+                       b'Expect: 100-continue\r\n\r\n')
+        # The 100 Continue comes once the application reads the body
+        assert client.recv(4096) == b'HTTP/1.1 100 Continue\r\n\r\n'
+        client.sendall(b'6\r\nchunk \r\n3\r\none\r\n0\r\n\r\n')
+        assert _read_responses(client, 1) == [b'chunk one']
+        client.close()
+    finally:
+        _stop_server(server, thread)
+    server, thread = _start_server(_streaming_app,
+                                   protocol_version='HTTP/1.1',
+                                   use_asyncio=True)
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port,
+                                          timeout=5)
+        for i in range(2):
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            assert response.getheader('Transfer-Encoding') == 'chunked'
+            assert not response.will_close
+            assert response.read() == b'chunk one, chunk two'
+        conn.close()
+        _wait_for(lambda: server.get_stats()['counters']['requests'] == 2)
+    finally:
+        _stop_server(server, thread)
+
+
+def test_asyncio_server_backpressure(monkeypatch):
+    # A worker writing to a slow client waits for the transport's
+    # buffer to drain, rather than running ahead of pause_writing()
+    chunk = b'x' * 65536
+    count = 100
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain'),
+                                  ('Content-Length', str(len(chunk) * count))])
+        for i in range(count):
+            yield chunk
+    buffered = []
+    write = httpserver._AsyncioHTTPProtocol.write
+    def record_write(self, data):
+        buffered.append(self.transport.get_write_buffer_size())
+        write(self, data)
+    monkeypatch.setattr(httpserver._AsyncioHTTPProtocol, 'write',
+                        record_write)
+    server, thread = _start_server(app, use_asyncio=True)
+    try:
+        sock = _slow_client(server.server_port,
+                            b'GET / HTTP/1.0\r\n\r\n')
+        time.sleep(0.5)
+        head, body = _read_response(sock)
+        assert body == chunk * count
+        sock.close()
+        # Never written to past the default high-water mark (64 KiB)
+        assert max(buffered) <= 65536
+    finally:
+        _stop_server(server, thread)
+
+
+def test_asyncio_server_error(monkeypatch, capsys):
+    def handle_request(self):
+        raise RuntimeError('broken handler')
+    server, thread = _start_server(_path_app, protocol_version='HTTP/1.1',
+                                   use_asyncio=True)
+    try:
+        monkeypatch.setattr(AsyncioWSGIHandler, 'handle_request',
+                            handle_request)
+        client = socket.create_connection(
+            ('127.0.0.1', server.server_port), timeout=5)
+        client.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        # The connection is closed, and the error reported
+        assert client.recv(4096) == b''
+        client.close()
+        assert 'RuntimeError: broken handler' in capsys.readouterr().err
+    finally:
+        _stop_server(server, thread)
+
+
+def _closed_by_server(client):
+    try:
+        return client.recv(4096) == b''
+    except ConnectionResetError:
+        return True
+
+
+def test_slow_clients(monkeypatch):
+    monkeypatch.setattr(ConnectionReaper, 'interval', 0.05)
+    for options in ({'threadpool_workers': 1,
+                     'threadpool_options': {'spawn_if_under': 0}},
+                    {'use_connection_manager': True},
+                    {'use_threadpool': False},
+                    {'use_asyncio': True, 'threadpool_workers': 1}):
+        server, thread = _start_server(
+            _echo_body_app, protocol_version='HTTP/1.1',
+            header_timeout=0.3, body_timeout=0.3, keepalive_timeout=0.3,
+            **options)
+        port = server.server_port
+        try:
+            # Trickling in a request head
+            head_client = socket.create_connection(('127.0.0.1', port),
+                                                   timeout=5)
+            head_client.sendall(b'GET / HTTP/1.1\r\nHost: loc')
+            assert _closed_by_server(head_client)
+            # Trickling in a body
+            body_client = socket.create_connection(('127.0.0.1', port),
+                                                   timeout=5)
+            body_client.sendall(b'POST / HTTP/1.1\r\nHost: localhost\r\n'
+                                b'Content-Length: 10\r\n\r\n01234')
+            assert _closed_by_server(body_client)
+            # Idle after a request
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('POST', '/', body=b'0123456789')
+            assert conn.getresponse().read() == b'0123456789'
+            assert _closed_by_server(conn.sock)
+            conn.close()
+            counters = server.get_stats()['counters']
+            assert counters['reaped_head'] == 1
+            assert counters['reaped_body'] == 1
+            assert counters['reaped_idle'] == 1
+        finally:
+            _stop_server(server, thread)
+
+
+def test_unread_continue_body(monkeypatch):
+    # The client still waiting for 100 Continue (with the body behind
+    # a deadline) is answered and the connection closed, rather than
+    # sent 100 Continue to read a body that nobody wants
+    monkeypatch.setattr(ConnectionReaper, 'interval', 0.05)
+    def app(environ, start_response):
+        if environ['PATH_INFO'] == '/read':
+            return _echo_body_app(environ, start_response)
+        return _path_app(environ, start_response)
+    server, thread = _start_server(app, protocol_version='HTTP/1.1',
+                                   body_timeout=5)
+    try:
+        client = socket.create_connection(
+            ('127.0.0.1', server.server_port), timeout=5)
+        client.sendall(b'POST /read HTTP/1.1\r\nHost: localhost\r\n'
+                       b'Content-Length: 5\r\n'
+                       b'Expect: 100-continue\r\n\r\n')
+        # Once, when the application reads the body
+        assert client.recv(4096) == b'HTTP/1.1 100 Continue\r\n\r\n'
+        client.sendall(b'12345')
+        assert _read_responses(client, 1) == [b'12345']
+        client.close()
+        client = socket.create_connection(
+            ('127.0.0.1', server.server_port), timeout=5)
+        client.sendall(b'POST /upload HTTP/1.1\r\nHost: localhost\r\n'
+                       b'Content-Length: 10\r\n'
+                       b'Expect: 100-continue\r\n\r\n')
+        response = b''
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            response += data
+        assert response.startswith(b'HTTP/1.1 200 ')
+        assert b'100 Continue' not in response
+        assert response.endswith(b'/upload')
+        client.close()
+    finally:
+        _stop_server(server, thread)
+
+
+def test_body_deadline_readinto1():
+    def app(environ, start_response):
+        length = int(environ['CONTENT_LENGTH'])
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        received = 0
+        while received < length:
+            n = environ['wsgi.input'].readinto1(view[received:])
+            assert n
+            received += n
+        start_response('200 OK', [('Content-Type', 'text/plain'),
+                                  ('Content-Length', str(length))])
+        return [bytes(buffer)]
+    for options in ({}, {'use_connection_manager': True}):
+        server, thread = _start_server(app, protocol_version='HTTP/1.1',
+                                       body_timeout=5, **options)
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1',
+                                              server.server_port, timeout=5)
+            conn.request('POST', '/', body=b'0123456789')
+            assert conn.getresponse().read() == b'0123456789'
+            conn.close()
+        finally:
+            _stop_server(server, thread)
+
+
+def _echo_body_app(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'text/plain'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
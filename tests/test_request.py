@@ -1,8 +1,11 @@
 # (c) 2005 Ben Bangert
 # This module is part of the Python Paste Project and is released under
 # the MIT License: http://www.opensource.org/licenses/mit-license.php
+import io
+from concurrent.futures import ThreadPoolExecutor
+
 from paste.fixture import TestApp
-from paste.request import get_cookie_dict
+from paste.request import get_cookie_dict, iter_input, run_cpu_bound
 from paste.wsgiwrappers import WSGIRequest
 
 def simpleapp(environ, start_response):
@@ -62,3 +65,27 @@ def test_bad_cookie():
     assert get_cookie_dict(env) == {}
     env['HTTP_COOKIE'] = '?='
     assert get_cookie_dict(env) == {}
+
+def test_iter_input():
+    class Unbuffered:
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+        def read(self, size):
+            return self.data.read(min(size, 3))
+    for fp in (io.BytesIO(b'0123456789'), Unbuffered(b'0123456789')):
+        chunks = [bytes(chunk) for chunk in iter_input(fp, 8, bufsize=4)]
+        assert b''.join(chunks) == b'01234567'
+        assert all(len(chunk) <= 4 for chunk in chunks)
+        assert b''.join(bytes(chunk) for chunk in iter_input(fp)) == b'89'
+
+def test_run_cpu_bound():
+    assert run_cpu_bound({}, divmod, 7, 2) == (3, 1)
+    with ThreadPoolExecutor(1) as executor:
+        environ = {'paste.cpu_executor': executor}
+        assert run_cpu_bound(environ, int, '12', base=8) == 10
+        try:
+            run_cpu_bound(environ, int, 'x')
+        except ValueError:
+            pass
+        else:
+            assert False, "The exception should be raised"